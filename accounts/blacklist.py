@@ -0,0 +1,111 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from sqlalchemy import select, delete
+from server.cache import BloomFilter
+from server.settings import (
+    AsyncSessionLocal, BLACKLIST_BLOOM_CAPACITY, BLACKLIST_BLOOM_ERROR_RATE,
+    BLACKLIST_SYNC_INTERVAL, BLACKLIST_SWEEP_INTERVAL, BLACKLIST_SYNC_OVERLAP)
+from .models import BlackListTokens
+from .security import token_key, forget_token
+
+
+logger = logging.getLogger(__name__)
+
+
+# expires_at is a naive column holding UTC
+def _utc(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+def _utc_now():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class TokenBlacklist:
+    """Revoked tokens: bloom filter in memory, indexed rows in blacklisted_tokens.
+
+    A key missing from the filter is definitely not revoked, so the common case
+    needs no query. Other workers' revocations are picked up every
+    BLACKLIST_SYNC_INTERVAL seconds; until the first load every check hits the DB.
+    """
+
+    def __init__(self):
+        self.bloom = self._new_bloom()
+        self.loaded = False
+        self.last_id = 0
+        self._task = None
+
+    def _new_bloom(self):
+        return BloomFilter(capacity=BLACKLIST_BLOOM_CAPACITY, error_rate=BLACKLIST_BLOOM_ERROR_RATE)
+
+    async def is_revoked(self, token:str, payload:dict, db):
+        key = token_key(token, payload)
+        if self.loaded and key not in self.bloom:
+            return False
+        result = await db.execute(select(BlackListTokens.id).where(BlackListTokens.jti == key).limit(1))
+        return result.first() is not None
+
+    async def revoke(self, token:str, payload:dict, db):
+        key = token_key(token, payload)
+        blocked_token = BlackListTokens(jti=key, expires_at=_utc(payload["exp"]))
+        db.add(blocked_token)
+        await db.commit()
+        self.bloom.add(key)
+        forget_token(token)
+        return blocked_token
+
+    async def _load(self, db, bloom, after_id:int=0):
+        result = await db.execute(
+            select(BlackListTokens.id, BlackListTokens.jti)
+            .where(BlackListTokens.id > after_id)
+            .order_by(BlackListTokens.id))
+        last_id = after_id
+        for row_id, jti in result:
+            bloom.add(jti)
+            last_id = row_id
+        return last_id
+
+    async def sync(self, db):
+        # pull rows added since the last sync (possibly by other workers);
+        # the overlap catches rows that committed out of id order, adding a
+        # key twice is harmless
+        last_id = await self._load(db, self.bloom, max(self.last_id - BLACKLIST_SYNC_OVERLAP, 0))
+        self.last_id = max(self.last_id, last_id)
+        self.loaded = True
+
+    async def purge(self, db):
+        await db.execute(delete(BlackListTokens).where(BlackListTokens.expires_at < _utc_now()))
+        await db.commit()
+        # bloom filters can't remove keys, so rebuild from what is left and swap
+        bloom = self._new_bloom()
+        last_id = await self._load(db, bloom)
+        self.bloom, self.last_id, self.loaded = bloom, last_id, True
+
+    async def _run(self):
+        since_purge = 0
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    if since_purge >= BLACKLIST_SWEEP_INTERVAL:
+                        await self.purge(db)
+                        since_purge = 0
+                    else:
+                        await self.sync(db)
+            except Exception:
+                logger.exception("token blacklist sync failed")
+            await asyncio.sleep(BLACKLIST_SYNC_INTERVAL)
+            since_purge += BLACKLIST_SYNC_INTERVAL
+
+    async def start(self):
+        async with AsyncSessionLocal() as db:
+            await self.purge(db)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+token_blacklist = TokenBlacklist()
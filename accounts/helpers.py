@@ -1,58 +1,63 @@
 from .models import User, Role
 from .security import *
+from sqlalchemy import select
 from sqlalchemy.orm import selectinload
 
-def get_user(username:str=None, user_id:int=None, db:None=None):
-    q = db.query(User).options(
+async def get_user(username:str=None, user_id:int=None, db:None=None):
+    q = select(User).options(
         selectinload(User.permissions),
         selectinload(User.roles).selectinload(Role.permissions))
     if username:
-        q = q.filter(User.username==username).first()
+        q = q.where(User.username==username)
     elif user_id:
-        q = q.filter(User.id==user_id).first()
-    if q:
-        return q
-    return None
+        q = q.where(User.id==user_id)
+    else:
+        return None
+    result = await db.execute(q)
+    return result.scalars().first()
 
 
-def authenticate(username:str, password:str=None, db:None=None):
-    user = get_user(username=username, db=db)
+async def authenticate(username:str, password:str=None, db:None=None):
+    user = await get_user(username=username, db=db)
     if user:
-        is_password_correct = verify_password(password, user.password)
+        is_password_correct = await verify_password_async(password, user.password)
         if is_password_correct:
+            if password_needs_rehash(user.password):
+                # argon2 parameters changed since this hash was made
+                user.password = await hash_password_async(password)
+                await db.commit()
             return user
     return None
 
 
 
-def _create_user_object(data):
-    data["password"] = hash_password(data["password"])
+async def _create_user_object(data):
+    data["password"] = await hash_password_async(data["password"])
     data.pop("confirm_password")
     new_user = User(**data)
 
     return new_user
 
 
-def _create_user(data, db):
-    user = _create_user_object(data)
+async def _create_user(data, db):
+    user = await _create_user_object(data)
     db.add(user)
-    db.commit()
-    db.refresh(user)
-    return user
+    await db.commit()
+    return await get_user(user_id=user.id, db=db)
 
-def create_user(data, db):
+async def create_user(data, db):
     data = data.model_dump()
-    user = _create_user(data, db)
+    user = await _create_user(data, db)
     return user
 
 
-def create_superuser(data, db):
+async def create_superuser(data, db):
     data = data.model_dump()
     data.update({
         "is_staff":True,
         "is_superuser":True
     })
-    user = _create_user(data,db)
+    user = await _create_user(data,db)
     return user
     
     
\ No newline at end of file
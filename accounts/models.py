@@ -67,8 +67,10 @@ class BlackListTokens(BaseModel):
     __tablename__ = "blacklisted_tokens"
     
     id:Mapped[int] = mapped_column(Integer, primary_key=True)
-    token:Mapped[str] = mapped_column(String, nullable=False)
-    created_at:Mapped[datetime] = mapped_column(DateTime, default=datetime.now())
+    # jti claim, or sha256 of the token for tokens issued without one
+    jti:Mapped[str] = mapped_column(String(64), nullable=False, unique=True, index=True)
+    expires_at:Mapped[datetime] = mapped_column(DateTime, nullable=False, index=True)
+    created_at:Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
 
 
 
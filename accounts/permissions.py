@@ -1,8 +1,12 @@
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from fastapi import Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from server.settings import get_db
+from fastapi import Depends, HTTPException, WebSocket, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import NamedTuple
+from server.cache import TTLCache
+from server.invalidation import invalidator
+from server.settings import get_async_db, AsyncSessionLocal, PERMISSION_CACHE_TTL, PERMISSION_CACHE_SIZE
 from .validators import validate_access_token
+from .helpers import get_user
 from .models import User
 
 
@@ -10,14 +14,55 @@ from .models import User
 oauth_bearer = HTTPBearer(auto_error=False)
 
 
+class UserAccess(NamedTuple):
+    permissions:frozenset
+    roles:frozenset
+    is_staff:bool
+    is_superuser:bool
 
-def is_authenticated(credentials:HTTPAuthorizationCredentials=Depends(oauth_bearer), db:Session=Depends(get_db)):
+
+# user_id -> UserAccess
+permission_cache = TTLCache(maxsize=PERMISSION_CACHE_SIZE, ttl=PERMISSION_CACHE_TTL)
+
+
+def build_user_access(user):
+    permissions = {per.name for per in user.permissions}
+    for role in user.roles:
+        permissions.update(per.name for per in role.permissions)
+    access = UserAccess(
+        permissions=frozenset(permissions),
+        roles=frozenset(role.name for role in user.roles),
+        is_staff=bool(user.is_staff),
+        is_superuser=bool(user.is_superuser),
+    )
+    permission_cache.set(user.id, access)
+    return access
+
+
+def _drop_user_access(user_id:int=None):
+    # no user_id: drop everything (role permissions changed, affects many users)
+    if user_id is None:
+        permission_cache.clear()
+    else:
+        permission_cache.pop(user_id)
+
+
+invalidator.register("user_access", _drop_user_access)
+
+
+def invalidate_user_access(user_id:int=None):
+    # every worker drops its copy, not only this one
+    invalidator.publish("user_access", user_id)
+
+
+
+async def is_authenticated(credentials:HTTPAuthorizationCredentials=Depends(oauth_bearer), db:AsyncSession=Depends(get_async_db)):
     if not credentials:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Unauthorized!"
         )
-    is_valid_token = validate_access_token(token=credentials.credentials, db=db)
+    is_valid_token = await validate_access_token(token=credentials.credentials, db=db)
     if is_valid_token is not None:
         return is_valid_token
     raise HTTPException(
@@ -26,20 +71,30 @@ def is_authenticated(credentials:HTTPAuthorizationCredentials=Depends(oauth_bear
         )
 
 
-def get_current_user(credentials=Depends(is_authenticated), db:Session=Depends(get_db)):
-    user = db.query(User).filter(User.username==credentials["username"]).first()
-    return user
+async def get_current_user(credentials=Depends(is_authenticated), db:AsyncSession=Depends(get_async_db)):
+    # the bare row, one primary key lookup; permission checks go through
+    # get_user_access and its cache instead
+    return await db.get(User, int(credentials["sub"]))
+
+
+async def get_user_access(credentials=Depends(is_authenticated), db:AsyncSession=Depends(get_async_db)):
+    user_id = int(credentials["sub"])
+    access = permission_cache.get(user_id)
+    if access is not None:
+        return access
+    user = await get_user(user_id=user_id, db=db)
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Unauthorized!"
+        )
+    return build_user_access(user)
 
 
 def required_permission(req_permissions:list):
-    def has_permission(user=Depends(get_current_user)):
-        user_permissions = [per.name for per in user.permissions]
-        for role in user.roles:
-            for per in role.permissions:
-                user_permissions.append(per.name)
-        for permission in req_permissions:
-            if permission in user_permissions:
-                return True
+    def has_permission(access:UserAccess=Depends(get_user_access)):
+        if not access.permissions.isdisjoint(req_permissions):
+            return True
 
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -50,12 +105,9 @@ def required_permission(req_permissions:list):
 
 
 def role_required(req_roles:list):
-    def has_permission(user=Depends(get_current_user)):
-        user_roles = [role.name for role in user.roles]
-        
-        for role in req_roles:
-            if role in user_roles:
-                return True
+    def has_permission(access:UserAccess=Depends(get_user_access)):
+        if not access.roles.isdisjoint(req_roles):
+            return True
 
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -64,7 +116,27 @@ def role_required(req_roles:list):
     return has_permission
 
 
-def is_admin_user(user=Depends(get_current_user)):
-    if user.is_staff==True or user.is_superuser:
+def is_admin_user(access:UserAccess=Depends(get_user_access)):
+    if access.is_staff==True or access.is_superuser:
         return True
-    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Permission denied!")        
\ No newline at end of file
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Permission denied!")        
+
+
+async def get_websocket_user(websocket:WebSocket):
+    """User behind a websocket handshake, or None.
+
+    Browsers can't set headers on a websocket, so the access token may also
+    come as the `token` query parameter.
+    """
+    token = websocket.query_params.get("token")
+    header = websocket.headers.get("authorization", "")
+    if not token and header.lower().startswith("bearer "):
+        token = header[7:]
+    if not token:
+        return None
+    async with AsyncSessionLocal() as db:
+        try:
+            credentials = await validate_access_token(token=token, db=db)
+        except HTTPException:
+            return None
+        return await db.get(User, int(credentials["sub"]))
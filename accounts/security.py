@@ -2,26 +2,114 @@ from passlib.hash import argon2
 from fastapi import HTTPException, status
 from server.settings import (
     JWT_ALGORITHM, JWT_SECRET_KEY, 
-    ACCESSTOKEN_EXPIRED_TIME, REFRESHTOKEN_EXPIRED_TIME)
+    ACCESSTOKEN_EXPIRED_TIME, REFRESHTOKEN_EXPIRED_TIME,
+    ARGON2_TIME_COST, ARGON2_MEMORY_COST, ARGON2_PARALLELISM,
+    PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_QUEUE,
+    JWT_CACHE_ENABLED, JWT_CACHE_SIZE)
+from server.cache import TTLCache
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 import jwt
+import hashlib
+import time
+from uuid import uuid4
 from datetime import datetime, timedelta, timezone
 
 
 
+password_hasher = argon2.using(
+    time_cost=ARGON2_TIME_COST,
+    memory_cost=ARGON2_MEMORY_COST,
+    parallelism=ARGON2_PARALLELISM)
 
 
 def hash_password(password):
-    return argon2.hash(password)
+    return password_hasher.hash(password)
 
 def verify_password(password, hashed_password):
-    return argon2.verify(password, hashed_password)
+    return password_hasher.verify(password, hashed_password)
+
+def password_needs_rehash(hashed_password):
+    return password_hasher.needs_update(hashed_password)
+
+
+class PasswordHashPool:
+    """Runs argon2 in worker threads so login/register never block the event loop.
+
+    argon2-cffi releases the GIL, so threads give real parallelism. At most
+    `workers` hashes run at once (a semaphore on the loop hands out the
+    slots); once `max_queue` calls are waiting new ones get 503 instead of
+    piling up.
+    """
+
+    def __init__(self, workers:int, max_queue:int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="argon2")
+        self._semaphore = None
+        self._loop = None
+        # only touched on the event loop, never from the worker threads
+        self.running = 0
+        self.waiting = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _slots(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.workers)
+            self._loop = loop
+        return self._semaphore
+
+    async def run(self, func, *args):
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many login attempts, try again later")
+        slots = self._slots()
+        self.waiting += 1
+        try:
+            await slots.acquire()
+        finally:
+            # also when the request is cancelled while queued
+            self.waiting -= 1
+        self.running += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+        finally:
+            self.running -= 1
+            slots.release()
+        self.completed += 1
+        return result
+
+    def stats(self):
+        return {
+            "workers":self.workers,
+            "running":self.running,
+            "waiting":self.waiting,
+            "max_queue":self.max_queue,
+            "completed":self.completed,
+            "rejected":self.rejected,
+        }
+
+
+password_pool = PasswordHashPool(workers=PASSWORD_HASH_WORKERS, max_queue=PASSWORD_HASH_MAX_QUEUE)
+
+
+async def hash_password_async(password):
+    return await password_pool.run(hash_password, password)
+
+async def verify_password_async(password, hashed_password):
+    return await password_pool.run(verify_password, password, hashed_password)
 
 
 def generate_token(payload, expired_time):
     current_time = datetime.now(timezone.utc)
     payload.update({
         "iat":current_time,
-        "exp":current_time + expired_time
+        "exp":current_time + expired_time,
+        "jti":uuid4().hex,
     })
     return jwt.encode(payload, JWT_SECRET_KEY, algorithm=JWT_ALGORITHM)
 
@@ -45,12 +133,33 @@ def create_refresh_token(username, user_id):
 
 
 
+# token -> already verified claims, kept until the token's exp
+verified_tokens = TTLCache(maxsize=JWT_CACHE_SIZE, ttl=ACCESSTOKEN_EXPIRED_TIME.total_seconds())
+
+
 def decode_jwt(token:str):
+    if JWT_CACHE_ENABLED:
+        payload = verified_tokens.get(token)
+        if payload is not None:
+            return payload
     try:
         payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=[JWT_ALGORITHM])
-        return payload
     except Exception as error:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(error)
-        )
\ No newline at end of file
+        )
+    if JWT_CACHE_ENABLED:
+        ttl = payload["exp"] - time.time()
+        if ttl > 0:
+            verified_tokens.set(token, payload, ttl=ttl)
+    return payload
+
+
+def forget_token(token:str):
+    verified_tokens.pop(token)
+
+
+def token_key(token:str, payload:dict):
+    # tokens issued before jti was added are identified by their hash
+    return payload.get("jti") or hashlib.sha256(token.encode()).hexdigest()
\ No newline at end of file
@@ -1,10 +1,11 @@
 from fastapi import HTTPException, status
 from .security import decode_jwt
-from .models import BlackListTokens
+from .blacklist import token_blacklist
 
-def validate_access_token(token:str, db):
+
+async def validate_access_token(token:str, db):
     credentials = decode_jwt(token)
-    is_blocked_token = db.query(BlackListTokens).filter(BlackListTokens.token == token).first()
+    is_blocked_token = await token_blacklist.is_revoked(token, credentials, db)
     if is_blocked_token:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -15,14 +16,14 @@ def validate_access_token(token:str, db):
             detail="Invalid token")
     return credentials
 
-def validate_refresh_token(token:str, db):
-    is_blocked_token = db.query(BlackListTokens).filter(BlackListTokens.token == token).first()
+async def validate_refresh_token(token:str, db):
+    credentials = decode_jwt(token)
+    is_blocked_token = await token_blacklist.is_revoked(token, credentials, db)
     if is_blocked_token:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Token already blocked")
     
-    credentials = decode_jwt(token)
     if credentials["type"] != "refresh":
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
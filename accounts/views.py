@@ -1,42 +1,44 @@
 from fastapi import APIRouter
 from fastapi import Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from server.settings import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from server.settings import get_async_db
 from .models import *
 from .schemas import *
 from .helpers import *
 from .security import *
 from .validators import *
+from .blacklist import token_blacklist
 from .permissions import *
 
 auth = APIRouter()
 
 @auth.post("/register", response_model=UserSchema)
-async def register_api_view(data:RegisterSchema, db:Session=Depends(get_db)):
+async def register_api_view(data:RegisterSchema, db:AsyncSession=Depends(get_async_db)):
     print(data.username)
-    user = get_user(username=data.username, db=db)
+    user = await get_user(username=data.username, db=db)
     if user is not None:
         raise HTTPException(detail="User already exists!", status_code=status.HTTP_400_BAD_REQUEST)
-    password_hash = hash_password(data.password)
+    password_hash = await hash_password_async(data.password)
     new_user = User(username=data.username, password=password_hash)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-    return new_user
+    await db.commit()
+    return await get_user(user_id=new_user.id, db=db)
 
 
 @auth.post("/add-user", dependencies=[Depends(is_admin_user), Depends(role_required(["admin"]))], response_model=UserSchema)
-async def add_user_api_view(data:AddUserShcema, db:Session=Depends(get_db)):
-    q = get_user(username=data.username, db=db)
+async def add_user_api_view(data:AddUserShcema, db:AsyncSession=Depends(get_async_db)):
+    q = await get_user(username=data.username, db=db)
     if q is not None:
         raise HTTPException(detail="User already exists!", status_code=status.HTTP_400_BAD_REQUEST)
-    user = create_user(data=data, db=db)
+    user = await create_user(data=data, db=db)
     return user
 
 
 @auth.post("/login")
-async def register_api_view(data:LoginSchema, db:Session=Depends(get_db)):
-    user = authenticate(username=data.username, password=data.password, db=db)
+async def register_api_view(data:LoginSchema, db:AsyncSession=Depends(get_async_db)):
+    user = await authenticate(username=data.username, password=data.password, db=db)
     if not user:
         return HTTPException(detail="Invalid credentials!", status_code=status.HTTP_400_BAD_REQUEST)
     
@@ -47,13 +49,10 @@ async def register_api_view(data:LoginSchema, db:Session=Depends(get_db)):
 
 
 @auth.post("/logout", dependencies=[Depends(is_authenticated)])
-async def logout_api_view(token:str, db:Session=Depends(get_db)):
-    is_valid_token = validate_refresh_token(token, db)
+async def logout_api_view(token:str, db:AsyncSession=Depends(get_async_db)):
+    is_valid_token = await validate_refresh_token(token, db)
     if is_valid_token is not None:
-        blocked_token = BlackListTokens(token=token)
-        db.add(blocked_token)
-        db.commit()
-        db.refresh(blocked_token)
+        await token_blacklist.revoke(token, is_valid_token, db)
         return {
             "message":"logged out user",
             "status":status.HTTP_200_OK
@@ -63,8 +62,8 @@ async def logout_api_view(token:str, db:Session=Depends(get_db)):
 
 
 @auth.post("/refresh", dependencies=[Depends(is_authenticated)])
-async def refresh_token(token:str, db:Session=Depends(get_db)):
-    is_valid_token = validate_refresh_token(token=token, db=db)
+async def refresh_token(token:str, db:AsyncSession=Depends(get_async_db)):
+    is_valid_token = await validate_refresh_token(token=token, db=db)
     if is_valid_token:
         return {
             "refresh":token,
@@ -78,17 +77,26 @@ async def refresh_token(token:str, db:Session=Depends(get_db)):
     )
 
 
+@auth.get("/password-hasher/stats", dependencies=[Depends(is_admin_user)])
+async def password_hasher_stats():
+    return password_pool.stats()
+
+
 @auth.get("/me", response_model=UserSchema)
-async def get_profile(user=Depends(get_current_user)):
+async def get_profile(credentials=Depends(is_authenticated), db:AsyncSession=Depends(get_async_db)):
+    # the one endpoint that returns the permission and role rows
+    user = await get_user(user_id=int(credentials["sub"]), db=db)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized!")
     return user
 
 
 @auth.post("/set-permissions-to-user", dependencies=[Depends(is_admin_user)], response_model=UserSchema)
-async def set_permissions_to_user_api_view(data:SetUserPermissionsSchema, db:Session=Depends(get_db)):
-    user = get_user(user_id=data.user_id, db=db)
+async def set_permissions_to_user_api_view(data:SetUserPermissionsSchema, db:AsyncSession=Depends(get_async_db)):
+    user = await get_user(user_id=data.user_id, db=db)
     if not user:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User doedn't exists!")
-    permissions = db.query(Permission).filter(Permission.id.in_(data.permissions)).all()
+    permissions = (await db.execute(select(Permission).where(Permission.id.in_(data.permissions)))).scalars().all()
     print(permissions)
     if not permissions:
         print("error")
@@ -97,26 +105,26 @@ async def set_permissions_to_user_api_view(data:SetUserPermissionsSchema, db:Ses
     for perm in permissions:
         if perm not in user.permissions:
             user.permissions.append(perm)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    invalidate_user_access(user.id)
     return user
 
 
 @auth.post("/add-role", response_model=RoleSchema)
-async def create_role_api_view(data:AddRoleSchema, db:Session=Depends(get_db)):
-    role = Role(name=data.name)
+async def create_role_api_view(data:AddRoleSchema, db:AsyncSession=Depends(get_async_db)):
+    role = Role(name=data.name, permissions=[])
     db.add(role)
-    db.commit()
-    db.refresh(role)
+    await db.commit()
     return role
 
 
 @auth.post("/add-permissions-to-role", response_model=RoleSchema)
-async def add_permissions_to_role(data:SetRolePermissionsSchema, db:Session=Depends(get_db)):
-    role = db.query(Role).filter(Role.id==data.role_id).first()
+async def add_permissions_to_role(data:SetRolePermissionsSchema, db:AsyncSession=Depends(get_async_db)):
+    role = (await db.execute(
+        select(Role).options(selectinload(Role.permissions)).where(Role.id==data.role_id))).scalars().first()
     if not role:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Role not found!")
-    permissions = db.query(Permission).filter(Permission.id.in_(data.permissions)).all()
+    permissions = (await db.execute(select(Permission).where(Permission.id.in_(data.permissions)))).scalars().all()
     print(permissions)
     if not permissions:
         print("error")
@@ -125,25 +133,26 @@ async def add_permissions_to_role(data:SetRolePermissionsSchema, db:Session=Depe
     for perm in permissions:
         if perm not in role.permissions:
             role.permissions.append(perm)
-    db.commit()
-    db.refresh(role)
+    await db.commit()
+    invalidate_user_access()
     return role
 
 
 @auth.post("/add-role-to-user", response_model=UserSchema)
-async def add_role_to_user_view(data:SetRoleToUserSchema, db:Session=Depends(get_db)):
-    user = get_user(user_id=data.user_id, db=db)
+async def add_role_to_user_view(data:SetRoleToUserSchema, db:AsyncSession=Depends(get_async_db)):
+    user = await get_user(user_id=data.user_id, db=db)
     if not user:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User does not exists!")
-    roles = db.query(Role).filter(Role.id.in_(data.roles)).all()
+    roles = (await db.execute(
+        select(Role).options(selectinload(Role.permissions)).where(Role.id.in_(data.roles)))).scalars().all()
     if not roles:
         raise HTTPException(detail="Roles doesn't exists", status_code=status.HTTP_400_BAD_REQUEST)
     
     for r in roles:
         if r not in user.roles:
             user.roles.append(r)
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    invalidate_user_access(user.id)
     return user
 
 
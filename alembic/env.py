@@ -7,6 +7,7 @@ from alembic import context
 from server.models import BaseModel
 from accounts.models import *
 from smartedu.models import *
+from chats.models import *
 from server.settings import DATABASE_URL
 
 # this is the Alembic Config object, which provides
@@ -25,6 +26,13 @@ if config.config_file_name is not None:
 config.set_main_option('sqlalchemy.url', DATABASE_URL)
 target_metadata = BaseModel.metadata
 
+
+def include_object(object, name, type_, reflected, compare_to):
+    # full-text search tables are written by hand in their migration
+    if type_ == "table" and name.startswith("teacher_search"):
+        return False
+    return True
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -49,6 +57,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_object=include_object,
     )
 
     with context.begin_transaction():
@@ -70,7 +79,8 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection, target_metadata=target_metadata,
+            include_object=include_object,
         )
 
         with context.begin_transaction():
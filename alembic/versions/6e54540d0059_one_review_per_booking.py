@@ -0,0 +1,48 @@
+"""one review per booking
+
+Revision ID: 6e54540d0059
+Revises: b7d6af07baff
+Create Date: 2026-10-18 17:51:51.760452
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e54540d0059'
+down_revision: Union[str, Sequence[str], None] = 'b7d6af07baff'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+REBUILD_RATINGS = (
+    "UPDATE teacher_profiles SET "
+    "rating_sum = COALESCE((SELECT SUM(rating) FROM reviews WHERE reviews.teacher_id = teacher_profiles.id), 0), "
+    "rating_count = (SELECT COUNT(*) FROM reviews WHERE reviews.teacher_id = teacher_profiles.id), "
+    "rating = COALESCE((SELECT AVG(rating) FROM reviews WHERE reviews.teacher_id = teacher_profiles.id), 0)")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # keep the first review of each booking, then rebuild the aggregates the
+    # duplicates were counted into
+    op.execute(
+        "DELETE FROM reviews WHERE booking_id IS NOT NULL AND id NOT IN "
+        "(SELECT MIN(id) FROM reviews WHERE booking_id IS NOT NULL GROUP BY booking_id)")
+    op.execute(REBUILD_RATINGS)
+    op.drop_index('ix_reviews_booking_id', table_name='reviews')
+    with op.batch_alter_table('reviews') as batch_op:
+        batch_op.alter_column('comment', existing_type=sa.Text(), nullable=True)
+    op.create_index('ix_reviews_booking_id', 'reviews', ['booking_id'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_reviews_booking_id', table_name='reviews')
+    op.execute("UPDATE reviews SET comment = '' WHERE comment IS NULL")
+    with op.batch_alter_table('reviews') as batch_op:
+        batch_op.alter_column('comment', existing_type=sa.Text(), nullable=False)
+    op.create_index('ix_reviews_booking_id', 'reviews', ['booking_id'], unique=False)
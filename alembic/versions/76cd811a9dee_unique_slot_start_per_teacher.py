@@ -0,0 +1,36 @@
+"""unique slot start per teacher
+
+Revision ID: 76cd811a9dee
+Revises: 6e54540d0059
+Create Date: 2026-10-18 18:06:16.174837
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '76cd811a9dee'
+down_revision: Union[str, Sequence[str], None] = '6e54540d0059'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # racing expansions could repeat a slot; keep the booked copy, else the first
+    op.execute(
+        "DELETE FROM schedule_slots WHERE id NOT IN (SELECT slot_id FROM bookings WHERE slot_id IS NOT NULL) "
+        "AND EXISTS (SELECT 1 FROM schedule_slots AS other "
+        "WHERE other.teacher_id = schedule_slots.teacher_id AND other.start_time = schedule_slots.start_time "
+        "AND (other.id < schedule_slots.id OR other.id IN (SELECT slot_id FROM bookings WHERE slot_id IS NOT NULL)))")
+    op.drop_index('ix_schedule_slots_teacher_id_start_time', table_name='schedule_slots')
+    op.create_index('ix_schedule_slots_teacher_id_start_time', 'schedule_slots', ['teacher_id', 'start_time'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_schedule_slots_teacher_id_start_time', table_name='schedule_slots')
+    op.create_index('ix_schedule_slots_teacher_id_start_time', 'schedule_slots', ['teacher_id', 'start_time'], unique=False)
@@ -0,0 +1,53 @@
+"""maintain teacher rating aggregates
+
+Revision ID: 981691fbaf57
+Revises: 041967a4e989
+Create Date: 2026-10-18 17:21:19.667742
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '981691fbaf57'
+down_revision: Union[str, Sequence[str], None] = '041967a4e989'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # sqlite rebuilds the table to change the column type; the expression
+    # index on rating can't be carried over, so recreate it afterwards
+    op.drop_index('ix_teacher_profiles_catalog', table_name='teacher_profiles')
+    with op.batch_alter_table('teacher_profiles') as batch_op:
+        batch_op.add_column(sa.Column('rating_sum', sa.Integer(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('rating_count', sa.Integer(), server_default='0', nullable=False))
+        batch_op.alter_column('rating',
+               existing_type=sa.INTEGER(),
+               type_=sa.Float(),
+               existing_nullable=False,
+               existing_server_default=sa.text("'0'"))
+    op.execute(
+        "UPDATE teacher_profiles SET "
+        "rating_sum = COALESCE((SELECT SUM(rating) FROM reviews WHERE reviews.teacher_id = teacher_profiles.id), 0), "
+        "rating_count = (SELECT COUNT(*) FROM reviews WHERE reviews.teacher_id = teacher_profiles.id), "
+        "rating = COALESCE((SELECT AVG(rating) FROM reviews WHERE reviews.teacher_id = teacher_profiles.id), 0)")
+    op.create_index('ix_teacher_profiles_catalog', 'teacher_profiles', [sa.literal_column('rating DESC'), 'price_per_lesson', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_teacher_profiles_catalog', table_name='teacher_profiles')
+    with op.batch_alter_table('teacher_profiles') as batch_op:
+        batch_op.alter_column('rating',
+               existing_type=sa.Float(),
+               type_=sa.INTEGER(),
+               existing_nullable=False,
+               existing_server_default=sa.text("'0'"))
+        batch_op.drop_column('rating_count')
+        batch_op.drop_column('rating_sum')
+    op.create_index('ix_teacher_profiles_catalog', 'teacher_profiles', [sa.literal_column('rating DESC'), 'price_per_lesson', 'id'], unique=False)
@@ -0,0 +1,58 @@
+"""add full-text search index for teachers
+
+Revision ID: a528f7d4bcc5
+Revises: 99e0694c939a
+Create Date: 2026-10-18 17:18:21.492695
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a528f7d4bcc5'
+down_revision: Union[str, Sequence[str], None] = '99e0694c939a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.create_table('teacher_search',
+        sa.Column('teacher_id', sa.Integer(), nullable=False),
+        sa.Column('document', postgresql.TSVECTOR(), nullable=False),
+        sa.ForeignKeyConstraint(['teacher_id'], ['teacher_profiles.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('teacher_id')
+        )
+        op.create_index('ix_teacher_search_document', 'teacher_search', ['document'], postgresql_using='gin')
+        op.execute(
+            "INSERT INTO teacher_search (teacher_id, document) "
+            "SELECT tp.id, "
+            "setweight(to_tsvector('simple', u.username), 'A') || "
+            "setweight(to_tsvector('simple', COALESCE(string_agg(s.name, ' '), '')), 'B') || "
+            "setweight(to_tsvector('simple', COALESCE(tp.description, '')), 'C') "
+            "FROM teacher_profiles tp JOIN users u ON u.id = tp.user_id "
+            "LEFT JOIN teacher_subjects ts ON ts.teacher_id = tp.id "
+            "LEFT JOIN subjects s ON s.id = ts.subject_id "
+            "GROUP BY tp.id, u.username, tp.description")
+    else:
+        op.execute(
+            "CREATE VIRTUAL TABLE teacher_search USING fts5("
+            "description, username, subjects, tokenize = 'unicode61 remove_diacritics 2')")
+        op.execute(
+            "INSERT INTO teacher_search (rowid, description, username, subjects) "
+            "SELECT tp.id, COALESCE(tp.description, ''), u.username, "
+            "COALESCE((SELECT group_concat(s.name, ' ') FROM teacher_subjects ts "
+            "JOIN subjects s ON s.id = ts.subject_id WHERE ts.teacher_id = tp.id), '') "
+            "FROM teacher_profiles tp JOIN users u ON u.id = tp.user_id")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_teacher_search_document', table_name='teacher_search')
+    op.drop_table('teacher_search')
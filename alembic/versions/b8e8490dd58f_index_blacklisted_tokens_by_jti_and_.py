@@ -0,0 +1,61 @@
+"""index blacklisted tokens by jti and track expiry
+
+Revision ID: b8e8490dd58f
+Revises: b77b1cd3976e
+Create Date: 2026-10-18 17:08:28.691035
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import hashlib
+from datetime import datetime, timedelta
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b8e8490dd58f'
+down_revision: Union[str, Sequence[str], None] = 'b77b1cd3976e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('blacklisted_tokens') as batch_op:
+        batch_op.add_column(sa.Column('jti', sa.String(length=64), nullable=True))
+        batch_op.add_column(sa.Column('expires_at', sa.DateTime(), nullable=True))
+
+    # existing rows are refresh tokens stored in full: key them by hash and
+    # give them the longest possible lifetime from when they were blocked
+    conn = op.get_bind()
+    rows = conn.execute(sa.text('SELECT id, token, created_at FROM blacklisted_tokens')).fetchall()
+    for row_id, token, created_at in rows:
+        if isinstance(created_at, str):
+            created_at = datetime.fromisoformat(created_at)
+        conn.execute(
+            sa.text('UPDATE blacklisted_tokens SET jti = :jti, expires_at = :expires_at WHERE id = :id'),
+            {
+                'id': row_id,
+                'jti': hashlib.sha256(token.encode()).hexdigest(),
+                'expires_at': (created_at or datetime.utcnow()) + timedelta(days=1),
+            })
+
+    with op.batch_alter_table('blacklisted_tokens') as batch_op:
+        batch_op.alter_column('jti', existing_type=sa.String(length=64), nullable=False)
+        batch_op.alter_column('expires_at', existing_type=sa.DateTime(), nullable=False)
+        batch_op.drop_column('token')
+        batch_op.create_index('ix_blacklisted_tokens_jti', ['jti'], unique=True)
+        batch_op.create_index('ix_blacklisted_tokens_expires_at', ['expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # full tokens can't be recovered from their hash, so blocked entries are dropped
+    op.execute('DELETE FROM blacklisted_tokens')
+    with op.batch_alter_table('blacklisted_tokens') as batch_op:
+        batch_op.drop_index('ix_blacklisted_tokens_expires_at')
+        batch_op.drop_index('ix_blacklisted_tokens_jti')
+        batch_op.add_column(sa.Column('token', sa.String(), nullable=False))
+        batch_op.drop_column('expires_at')
+        batch_op.drop_column('jti')
@@ -0,0 +1,78 @@
+"""use utc datetimes for schedule slots
+
+Revision ID: ec87efdafb28
+Revises: 981691fbaf57
+Create Date: 2026-10-18 17:24:31.854432
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'ec87efdafb28'
+down_revision: Union[str, Sequence[str], None] = '981691fbaf57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _convert(to_type, sqlite_expr, postgresql_using):
+    if op.get_bind().dialect.name != "sqlite":
+        for column in ('start_time', 'end_time'):
+            op.alter_column('schedule_slots', column, type_=to_type, postgresql_using=postgresql_using.format(column=column))
+        return
+    # batch mode would CAST the old text into the new column, which sqlite
+    # turns into a bare year for DATETIME; copy through fresh columns instead
+    with op.batch_alter_table('schedule_slots') as batch_op:
+        batch_op.add_column(sa.Column('start_time_new', to_type, nullable=True))
+        batch_op.add_column(sa.Column('end_time_new', to_type, nullable=True))
+    op.execute(
+        "UPDATE schedule_slots SET start_time_new = {}, end_time_new = {}".format(
+            sqlite_expr.format(column='start_time'), sqlite_expr.format(column='end_time')))
+    with op.batch_alter_table('schedule_slots') as batch_op:
+        batch_op.drop_column('start_time')
+        batch_op.drop_column('end_time')
+        batch_op.alter_column('start_time_new', new_column_name='start_time', existing_type=to_type, nullable=False)
+        batch_op.alter_column('end_time_new', new_column_name='end_time', existing_type=to_type, nullable=False)
+
+
+HAS_PROFILE = "EXISTS (SELECT 1 FROM teacher_profiles WHERE teacher_profiles.user_id = {table}.teacher_id)"
+TO_PROFILE_ID = "(SELECT id FROM teacher_profiles WHERE teacher_profiles.user_id = {table}.teacher_id)"
+TO_USER_ID = "(SELECT user_id FROM teacher_profiles WHERE teacher_profiles.id = {table}.teacher_id)"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # slots (and bookings, which copy the slot's teacher) stored the teacher's
+    # user id; they now hold the teacher profile id. Unbooked slots of users
+    # without a profile can't be mapped and were never listed, drop them.
+    op.execute(
+        "DELETE FROM schedule_slots WHERE NOT " + HAS_PROFILE.format(table="schedule_slots") +
+        " AND id NOT IN (SELECT slot_id FROM bookings WHERE slot_id IS NOT NULL)")
+    for table in ('schedule_slots', 'bookings'):
+        op.execute(
+            f"UPDATE {table} SET teacher_id = {TO_PROFILE_ID.format(table=table)} "
+            f"WHERE {HAS_PROFILE.format(table=table)}")
+    op.drop_index('ix_schedule_slots_teacher_id_start_time', table_name='schedule_slots')
+    # old values are free-form "YYYY-MM-DD HH:MM" strings, read as UTC
+    # (stored in SQLAlchemy's sqlite format so they compare with new values)
+    _convert(sa.DateTime(timezone=True), "strftime('%Y-%m-%d %H:%M:%f', {column}) || '000'", "{column}::timestamp AT TIME ZONE 'UTC'")
+    op.execute("UPDATE schedule_slots SET status = 'available' WHERE status IS NULL")
+    with op.batch_alter_table('schedule_slots') as batch_op:
+        batch_op.alter_column('status', existing_type=sa.String(), nullable=False)
+    op.create_index('ix_schedule_slots_teacher_id_start_time', 'schedule_slots', ['teacher_id', 'start_time'], unique=False)
+    op.create_index('ix_schedule_slots_status_start_time', 'schedule_slots', ['status', 'start_time'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_schedule_slots_status_start_time', table_name='schedule_slots')
+    op.drop_index('ix_schedule_slots_teacher_id_start_time', table_name='schedule_slots')
+    _convert(sa.String(), "strftime('%Y-%m-%d %H:%M', {column})", "to_char({column} AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI')")
+    with op.batch_alter_table('schedule_slots') as batch_op:
+        batch_op.alter_column('status', existing_type=sa.String(), nullable=True)
+    for table in ('schedule_slots', 'bookings'):
+        op.execute(f"UPDATE {table} SET teacher_id = {TO_USER_ID.format(table=table)} WHERE {TO_USER_ID.format(table=table)} IS NOT NULL")
+    op.create_index('ix_schedule_slots_teacher_id_start_time', 'schedule_slots', ['teacher_id', 'start_time'], unique=False)
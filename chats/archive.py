@@ -0,0 +1,103 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from itertools import takewhile
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+from server.settings import (
+    SessionLocal, MESSAGE_ARCHIVE_AFTER_DAYS, MESSAGE_ARCHIVE_INTERVAL, MESSAGE_ARCHIVE_BATCH_SIZE,
+)
+from .models import Chat, GroupMessage, GroupMessageArchive, Message, MessageArchive
+
+
+logger = logging.getLogger(__name__)
+
+
+def chat_last_messages(db: Session, rows):
+    # the inbox joins Chat.last_message_id against the hot table
+    chat_ids = {row.chat_id for row in rows}
+    return set(db.scalars(select(Chat.last_message_id).where(Chat.id.in_(chat_ids))))
+
+
+def archive_table(db: Session, model, archive, parent_column, cutoff: datetime, batch_size: int = MESSAGE_ARCHIVE_BATCH_SIZE, keep=None):
+    """Move the rows of `model` created before `cutoff` into `archive`.
+
+    Walks the primary key from the bottom, one transaction per batch: ids
+    grow with created_at, so the old rows are the head of the table and no
+    created_at index is needed. It stops at the first row that is too new,
+    which keeps every parent's archived ids below its hot ones (keyset_page
+    relies on that). The newest row of the table always stays, so SQLite
+    never hands its id out again; `keep(db, rows)` may pin more.
+    """
+    newest = db.query(func.max(model.id)).scalar()
+    columns = [column.name for column in model.__table__.columns]
+    moved, last_id = 0, 0
+    while newest is not None:
+        rows = (
+            db.query(model.id, model.created_at, parent_column)
+            .filter(model.id > last_id, model.id < newest)
+            .order_by(model.id)
+            .limit(batch_size)
+            .all()
+        )
+        old = list(takewhile(lambda row: row.created_at < cutoff, rows))
+        pinned = keep(db, old) if keep is not None and old else set()
+        ids = [row.id for row in old if row.id not in pinned]
+        if ids:
+            db.execute(
+                insert(archive).from_select(
+                    columns, select(*(model.__table__.c[name] for name in columns)).where(model.id.in_(ids))
+                )
+            )
+            db.execute(delete(model).where(model.id.in_(ids)).execution_options(synchronize_session=False))
+            moved += len(ids)
+        db.commit()
+        if len(old) < batch_size:
+            break
+        last_id = old[-1].id
+    return moved
+
+
+def archive_messages(db: Session, days: int = MESSAGE_ARCHIVE_AFTER_DAYS):
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    return {
+        "messages": archive_table(db, Message, MessageArchive, Message.chat_id, cutoff, keep=chat_last_messages),
+        "group_messages": archive_table(db, GroupMessage, GroupMessageArchive, GroupMessage.group_id, cutoff),
+    }
+
+
+class MessageArchiver:
+    """Background job that moves old history to the archive tables every MESSAGE_ARCHIVE_INTERVAL seconds."""
+
+    def __init__(self, interval: int = MESSAGE_ARCHIVE_INTERVAL):
+        self.interval = interval
+        self._task = None
+
+    def _run_once(self):
+        db = SessionLocal()
+        try:
+            return archive_messages(db)
+        finally:
+            db.close()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                moved = await asyncio.to_thread(self._run_once)
+                if any(moved.values()):
+                    logger.info("archived %s", moved)
+            except Exception:
+                logger.exception("message archiving failed")
+
+    def start(self):
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+message_archiver = MessageArchiver()
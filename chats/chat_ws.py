@@ -1,19 +1,253 @@
-from fastapi import WebSocket
+import asyncio
+import json
+import logging
+import os
+from collections import Counter
+from time import monotonic
+from fastapi import WebSocket, WebSocketDisconnect, status
+from server.settings import (
+    PUBSUB_BACKEND, PUBSUB_URL, WS_SEND_QUEUE_SIZE, WS_PING_INTERVAL, WS_IDLE_TIMEOUT,
+    WS_RATE_LIMIT, WS_RATE_BURST, WS_MAX_FRAME_BYTES, WS_MAX_CONNECTIONS_PER_USER,
+)
+from .pubsub import PubSubBackend, create_pubsub
+
+
+logger = logging.getLogger(__name__)
+
+# user_id -> open sockets on this worker, shared by every manager
+user_sockets: Counter = Counter()
+
+PING = json.dumps({"type": "ping"})
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = monotonic()
+
+    def allow(self):
+        now = monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class Outbox:
+    """Bounded send queue of one socket, drained by its own writer task.
+
+    Also carries the socket's owner, inbound rate bucket and the time of
+    its last inbound frame.
+    """
+
+    def __init__(self, ws: WebSocket, maxsize: int, user_id: int = None):
+        self.ws = ws
+        self.user_id = user_id
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=maxsize)
+        self.bucket = TokenBucket(WS_RATE_LIMIT, WS_RATE_BURST)
+        self.last_seen = monotonic()
+        self.task = asyncio.create_task(self._write())
+
+    async def _write(self):
+        while True:
+            payload = await self.queue.get()
+            await self.ws.send_text(payload)
+
+    def close(self):
+        self.task.cancel()
+
 
 class ConnectionManager:
-    def __init__(self):
-        self.connections: dict[int, list[WebSocket]] = {}
+    """Sockets of this worker, grouped by room; fan-out goes through a pub/sub backend.
 
-    async def connect(self, chat_id: int, ws: WebSocket):
-        await ws.accept()
-        self.connections.setdefault(chat_id, []).append(ws)
+    A worker subscribes to a room's channel when its first local socket joins
+    and unsubscribes when the last one leaves, so with several workers a
+    broadcast reaches every socket in the room wherever it is connected.
+    Each socket has its own bounded outbox: a slow client never delays the
+    others, and one whose outbox overflows is disconnected. A heartbeat task
+    pings every socket and closes the ones that stopped talking.
+    """
 
-    def disconnect(self, chat_id: int, ws: WebSocket):
-        self.connections[chat_id].remove(ws)
+    def __init__(self, prefix: str = "chat", backend: PubSubBackend = None, queue_size: int = WS_SEND_QUEUE_SIZE):
+        self.prefix = prefix
+        self.queue_size = queue_size
+        self.connections: dict[int, dict[WebSocket, Outbox]] = {}
+        self.backend = backend or create_pubsub(PUBSUB_BACKEND, PUBSUB_URL)
+        self.backend.handler = self._deliver
+        self._heartbeat = None
+        self.dropped = 0
+        self.send_errors = 0
+        self.reaped = 0
+        self.rate_limited = 0
+        self.oversized = 0
+        self.refused = 0
+
+    def channel(self, chat_id: int):
+        return f"{self.prefix}:{chat_id}"
+
+    async def connect(self, chat_id: int, ws: WebSocket, user_id: int = None):
+        """Accept the socket into a room; False (and closed) if the user is at the cap."""
+        if user_id is not None:
+            if user_sockets[user_id] >= WS_MAX_CONNECTIONS_PER_USER:
+                self.refused += 1
+                await ws.close(code=status.WS_1008_POLICY_VIOLATION)
+                return False
+            # reserve before the first await, or concurrent handshakes all pass the check
+            user_sockets[user_id] += 1
+        try:
+            await ws.accept()
+        except BaseException:
+            if user_id is not None:
+                self._release_user(user_id)
+            raise
+        sockets = self.connections.setdefault(chat_id, {})
+        outbox = Outbox(ws, self.queue_size, user_id)
+        outbox.task.add_done_callback(lambda task: self._writer_done(chat_id, ws, task))
+        sockets[ws] = outbox
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.create_task(self._run_heartbeat())
+        if len(sockets) == 1:
+            await self.backend.subscribe(self.channel(chat_id))
+        return True
+
+    async def disconnect(self, chat_id: int, ws: WebSocket):
+        # safe to call more than once: eviction may have removed the socket already
+        sockets = self.connections.get(chat_id)
+        if not sockets or ws not in sockets:
+            return
+        outbox = sockets.pop(ws)
+        outbox.close()
+        if outbox.user_id is not None:
+            self._release_user(outbox.user_id)
+        if not sockets:
+            del self.connections[chat_id]
+            await self.backend.unsubscribe(self.channel(chat_id))
+
+    def _release_user(self, user_id: int):
+        user_sockets[user_id] -= 1
+        if user_sockets[user_id] <= 0:
+            del user_sockets[user_id]
+
+    async def receive(self, chat_id: int, ws: WebSocket):
+        """Next inbound JSON frame of a socket, or None for one that was handled here.
+
+        Pongs only refresh the idle timer and are not rate limited; other
+        frames over the limit are answered with an error and dropped; an
+        oversized frame closes the socket. Raises WebSocketDisconnect when the socket is gone.
+        """
+        message = await ws.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", status.WS_1000_NORMAL_CLOSURE))
+        outbox = self.connections.get(chat_id, {}).get(ws)
+        if outbox is None:
+            # evicted while we were waiting
+            raise WebSocketDisconnect(status.WS_1008_POLICY_VIOLATION)
+        outbox.last_seen = monotonic()
+
+        raw = message.get("text")
+        if raw is None:
+            raw = (message.get("bytes") or b"").decode("utf-8", "replace")
+        if len(raw.encode()) > WS_MAX_FRAME_BYTES:
+            self.oversized += 1
+            await self._evict(chat_id, ws, status.WS_1009_MESSAGE_TOO_BIG)
+            raise WebSocketDisconnect(status.WS_1009_MESSAGE_TOO_BIG)
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            data = None
+        if isinstance(data, dict) and data.get("type") == "pong":
+            return None
+        if not outbox.bucket.allow():
+            self.rate_limited += 1
+            self.send_personal(chat_id, ws, {"error": "rate limit exceeded"})
+            return None
+        if data is None:
+            self.send_personal(chat_id, ws, {"error": "invalid JSON"})
+        return data
 
     async def broadcast(self, chat_id: int, data: dict):
-        for ws in self.connections.get(chat_id, []):
-            await ws.send_json(data)
+        # encoded once, every recipient gets the same string
+        await self.backend.publish(self.channel(chat_id), json.dumps(data))
+
+    def send_personal(self, chat_id: int, ws: WebSocket, data: dict):
+        # through the socket's outbox, so it never interleaves with broadcasts
+        outbox = self.connections.get(chat_id, {}).get(ws)
+        if outbox is not None:
+            try:
+                outbox.queue.put_nowait(json.dumps(data))
+            except asyncio.QueueFull:
+                self.dropped += 1
+
+    async def _deliver(self, channel: str, payload: str):
+        chat_id = int(channel.rsplit(":", 1)[1])
+        for ws, outbox in list(self.connections.get(chat_id, {}).items()):
+            try:
+                outbox.queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                self.dropped += 1
+                await self._evict(chat_id, ws, status.WS_1008_POLICY_VIOLATION)
+
+    async def _run_heartbeat(self):
+        while self.connections:
+            await asyncio.sleep(WS_PING_INTERVAL)
+            deadline = monotonic() - WS_IDLE_TIMEOUT
+            for chat_id, sockets in list(self.connections.items()):
+                for ws, outbox in list(sockets.items()):
+                    if outbox.last_seen < deadline:
+                        # half-open or silent client: stop holding it
+                        self.reaped += 1
+                        await self._evict(chat_id, ws, status.WS_1001_GOING_AWAY)
+                        continue
+                    try:
+                        outbox.queue.put_nowait(PING)
+                    except asyncio.QueueFull:
+                        pass
+
+    def _writer_done(self, chat_id: int, ws: WebSocket, task: asyncio.Task):
+        if task.cancelled():
+            return
+        # send failed: the socket is gone, stop routing messages to it
+        self.send_errors += 1
+        logger.info("dropping socket in %s: %r", self.channel(chat_id), task.exception())
+        asyncio.create_task(self.disconnect(chat_id, ws))
+
+    async def _evict(self, chat_id: int, ws: WebSocket, code: int):
+        await self.disconnect(chat_id, ws)
+        try:
+            await ws.close(code=code)
+        except Exception:
+            pass
+
+    def stats(self, top: int = 20):
+        queued = [outbox.queue.qsize() for sockets in self.connections.values() for outbox in sockets.values()]
+        busiest = sorted(self.connections.items(), key=lambda item: len(item[1]), reverse=True)[:top]
+        return {
+            "worker":os.getpid(),
+            "rooms":len(self.connections),
+            "sockets":len(queued),
+            "sockets_per_room":{chat_id: len(sockets) for chat_id, sockets in busiest},
+            "users_on_worker":len(user_sockets),
+            "sockets_on_worker":sum(user_sockets.values()),
+            "queued":sum(queued),
+            "max_queue_depth":max(queued, default=0),
+            "queue_size":self.queue_size,
+            "dropped":self.dropped,
+            "send_errors":self.send_errors,
+            "reaped":self.reaped,
+            "rate_limited":self.rate_limited,
+            "oversized":self.oversized,
+            "refused":self.refused,
+        }
+
+    async def close(self):
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+        await self.backend.close()
 
 
 manager = ConnectionManager()
+group_manager = ConnectionManager(prefix="group")
@@ -0,0 +1,247 @@
+from sqlalchemy import and_, bindparam, case, func, insert, or_, select, tuple_, union_all, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased
+from server.cache import TTLCache
+from server.settings import SessionLocal, AsyncSessionLocal, GROUP_MEMBERSHIP_CACHE_TTL
+from accounts.models import User
+from .models import Chat, ChatReadCursor, GroupMember, Message
+
+
+# group_id -> frozenset of member user ids
+group_members = TTLCache(maxsize=4096, ttl=GROUP_MEMBERSHIP_CACHE_TTL)
+
+
+def keyset_page(query, id_column, before:int=None, after:int=None, limit:int=50, archive:tuple=None):
+    """One page of a history ordered by id, oldest first.
+
+    `before` pages backwards from a cursor (the newest `limit` rows older than
+    it), `after` pages forwards, neither returns the latest page. Every page is
+    a range scan on the (parent_id, id) index, no matter how deep it is.
+
+    `archive` is an optional (query, id_column) over the archive table of the
+    same history. A parent's archived rows are all older than its hot ones,
+    so a page just carries on into the archive when the hot table runs out;
+    pages that fill up from the hot table never touch it.
+    """
+    tiers = [(query, id_column)]
+    if archive is not None:
+        tiers.insert(0, archive)
+    if before is not None:
+        tiers = [(tier_query.filter(column < before), column) for tier_query, column in tiers]
+    rows = []
+    if after is not None:
+        for tier_query, column in tiers:
+            rows += tier_query.filter(column > after).order_by(column).limit(limit - len(rows)).all()
+            if len(rows) == limit:
+                break
+        return rows
+    for tier_query, column in reversed(tiers):
+        rows += tier_query.order_by(column.desc()).limit(limit - len(rows)).all()
+        if len(rows) == limit:
+            break
+    rows.reverse()
+    return rows
+
+
+def stream_ndjson(model, parent_column, parent_id:int, schema, batch_size:int=1000, archive_model=None):
+    """Yield every row of a history as NDJSON, walking it in keyset batches.
+
+    With `archive_model` the archived rows come first, they are the oldest.
+    """
+    # own session: the request one may already be closed while streaming
+    db: Session = SessionLocal()
+    try:
+        last_id = 0
+        for source in (archive_model, model):
+            if source is None:
+                continue
+            column = getattr(source, parent_column.key)
+            while True:
+                rows = (
+                    db.query(source)
+                    .filter(column == parent_id, source.id > last_id)
+                    .order_by(source.id)
+                    .limit(batch_size)
+                    .all()
+                )
+                if not rows:
+                    break
+                yield "".join(schema.model_validate(row).model_dump_json() + "\n" for row in rows)
+                last_id = rows[-1].id
+                db.expunge_all()
+    finally:
+        db.close()
+
+
+async def advance_read_cursor(db: AsyncSession, chat_id:int, user_id:int, message_id:int):
+    """Move the reader's cursor forward to `message_id`; never backwards.
+
+    Also flips `is_read` on the other side's messages up to it in one
+    ranged UPDATE. Returns False when the cursor was already there.
+    """
+    result = await db.execute(
+        update(ChatReadCursor)
+        .where(
+            ChatReadCursor.chat_id == chat_id,
+            ChatReadCursor.user_id == user_id,
+            ChatReadCursor.last_read_message_id < message_id,
+        )
+        .values(last_read_message_id=message_id)
+    )
+    if result.rowcount == 0:
+        try:
+            async with db.begin_nested():
+                await db.execute(insert(ChatReadCursor).values(
+                    chat_id=chat_id, user_id=user_id, last_read_message_id=message_id))
+        except IntegrityError:
+            # the row exists and is already at or past message_id
+            return False
+    await db.execute(
+        update(Message)
+        .where(
+            Message.chat_id == chat_id,
+            Message.id <= message_id,
+            Message.sender_id != user_id,
+            Message.is_read == False,
+        )
+        .values(is_read=True)
+    )
+    return True
+
+
+def user_chat_ids(user_id:int):
+    """Ids of the user's chats as a UNION ALL of two index lookups.
+
+    `student_id = u OR teacher_id = u` can't be served by one index; each
+    half of the union uses its own (side, last_message_id) index. Only used
+    under IN, so a chat with the user on both sides may appear twice and no
+    de-duplicating temp b-tree is needed.
+    """
+    return union_all(
+        select(Chat.id).where(Chat.student_id == user_id),
+        select(Chat.id).where(Chat.teacher_id == user_id),
+    )
+
+
+async def touch_last_message(db: AsyncSession, values:list, rows:list):
+    """BatchWriter hook: point each chat of the batch at its newest message."""
+    newest = {}
+    for row_values, (message_id, _) in zip(values, rows):
+        chat_id = row_values["chat_id"]
+        newest[chat_id] = max(newest.get(chat_id, 0), message_id)
+    # on the connection: a plain executemany, not the ORM's bulk-by-primary-key path
+    connection = await db.connection()
+    await connection.execute(
+        update(Chat)
+        .where(
+            Chat.id == bindparam("chat_id"),
+            or_(Chat.last_message_id.is_(None), Chat.last_message_id < bindparam("message_id")),
+        )
+        .values(last_message_id=bindparam("message_id")),
+        [{"chat_id": chat_id, "message_id": message_id} for chat_id, message_id in newest.items()],
+    )
+
+
+def unread_counts(db: Session, user_id:int):
+    """{chat_id: unread messages} over all of the user's chats in one grouped query.
+
+    Each chat contributes a range scan of (chat_id, id) above its cursor.
+    """
+    cursor = func.coalesce(ChatReadCursor.last_read_message_id, 0)
+    rows = (
+        db.query(Message.chat_id, func.count())
+        .join(Chat, Chat.id == Message.chat_id)
+        .outerjoin(ChatReadCursor, and_(ChatReadCursor.chat_id == Message.chat_id, ChatReadCursor.user_id == user_id))
+        .filter(
+            Chat.id.in_(user_chat_ids(user_id)),
+            Message.sender_id != user_id,
+            Message.id > cursor,
+        )
+        .group_by(Message.chat_id)
+        .all()
+    )
+    return dict(rows)
+
+
+def _inbox_side(db: Session, side, user_id:int, limit:int, cursor:tuple=None):
+    """(activity, chat_id) of one side's next `limit` chats, newest activity first.
+
+    Walks the (side, last_message_id) index backwards, so only `limit`
+    entries are read however many chats the user has. Chats without
+    messages (activity 0) come last, in id order.
+    """
+    keys = []
+    if cursor is None or cursor[0] > 0:
+        query = select(Chat.last_message_id, Chat.id).where(side == user_id, Chat.last_message_id.is_not(None))
+        if cursor is not None:
+            query = query.where(tuple_(Chat.last_message_id, Chat.id) < cursor)
+        keys = [tuple(row) for row in db.execute(query.order_by(Chat.last_message_id.desc(), Chat.id.desc()).limit(limit))]
+    if len(keys) < limit:
+        query = select(Chat.id).where(side == user_id, Chat.last_message_id.is_(None))
+        if cursor is not None and cursor[0] == 0:
+            query = query.where(Chat.id < cursor[1])
+        keys += [(0, chat_id) for chat_id in db.scalars(query.order_by(Chat.id.desc()).limit(limit - len(keys)))]
+    return keys
+
+
+def inbox_page(db: Session, user_id:int, limit:int=50, cursor:tuple=None):
+    """One page of the user's chats, most recent activity first.
+
+    Each side (student, teacher) is read as a bounded keyset scan of its own
+    index and the two are merged here, so only 2 * `limit` chat keys are
+    looked at rather than sorting all of the user's chats. The page itself is
+    then loaded in one query: the last message (via Chat.last_message_id), the
+    peer's username and the unread count, a (chat_id, id) range count
+    evaluated only for the chats on this page.
+    """
+    keys = set(_inbox_side(db, Chat.student_id, user_id, limit, cursor))
+    keys.update(_inbox_side(db, Chat.teacher_id, user_id, limit, cursor))
+    page_ids = [chat_id for _, chat_id in sorted(keys, reverse=True)[:limit]]
+    if not page_ids:
+        return []
+
+    activity = func.coalesce(Chat.last_message_id, 0)
+    peer_id = case((Chat.student_id == user_id, Chat.teacher_id), else_=Chat.student_id)
+    # the outer query joins the last message, so count over an alias
+    counted = aliased(Message)
+    unread = (
+        select(func.count())
+        .select_from(counted)
+        .where(
+            counted.chat_id == Chat.id,
+            counted.sender_id != user_id,
+            counted.id > func.coalesce(
+                select(ChatReadCursor.last_read_message_id)
+                .where(ChatReadCursor.chat_id == Chat.id, ChatReadCursor.user_id == user_id)
+                .correlate(Chat)
+                .scalar_subquery(),
+                0,
+            ),
+        )
+        .correlate(Chat)
+        .scalar_subquery()
+    )
+    return (
+        db.query(Chat, Message, User.username, unread)
+        .outerjoin(Message, Message.id == Chat.last_message_id)
+        .join(User, User.id == peer_id)
+        .filter(Chat.id.in_(page_ids))
+        .order_by(activity.desc(), Chat.id.desc())
+        .all()
+    )
+
+
+async def is_group_member(group_id:int, user_id:int):
+    """Membership check served from group_members; one query per group on a miss."""
+    members = group_members.get(group_id)
+    if members is None:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(select(GroupMember.user_id).where(GroupMember.group_id == group_id))
+            members = frozenset(result.scalars())
+        group_members.set(group_id, members)
+    return user_id in members
+
+
+def invalidate_group_members(group_id:int):
+    group_members.pop(group_id)
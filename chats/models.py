@@ -1,4 +1,4 @@
-from sqlalchemy import ForeignKey, Text, Boolean
+from sqlalchemy import ForeignKey, Text, Boolean, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from datetime import datetime
 from server.models import BaseModel
@@ -6,13 +6,22 @@ from server.models import BaseModel
 
 class Chat(BaseModel):
     __tablename__ = "chats"
+    __table_args__ = (
+        # a user's chats newest-activity first, one index per side
+        Index("ix_chats_student_id_last_message_id", "student_id", "last_message_id"),
+        Index("ix_chats_teacher_id_last_message_id", "teacher_id", "last_message_id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
 
     student_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     teacher_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
 
-    booking_id: Mapped[int | None] = mapped_column(ForeignKey("bookings.id"), nullable=True)
+    booking_id: Mapped[int | None] = mapped_column(ForeignKey("bookings.id"), nullable=True, index=True)
+
+    # newest message, kept current by the message writer (no FK: messages
+    # already reference chats)
+    last_message_id: Mapped[int | None] = mapped_column(nullable=True)
 
     created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
 
@@ -24,6 +33,10 @@ class Chat(BaseModel):
 
 class Message(BaseModel):
     __tablename__ = "messages"
+    __table_args__ = (
+        # keyset pagination of a chat's history
+        Index("ix_messages_chat_id_id", "chat_id", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
 
@@ -38,6 +51,38 @@ class Message(BaseModel):
     chat: Mapped["Chat"] = relationship(back_populates="messages")
 
 
+class MessageArchive(BaseModel):
+    """Messages moved out of `messages` by chats.archive, same columns and ids.
+
+    `is_read` is frozen at archiving time; read state lives in chat_read_cursors.
+    """
+    __tablename__ = "messages_archive"
+    __table_args__ = (
+        Index("ix_messages_archive_chat_id_id", "chat_id", "id"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+
+    chat_id: Mapped[int] = mapped_column(ForeignKey("chats.id"), nullable=False)
+    sender_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+
+    text: Mapped[str] = mapped_column(Text, nullable=False)
+    is_read: Mapped[bool] = mapped_column(default=False)
+
+    created_at: Mapped[datetime] = mapped_column(nullable=False)
+
+
+class ChatReadCursor(BaseModel):
+    """How far a participant has read a chat; everything above is unread."""
+    __tablename__ = "chat_read_cursors"
+
+    chat_id: Mapped[int] = mapped_column(ForeignKey("chats.id"), primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), primary_key=True)
+
+    last_read_message_id: Mapped[int] = mapped_column(default=0)
+    updated_at: Mapped[datetime] = mapped_column(default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
 class Group(BaseModel):
     __tablename__ = "groups"
 
@@ -61,6 +106,10 @@ class Group(BaseModel):
 
 class GroupMember(BaseModel):
     __tablename__ = "group_members"
+    __table_args__ = (
+        Index("ix_group_members_group_id_user_id", "group_id", "user_id"),
+        Index("ix_group_members_user_id", "user_id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
 
@@ -68,6 +117,7 @@ class GroupMember(BaseModel):
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
 
     is_admin: Mapped[bool] = mapped_column(default=False)
+    joined_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
 
     group: Mapped["Group"] = relationship(back_populates="members")
 
@@ -75,6 +125,9 @@ class GroupMember(BaseModel):
 
 class GroupMessage(BaseModel):
     __tablename__ = "group_messages"
+    __table_args__ = (
+        Index("ix_group_messages_group_id_id", "group_id", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
 
@@ -86,3 +139,18 @@ class GroupMessage(BaseModel):
 
     group: Mapped["Group"] = relationship(back_populates="messages")
 
+
+class GroupMessageArchive(BaseModel):
+    """Group messages moved out of `group_messages` by chats.archive."""
+    __tablename__ = "group_messages_archive"
+    __table_args__ = (
+        Index("ix_group_messages_archive_group_id_id", "group_id", "id"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=False)
+
+    group_id: Mapped[int] = mapped_column(ForeignKey("groups.id"), nullable=False)
+    sender_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+
+    text: Mapped[str] = mapped_column(Text, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(nullable=False)
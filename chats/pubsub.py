@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class PubSubBackend:
+    """Delivers published payloads to every process subscribed to a channel.
+
+    `handler(channel, payload)` is set by the owner (ConnectionManager) and is
+    awaited for each message on a channel this process subscribed to,
+    including messages this process published itself.
+    """
+
+    def __init__(self):
+        self.handler = None
+        self.channels: set[str] = set()
+
+    async def publish(self, channel: str, payload: str):
+        raise NotImplementedError
+
+    async def subscribe(self, channel: str):
+        self.channels.add(channel)
+
+    async def unsubscribe(self, channel: str):
+        self.channels.discard(channel)
+
+    async def close(self):
+        pass
+
+    async def _dispatch(self, channel: str, payload: str):
+        if channel not in self.channels or self.handler is None:
+            return
+        try:
+            await self.handler(channel, payload)
+        except Exception:
+            logger.exception("pubsub handler failed for %s", channel)
+
+
+class MemoryPubSub(PubSubBackend):
+    """Single process only: publish goes straight to the local handler."""
+
+    async def publish(self, channel: str, payload: str):
+        await self._dispatch(channel, payload)
+
+
+class SQLitePubSub(PubSubBackend):
+    """Cross-process broker on a shared SQLite file, for tests and single-host setups.
+
+    Publishers append rows to an events table, every process polls for rows
+    newer than the last one it saw. Rows older than `retention` seconds are
+    pruned by whoever publishes.
+    """
+
+    def __init__(self, path: str, poll_interval: float = 0.05, retention: float = 60):
+        super().__init__()
+        self.path = path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pubsub_events ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, "
+            "payload TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+        self._last_id = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM pubsub_events").fetchone()[0]
+        self._task = None
+
+    def _insert(self, channel: str, payload: str):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO pubsub_events (channel, payload, created_at) VALUES (?, ?, ?)",
+                (channel, payload, now),
+            )
+            self._conn.execute("DELETE FROM pubsub_events WHERE created_at < ?", (now - self.retention,))
+
+    def _fetch(self, after_id: int):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, channel, payload FROM pubsub_events WHERE id > ? ORDER BY id", (after_id,)
+            ).fetchall()
+
+    async def publish(self, channel: str, payload: str):
+        await asyncio.to_thread(self._insert, channel, payload)
+
+    async def subscribe(self, channel: str):
+        await super().subscribe(channel)
+        if self._task is None:
+            self._task = asyncio.create_task(self._poll())
+
+    async def _poll(self):
+        while True:
+            try:
+                rows = await asyncio.to_thread(self._fetch, self._last_id)
+                for row_id, channel, payload in rows:
+                    self._last_id = row_id
+                    await self._dispatch(channel, payload)
+            except Exception:
+                logger.exception("sqlite pubsub poll failed")
+            await asyncio.sleep(self.poll_interval)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._conn.close()
+
+
+class RedisPubSub(PubSubBackend):
+    """Redis (or any server speaking its PUBLISH/SUBSCRIBE protocol) for production."""
+
+    def __init__(self, url: str):
+        super().__init__()
+        try:
+            import redis.asyncio as redis
+        except ImportError as error:
+            raise RuntimeError("PUBSUB_BACKEND=redis requires the 'redis' package") from error
+        self._redis = redis.from_url(url, decode_responses=True)
+        self._pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        self._task = None
+
+    async def publish(self, channel: str, payload: str):
+        await self._redis.publish(channel, payload)
+
+    async def subscribe(self, channel: str):
+        await super().subscribe(channel)
+        await self._pubsub.subscribe(channel)
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def unsubscribe(self, channel: str):
+        await super().unsubscribe(channel)
+        await self._pubsub.unsubscribe(channel)
+
+    async def _listen(self):
+        while True:
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+                if message is not None and message["type"] == "message":
+                    await self._dispatch(message["channel"], message["data"])
+                elif not self.channels:
+                    await asyncio.sleep(0.1)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("redis pubsub listen failed")
+                await asyncio.sleep(1)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self._pubsub.aclose()
+        await self._redis.aclose()
+
+
+def create_pubsub(backend: str, url: str = None) -> PubSubBackend:
+    if backend == "memory":
+        return MemoryPubSub()
+    if backend == "sqlite":
+        return SQLitePubSub(url or "./pubsub.db")
+    if backend == "redis":
+        return RedisPubSub(url or "redis://localhost:6379/0")
+    raise ValueError(f"Unknown PUBSUB_BACKEND: {backend}")
@@ -0,0 +1,49 @@
+import asyncio
+from server.settings import READ_RECEIPT_DELAY
+from .chat_ws import ConnectionManager, manager
+
+
+class ReceiptCoalescer:
+    """Merges read receipts before they go out over the chat sockets.
+
+    A client scrolling through history may mark every message it passes;
+    within `delay` seconds only the highest id per (chat, reader) is kept
+    and broadcast once.
+    """
+
+    def __init__(self, connections: ConnectionManager = manager, delay: float = READ_RECEIPT_DELAY):
+        self.connections = connections
+        self.delay = delay
+        self.pending: dict[tuple[int, int], int] = {}
+        self._task = None
+        self.received = 0
+        self.sent = 0
+
+    def note(self, chat_id: int, user_id: int, message_id: int):
+        self.received += 1
+        key = (chat_id, user_id)
+        if message_id > self.pending.get(key, 0):
+            self.pending[key] = message_id
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.delay)
+        await self.flush()
+
+    async def flush(self):
+        pending, self.pending = self.pending, {}
+        for (chat_id, user_id), message_id in pending.items():
+            self.sent += 1
+            await self.connections.broadcast(
+                chat_id,
+                {"type": "read", "chat_id": chat_id, "user_id": user_id, "message_id": message_id},
+            )
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        await self.flush()
+
+
+receipts = ReceiptCoalescer()
@@ -14,11 +14,40 @@ class ChatResponseSchema(BaseModel):
     teacher_id: int
     booking_id: Optional[int]
     created_at: datetime
+    unread_count: int = 0
 
     class Config:
         from_attributes = True
 
 
+class InboxMessageSchema(BaseModel):
+    id: int
+    sender_id: int
+    text: str
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class InboxItemSchema(BaseModel):
+    chat_id: int
+    booking_id: Optional[int]
+    peer_id: int
+    peer_username: str
+    last_message: Optional[InboxMessageSchema]
+    unread_count: int
+
+
+class InboxPageSchema(BaseModel):
+    items: List[InboxItemSchema]
+    next_cursor: Optional[str] = None
+
+
+class MarkReadSchema(BaseModel):
+    message_id: int = Field(..., gt=0)
+
+
 class MessageCreateSchema(BaseModel):
     text: str = Field(..., min_length=1, max_length=2000)
 
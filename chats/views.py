@@ -1,17 +1,28 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
-from server.settings import get_db
-from accounts.permissions import get_current_user
+from typing import List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from server.settings import get_db, get_async_db, AsyncSessionLocal
+from accounts.permissions import get_current_user, get_websocket_user, is_admin_user
 from accounts.models import User
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends
-from .chat_ws import manager
-from .models import Chat, Message, Group, GroupMember, GroupMessage
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, status
+from .chat_ws import manager, group_manager
+from .writer import BatchWriter
+from .models import Chat, Message, MessageArchive, Group, GroupMember, GroupMessage, GroupMessageArchive
 from .schemas import *
+from .helpers import (
+    advance_read_cursor, inbox_page, invalidate_group_members, is_group_member, keyset_page, stream_ndjson,
+    touch_last_message, unread_counts, user_chat_ids,
+)
+from .receipts import receipts
 
 
 chat_router = APIRouter(prefix="/chats", tags=["Chats"])
 
+message_writer = BatchWriter(Message, on_flush=touch_last_message)
+group_message_writer = BatchWriter(GroupMessage)
+
 @chat_router.post("", response_model=ChatResponseSchema)
 def create_chat(
     data: ChatCreateSchema,
@@ -43,25 +54,108 @@ def my_chats(
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
-    return db.query(Chat).filter(
-        (Chat.student_id == user.id) | (Chat.teacher_id == user.id)
-    ).all()
+    chats = db.query(Chat).filter(Chat.id.in_(user_chat_ids(user.id))).all()
+    counts = unread_counts(db, user.id)
+    return [
+        ChatResponseSchema.model_validate(chat).model_copy(update={"unread_count": counts.get(chat.id, 0)})
+        for chat in chats
+    ]
+
+
+@chat_router.get("/inbox", response_model=InboxPageSchema)
+def inbox(
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    after = None
+    if cursor:
+        try:
+            activity, chat_id = (int(part) for part in cursor.split(":"))
+        except ValueError:
+            raise HTTPException(400, "Invalid cursor")
+        after = (activity, chat_id)
+
+    rows = inbox_page(db, user.id, limit=limit, cursor=after)
+    items = [
+        {
+            "chat_id": chat.id,
+            "booking_id": chat.booking_id,
+            "peer_id": chat.teacher_id if chat.student_id == user.id else chat.student_id,
+            "peer_username": peer_username,
+            "last_message": message,
+            "unread_count": unread,
+        }
+        for chat, message, peer_username, unread in rows
+    ]
+    next_cursor = None
+    if len(rows) == limit:
+        last = rows[-1][0]
+        next_cursor = f"{last.last_message_id or 0}:{last.id}"
+    return {"items": items, "next_cursor": next_cursor}
+
+
+def get_chat_for_user(chat_id: int, user: User, db: Session):
+    chat = db.query(Chat).filter_by(id=chat_id).first()
+    if not chat:
+        raise HTTPException(404, "Chat not found")
+
+    if user.id not in (chat.student_id, chat.teacher_id):
+        raise HTTPException(403, "Access denied")
+    return chat
 
 
 @chat_router.get("/{chat_id}/messages", response_model=List[MessageResponseSchema])
 def chat_messages(
     chat_id: int,
+    before: Optional[int] = Query(None, description="return messages older than this id"),
+    after: Optional[int] = Query(None, description="return messages newer than this id"),
+    limit: int = Query(50, ge=1, le=200),
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
-    chat = db.query(Chat).filter_by(id=chat_id).first()
+    get_chat_for_user(chat_id, user, db)
+    query = db.query(Message).filter(Message.chat_id == chat_id)
+    archive = db.query(MessageArchive).filter(MessageArchive.chat_id == chat_id)
+    return keyset_page(query, Message.id, before=before, after=after, limit=limit, archive=(archive, MessageArchive.id))
+
+
+@chat_router.post("/{chat_id}/read")
+async def mark_read(
+    chat_id: int,
+    data: MarkReadSchema,
+    db: AsyncSession = Depends(get_async_db),
+    user: User = Depends(get_current_user),
+):
+    """Mark everything up to `message_id` as read and notify the chat."""
+    chat = await db.get(Chat, chat_id)
     if not chat:
         raise HTTPException(404, "Chat not found")
-
     if user.id not in (chat.student_id, chat.teacher_id):
         raise HTTPException(403, "Access denied")
+    message = await db.get(Message, data.message_id) or await db.get(MessageArchive, data.message_id)
+    if not message or message.chat_id != chat_id:
+        raise HTTPException(404, "Message not found")
 
-    return db.query(Message).filter_by(chat_id=chat_id).order_by(Message.created_at).all()
+    advanced = await advance_read_cursor(db, chat_id, user.id, data.message_id)
+    await db.commit()
+    if advanced:
+        receipts.note(chat_id, user.id, data.message_id)
+    return {"status": "read"}
+
+
+@chat_router.get("/{chat_id}/messages/export")
+def export_chat_messages(
+    chat_id: int,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    get_chat_for_user(chat_id, user, db)
+    return StreamingResponse(
+        stream_ndjson(Message, Message.chat_id, chat_id, MessageResponseSchema, archive_model=MessageArchive),
+        media_type="application/x-ndjson",
+    )
 
 
 group_router = APIRouter(prefix="/groups", tags=["Groups"])
@@ -116,60 +210,162 @@ def add_member(
     db.add(member)
     db.commit()
     db.refresh(member)
+    invalidate_group_members(group_id)
+    return member
+
+
+def check_group_member(group_id: int, user: User, db: Session):
+    member = db.query(GroupMember).filter_by(group_id=group_id, user_id=user.id).first()
+    if not member:
+        raise HTTPException(403, "Not a group member")
     return member
 
 
 @group_router.get("/{group_id}/messages", response_model=List[GroupMessageResponseSchema])
 def group_messages(
     group_id: int,
+    before: Optional[int] = Query(None, description="return messages older than this id"),
+    after: Optional[int] = Query(None, description="return messages newer than this id"),
+    limit: int = Query(50, ge=1, le=200),
     db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
 ):
-    member = db.query(GroupMember).filter_by(group_id=group_id, user_id=user.id).first()
-    if not member:
-        raise HTTPException(403, "Not a group member")
+    check_group_member(group_id, user, db)
+    query = db.query(GroupMessage).filter(GroupMessage.group_id == group_id)
+    archive = db.query(GroupMessageArchive).filter(GroupMessageArchive.group_id == group_id)
+    return keyset_page(query, GroupMessage.id, before=before, after=after, limit=limit, archive=(archive, GroupMessageArchive.id))
 
-    return (
-        db.query(GroupMessage)
-        .filter_by(group_id=group_id)
-        .order_by(GroupMessage.created_at)
-        .all()
+
+@group_router.get("/{group_id}/messages/export")
+def export_group_messages(
+    group_id: int,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+):
+    check_group_member(group_id, user, db)
+    return StreamingResponse(
+        stream_ndjson(GroupMessage, GroupMessage.group_id, group_id, GroupMessageResponseSchema, archive_model=GroupMessageArchive),
+        media_type="application/x-ndjson",
     )
 
 
 
-chat_router = APIRouter(prefix="/chats", tags=["Chats"])
+def frame_text(data):
+    text = data.get("text") if isinstance(data, dict) else None
+    if not isinstance(text, str) or not 1 <= len(text) <= 2000:
+        return None
+    return text
+
 
 @chat_router.websocket("/ws/{chat_id}")
 async def chat_ws(
     websocket: WebSocket,
     chat_id: int,
-    db: Session = Depends(get_db),
 ):
-    await manager.connect(chat_id, websocket)
+    # the sender is whoever the token says, never a field of the frame
+    user = await get_websocket_user(websocket)
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    async with AsyncSessionLocal() as db:
+        chat = await db.get(Chat, chat_id)
+    if chat is None or user.id not in (chat.student_id, chat.teacher_id):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    if not await manager.connect(chat_id, websocket, user.id):
+        return
 
     try:
         while True:
-            data = await websocket.receive_json()
+            data = await manager.receive(chat_id, websocket)
+            if data is None:
+                continue
+            text = frame_text(data)
+            if text is None:
+                manager.send_personal(chat_id, websocket, {"error": "text must be 1-2000 characters"})
+                continue
 
-            message = Message(
+            message_id, created_at = await message_writer.write(
                 chat_id=chat_id,
-                sender_id=data["sender_id"],
-                text=data["text"],
+                sender_id=user.id,
+                text=text,
             )
-            db.add(message)
-            db.commit()
-            db.refresh(message)
 
+            # the sender's copy doubles as the ack carrying the stored id
             await manager.broadcast(
                 chat_id,
                 {
-                    "id": message.id,
+                    "id": message_id,
                     "chat_id": chat_id,
-                    "sender_id": message.sender_id,
-                    "text": message.text,
-                    "created_at": message.created_at.isoformat(),
+                    "sender_id": user.id,
+                    "text": text,
+                    "created_at": created_at.isoformat(),
+                    "client_id": data.get("client_id"),
                 }
             )
     except WebSocketDisconnect:
-        manager.disconnect(chat_id, websocket)
+        pass
+    finally:
+        await manager.disconnect(chat_id, websocket)
+
+
+@group_router.websocket("/ws/{group_id}")
+async def group_ws(
+    websocket: WebSocket,
+    group_id: int,
+):
+    user = await get_websocket_user(websocket)
+    if user is None or not await is_group_member(group_id, user.id):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    if not await group_manager.connect(group_id, websocket, user.id):
+        return
+
+    try:
+        while True:
+            data = await group_manager.receive(group_id, websocket)
+            if data is None:
+                continue
+            text = frame_text(data)
+            if text is None:
+                group_manager.send_personal(group_id, websocket, {"error": "text must be 1-2000 characters"})
+                continue
+            # cached set lookup; add_member/removals invalidate the group's entry
+            if not await is_group_member(group_id, user.id):
+                await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                break
+
+            message_id, created_at = await group_message_writer.write(
+                group_id=group_id,
+                sender_id=user.id,
+                text=text,
+            )
+
+            # serialized once by the manager, however many members are online
+            await group_manager.broadcast(
+                group_id,
+                {
+                    "id": message_id,
+                    "group_id": group_id,
+                    "sender_id": user.id,
+                    "text": text,
+                    "created_at": created_at.isoformat(),
+                    "client_id": data.get("client_id"),
+                }
+            )
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await group_manager.disconnect(group_id, websocket)
+
+
+@chat_router.get("/stats/connections", dependencies=[Depends(is_admin_user)])
+def chat_connection_stats():
+    return manager.stats()
+
+
+@group_router.get("/stats/connections", dependencies=[Depends(is_admin_user)])
+def group_connection_stats():
+    return group_manager.stats()
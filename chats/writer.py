@@ -0,0 +1,99 @@
+import asyncio
+import logging
+from sqlalchemy import insert
+from server.settings import AsyncSessionLocal, MESSAGE_BATCH_SIZE, MESSAGE_BATCH_DELAY
+
+
+logger = logging.getLogger(__name__)
+
+
+class BatchWriter:
+    """Write-behind inserts for chat messages.
+
+    Frames from every socket are queued and flushed together once
+    `batch_size` rows are waiting or `max_delay` seconds have passed since the
+    first one, as one multi-row INSERT ... RETURNING in one transaction.
+    `write()` resolves to the stored row's (id, created_at). `on_flush`, if
+    given, is awaited as on_flush(db, values, rows) inside that transaction.
+    """
+
+    def __init__(self, model, batch_size: int = MESSAGE_BATCH_SIZE, max_delay: float = MESSAGE_BATCH_DELAY, on_flush=None):
+        self.model = model
+        self.on_flush = on_flush
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._task = None
+        # rows taken off the queue and the flush writing them, for close()
+        self._batch = None
+        self._flushing = None
+        self.batches = 0
+        self.rows = 0
+
+    async def write(self, **values):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((values, future))
+        return await future
+
+    async def _collect(self, batch):
+        batch.append(await self.queue.get())
+        deadline = asyncio.get_running_loop().time() + self.max_delay
+        while len(batch) < self.batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+    async def _flush(self, batch):
+        stmt = insert(self.model).returning(
+            self.model.id, self.model.created_at, sort_by_parameter_order=True)
+        try:
+            async with AsyncSessionLocal() as db:
+                values = [values for values, _ in batch]
+                result = await db.execute(stmt, values)
+                rows = result.all()
+                if self.on_flush is not None:
+                    await self.on_flush(db, values, rows)
+                await db.commit()
+        except Exception as error:
+            logger.exception("failed to write %d %s rows", len(batch), self.model.__tablename__)
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        self.batches += 1
+        self.rows += len(rows)
+        for (_, future), row in zip(batch, rows):
+            if not future.done():
+                future.set_result(tuple(row))
+
+    async def _run(self):
+        while True:
+            batch = self._batch = []
+            await self._collect(batch)
+            self._batch = None
+            # shielded: cancelling the loop must not abort a batch mid-write
+            self._flushing = asyncio.ensure_future(self._flush(batch))
+            await asyncio.shield(self._flushing)
+
+    async def close(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        # let the batch being written finish, then write what was collected
+        # or still queued before shutdown
+        if self._flushing is not None:
+            await self._flushing
+            self._flushing = None
+        batch, self._batch = self._batch, None
+        if batch:
+            await self._flush(batch)
+        while not self.queue.empty():
+            batch = [self.queue.get_nowait() for _ in range(min(self.batch_size, self.queue.qsize()))]
+            await self._flush(batch)
@@ -0,0 +1,153 @@
+from collections import OrderedDict
+import hashlib
+import math
+from threading import Lock
+from time import monotonic
+
+
+class TTLCache:
+    """Bounded LRU mapping whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize:int=1024, ttl:float=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at <= monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl:float=None):
+        expires_at = monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+        return default if item is None else item[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self._data)
+
+
+class BloomFilter:
+    """Probabilistic set: `key in bloom` is never False for an added key."""
+
+    def __init__(self, capacity:int=100000, error_rate:float=0.001):
+        size = int(-capacity * math.log(error_rate) / (math.log(2) ** 2)) or 8
+        self.size = size
+        self.hash_count = max(1, round(size / capacity * math.log(2)))
+        self._bits = bytearray((size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key:str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, key:str):
+        for pos in self._positions(key):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, key:str):
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class VersionedCache:
+    """Read-through cache of serialized responses, invalidated by namespace.
+
+    Keys embed the namespace's current version, so `bump(namespace)` makes
+    every older entry unreachable and the LRU ages them out. With a redis
+    URL the versions and bodies are shared between workers; the in-process
+    LRU stays in front of it. Without one each worker has its own versions,
+    so a bump must reach the other workers some other way.
+    """
+
+    def __init__(self, maxsize:int=1024, ttl:float=300, url:str=None):
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.ttl = ttl
+        self._versions = {}
+        self._counts = {"hits": 0, "shared_hits": 0, "misses": 0}
+        self._lock = Lock()
+        self._redis = None
+        if url:
+            try:
+                import redis
+            except ImportError as error:
+                raise RuntimeError("a shared content cache requires the 'redis' package") from error
+            self._redis = redis.from_url(url)
+
+    @property
+    def shared(self):
+        return self._redis is not None
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def version(self, namespace:str):
+        if self._redis is not None:
+            return int(self._redis.get(f"cache-version:{namespace}") or 0)
+        return self._versions.get(namespace, 0)
+
+    def bump(self, namespace:str):
+        if self._redis is not None:
+            self._redis.incr(f"cache-version:{namespace}")
+            return
+        with self._lock:
+            self._versions[namespace] = self._versions.get(namespace, 0) + 1
+
+    def get_or_load(self, namespace:str, key, loader):
+        """Return cached bytes, or call `loader()` and cache what it returns.
+
+        A None result (e.g. a missing row) is passed through uncached.
+        """
+        full_key = f"{namespace}:{self.version(namespace)}:{key}"
+        body = self.local.get(full_key)
+        if body is not None:
+            self._count("hits")
+            return body
+        if self._redis is not None:
+            body = self._redis.get(full_key)
+            if body is not None:
+                self._count("shared_hits")
+                self.local.set(full_key, body)
+                return body
+        self._count("misses")
+        body = loader()
+        if body is not None:
+            self.local.set(full_key, body)
+            if self._redis is not None:
+                self._redis.set(full_key, body, ex=int(self.ttl))
+        return body
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        lookups = counts["hits"] + counts["shared_hits"] + counts["misses"]
+        counts["hit_ratio"] = round((lookups - counts["misses"]) / lookups, 4) if lookups else None
+        counts["entries"] = len(self.local)
+        counts["shared"] = self.shared
+        return counts
@@ -0,0 +1,72 @@
+import asyncio
+import json
+import logging
+from uuid import uuid4
+from server.settings import PUBSUB_BACKEND, PUBSUB_URL
+from chats.pubsub import PubSubBackend, create_pubsub
+
+
+logger = logging.getLogger(__name__)
+
+
+class Invalidator:
+    """Tells every worker to drop a cached entry, over the websocket pub/sub backend.
+
+    `register(kind, handler)` names a local invalidation, `publish(kind, key)`
+    runs it here at once and then in every other worker. With the memory
+    backend there are no other workers to reach, so in-process caches are
+    only coherent under a single worker; use the sqlite or redis backend
+    when running several.
+    """
+
+    channel = "invalidate"
+
+    def __init__(self, backend: PubSubBackend = None):
+        self.backend = backend or create_pubsub(PUBSUB_BACKEND, PUBSUB_URL)
+        self.backend.handler = self._receive
+        self.origin = uuid4().hex
+        self.handlers = {}
+        self._loop = None
+        self._pending = set()
+
+    def register(self, kind: str, handler):
+        self.handlers[kind] = handler
+
+    def publish(self, kind: str, key=None):
+        """Invalidate locally, then broadcast; callable from sync and async code."""
+        self.handlers[kind](key)
+        if self._loop is None:
+            # not started (scripts, migrations): nobody else to tell
+            return
+        payload = json.dumps({"origin": self.origin, "kind": kind, "key": key})
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            task = running.create_task(self.backend.publish(self.channel, payload))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+        else:
+            # sync handler in the threadpool
+            asyncio.run_coroutine_threadsafe(self.backend.publish(self.channel, payload), self._loop)
+
+    async def _receive(self, channel: str, payload: str):
+        message = json.loads(payload)
+        if message["origin"] == self.origin:
+            return
+        handler = self.handlers.get(message["kind"])
+        if handler is not None:
+            handler(message["key"])
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        await self.backend.subscribe(self.channel)
+
+    async def close(self):
+        self._loop = None
+        await self.backend.unsubscribe(self.channel)
+        await self.backend.close()
+
+
+invalidator = Invalidator()
@@ -1,4 +1,33 @@
+from datetime import timezone
+from sqlalchemy import DateTime
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.types import TypeDecorator
 
 class BaseModel(DeclarativeBase):
-    pass
\ No newline at end of file
+    pass
+
+
+class UTCDateTime(TypeDecorator):
+    """Timezone-aware datetime stored as UTC.
+
+    SQLite has no timestamptz, so values are normalised to naive UTC on the
+    way in (keeping range comparisons on the text column correct) and tagged
+    as UTC on the way out.
+    """
+    impl = DateTime(timezone=True)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return value
+        if value.tzinfo is None:
+            raise ValueError("naive datetime passed to UTCDateTime")
+        value = value.astimezone(timezone.utc)
+        if dialect.name == "sqlite":
+            value = value.replace(tzinfo=None)
+        return value
+
+    def process_result_value(self, value, dialect):
+        if value is not None and value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value
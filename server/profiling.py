@@ -0,0 +1,127 @@
+import logging
+from collections import Counter, deque
+from contextvars import ContextVar
+from threading import Lock
+from time import perf_counter, time
+from fastapi import APIRouter, Depends, FastAPI, Request
+from sqlalchemy import event
+from accounts.permissions import is_admin_user
+from server.settings import (
+    engine, async_engine, PROFILE_SLOW_MS, PROFILE_REPEAT_THRESHOLD, PROFILE_BUFFER_SIZE,
+)
+
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar("sql_profile", default=None)
+
+
+class RequestProfile:
+    __slots__ = ("statements", "db_time", "shapes")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_time = 0.0
+        # statement text (parameters excluded) -> executions
+        self.shapes = Counter()
+
+    def repeated(self):
+        return {sql: count for sql, count in self.shapes.items() if count >= PROFILE_REPEAT_THRESHOLD}
+
+
+# the start time lives on the execution context, so a statement that raises
+# leaves nothing behind on the pooled connection
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None and context is not None:
+        context._profile_start = perf_counter()
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    started = getattr(context, "_profile_start", None)
+    if profile is None or started is None:
+        return
+    profile.statements += 1
+    profile.db_time += perf_counter() - started
+    profile.shapes[statement] += 1
+
+
+class SlowRequestLog:
+    """Ring buffer of slow or N+1 requests plus running totals per route."""
+
+    def __init__(self, size: int = PROFILE_BUFFER_SIZE):
+        self.entries = deque(maxlen=size)
+        self.routes = {}
+        self._lock = Lock()
+
+    def record(self, route: str, method: str, status: int, duration: float, profile: RequestProfile):
+        repeated = profile.repeated()
+        with self._lock:
+            totals = self.routes.setdefault((method, route), {"requests": 0, "total_ms": 0.0, "max_ms": 0.0, "max_statements": 0, "n_plus_one": 0})
+            totals["requests"] += 1
+            totals["total_ms"] += duration * 1000
+            totals["max_ms"] = max(totals["max_ms"], duration * 1000)
+            totals["max_statements"] = max(totals["max_statements"], profile.statements)
+            totals["n_plus_one"] += bool(repeated)
+            if duration * 1000 < PROFILE_SLOW_MS and not repeated:
+                return
+            self.entries.append({
+                "at": time(),
+                "method": method,
+                "route": route,
+                "status": status,
+                "duration_ms": round(duration * 1000, 2),
+                "db_ms": round(profile.db_time * 1000, 2),
+                "statements": profile.statements,
+                "repeated": [{"sql": sql, "count": count} for sql, count in repeated.items()],
+            })
+        if repeated:
+            logger.warning("%s %s ran %s repeated statements (possible N+1)", method, route, len(repeated))
+
+    def report(self, limit: int = 20):
+        with self._lock:
+            entries = list(self.entries)
+            routes = [
+                {"method": method, "route": route, **totals, "avg_ms": round(totals["total_ms"] / totals["requests"], 2)}
+                for (method, route), totals in self.routes.items()
+            ]
+        routes.sort(key=lambda item: item["total_ms"], reverse=True)
+        entries.sort(key=lambda item: item["duration_ms"], reverse=True)
+        return {"top_routes": routes[:limit], "slowest": entries[:limit]}
+
+
+slow_requests = SlowRequestLog()
+
+
+async def profile_requests(request: Request, call_next):
+    profile = RequestProfile()
+    token = _current.set(profile)
+    started = perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        _current.reset(token)
+    duration = perf_counter() - started
+    response.headers["Server-Timing"] = (
+        f'db;dur={profile.db_time * 1000:.2f};desc="{profile.statements} queries", '
+        f"total;dur={duration * 1000:.2f}"
+    )
+    route = request.scope.get("route")
+    slow_requests.record(getattr(route, "path", request.url.path), request.method, response.status_code, duration, profile)
+    return response
+
+
+def install_profiler(app: FastAPI):
+    """Hook both engines and add the middleware and /debug/slow-requests."""
+    for target in (engine, async_engine.sync_engine):
+        event.listen(target, "before_cursor_execute", _before_execute)
+        event.listen(target, "after_cursor_execute", _after_execute)
+    app.middleware("http")(profile_requests)
+
+    debug_router = APIRouter(prefix="/debug", tags=["Debug"], dependencies=[Depends(is_admin_user)])
+
+    @debug_router.get("/slow-requests")
+    def slow_requests_report(limit: int = 20):
+        return slow_requests.report(limit)
+
+    app.include_router(debug_router)
@@ -1,9 +1,46 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from server.settings import async_engine, log_pool_config, PROFILE_SQL
+from server.profiling import install_profiler
+from server.invalidation import invalidator
 from accounts.views import auth
+from accounts.blacklist import token_blacklist
+from chats.chat_ws import manager as chat_manager, group_manager
+from chats.views import message_writer, group_message_writer
+from chats.receipts import receipts
+from chats.archive import message_archiver
+from smartedu.ratings import rating_reconciler
+from smartedu.recurrence import slot_materializer
 from smartedu.views import *
 from chats.views import *
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app:FastAPI):
+    log_pool_config()
+    await invalidator.start()
+    await token_blacklist.start()
+    rating_reconciler.start()
+    slot_materializer.start()
+    message_archiver.start()
+    yield
+    message_archiver.stop()
+    slot_materializer.stop()
+    rating_reconciler.stop()
+    await token_blacklist.stop()
+    await receipts.close()
+    await chat_manager.close()
+    await group_manager.close()
+    await message_writer.close()
+    await group_message_writer.close()
+    await invalidator.close()
+    await async_engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
+if PROFILE_SQL:
+    install_profiler(app)
 
 app.include_router(auth, prefix='/auth', tags=['accounts'])
 app.include_router(teacher_router)
@@ -20,6 +57,15 @@ app.include_router(parent_router)
 app.include_router(utils_router)
 app.include_router(chat_router)
 app.include_router(group_router)
-app.include_router(chat_router)
 
 
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=[
+        "http://localhost:3000",
+        "http://127.0.0.1:8513",
+    ],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
@@ -1,21 +1,97 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from datetime import timedelta, datetime
 from dotenv import load_dotenv
+import logging
 import os
 
 env = load_dotenv()
 
-# SQLite used for simplicity; in production use PostgreSQL or MySQL
-DATABASE_URL = "sqlite:///./lms.db"
+logger = logging.getLogger(__name__)
+
+# SQLite by default for development; set DATABASE_URL to PostgreSQL in production
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./lms.db")
+
+
+def to_async_url(url:str):
+    # sqlite -> aiosqlite, postgresql -> asyncpg; already async urls are kept as is
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql:") or url.startswith("postgres:"):
+        return "postgresql+asyncpg:" + url.split(":", 1)[1]
+    if url.startswith("postgresql+psycopg2:"):
+        return url.replace("postgresql+psycopg2:", "postgresql+asyncpg:", 1)
+    return url
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or to_async_url(DATABASE_URL)
+
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# connection pool, per engine and per worker process
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+# applied to every new SQLite connection
+SQLITE_BUSY_TIMEOUT = int(os.getenv("SQLITE_BUSY_TIMEOUT", 5000))  # ms
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 268435456))  # bytes
+
+ENGINE_OPTIONS = {
+    "pool_size":DB_POOL_SIZE,
+    "max_overflow":DB_MAX_OVERFLOW,
+    "pool_timeout":DB_POOL_TIMEOUT,
+    "pool_recycle":DB_POOL_RECYCLE,
+    "pool_pre_ping":DB_POOL_PRE_PING,
+}
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers run alongside the single writer, busy_timeout makes
+    # concurrent writers wait instead of failing with "database is locked"
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.close()
+
 
 # Create engine (used to connect to the DB)
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+engine = create_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False} if IS_SQLITE else {},
+    **ENGINE_OPTIONS)
+
+# Async engine for handlers running on the event loop (async def views, websockets)
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **ENGINE_OPTIONS)
+
+if IS_SQLITE:
+    event.listen(engine, "connect", set_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
+
+
+def log_pool_config():
+    for name, eng in (("sync", engine), ("async", async_engine)):
+        logger.info(
+            "%s engine %s: pool=%s size=%s max_overflow=%s timeout=%ss recycle=%ss pre_ping=%s",
+            name, eng.url.render_as_string(hide_password=True), type(eng.pool).__name__,
+            DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING)
+    if IS_SQLITE:
+        logger.info(
+            "sqlite pragmas: journal_mode=WAL synchronous=NORMAL busy_timeout=%sms mmap_size=%s",
+            SQLITE_BUSY_TIMEOUT, SQLITE_MMAP_SIZE)
 
 # SessionLocal is a factory for DB sessions
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# expire_on_commit=False: attributes stay loaded after commit, no implicit IO on access
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
 
 def get_db():
     db = SessionLocal()
@@ -23,9 +99,98 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
         
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 JWT_ALGORITHM = os.getenv("JWT_ALGORITHM")
 
 ACCESSTOKEN_EXPIRED_TIME = timedelta(minutes=20)
-REFRESHTOKEN_EXPIRED_TIME = timedelta(days=1)
\ No newline at end of file
+REFRESHTOKEN_EXPIRED_TIME = timedelta(days=1)
+
+# verified JWT claims cached until exp; disable to compare against full verification
+JWT_CACHE_ENABLED = os.getenv("JWT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", 50000))
+
+# per-user permission/role sets used by required_permission and role_required
+# changes are pushed to every worker over PUBSUB_BACKEND (with "memory" only
+# this process is told); the TTL bounds staleness if a notice gets lost
+PERMISSION_CACHE_TTL = int(os.getenv("PERMISSION_CACHE_TTL", 60))
+PERMISSION_CACHE_SIZE = int(os.getenv("PERMISSION_CACHE_SIZE", 10000))
+
+# revoked tokens: bloom filter sizing and background sync/purge intervals (seconds)
+BLACKLIST_BLOOM_CAPACITY = int(os.getenv("BLACKLIST_BLOOM_CAPACITY", 100000))
+BLACKLIST_BLOOM_ERROR_RATE = float(os.getenv("BLACKLIST_BLOOM_ERROR_RATE", 0.001))
+BLACKLIST_SYNC_INTERVAL = int(os.getenv("BLACKLIST_SYNC_INTERVAL", 5))
+BLACKLIST_SWEEP_INTERVAL = int(os.getenv("BLACKLIST_SWEEP_INTERVAL", 600))
+# every sync re-reads this many ids below the last one seen: on postgres a
+# revocation can commit after rows with higher ids and would be skipped
+BLACKLIST_SYNC_OVERLAP = int(os.getenv("BLACKLIST_SYNC_OVERLAP", 1000))
+
+# argon2 cost; changing these rehashes passwords on the next successful login
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", 3))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", 65536))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", 4))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", 256))
+
+# websocket fan-out between workers: memory (single process), sqlite (one host) or redis
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "memory")
+PUBSUB_URL = os.getenv("PUBSUB_URL")
+# per-socket outbound queue; a client that falls this far behind is disconnected
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", 100))
+# server pings every WS_PING_INTERVAL seconds; a socket with no inbound
+# frame (pong or otherwise) for WS_IDLE_TIMEOUT seconds is closed
+WS_PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", 25))
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", 60))
+# inbound frames per socket: token bucket refilled at WS_RATE_LIMIT/s up to WS_RATE_BURST
+WS_RATE_LIMIT = float(os.getenv("WS_RATE_LIMIT", 5))
+WS_RATE_BURST = int(os.getenv("WS_RATE_BURST", 20))
+WS_MAX_FRAME_BYTES = int(os.getenv("WS_MAX_FRAME_BYTES", 8192))
+# open sockets per user on one worker, chats and groups together
+WS_MAX_CONNECTIONS_PER_USER = int(os.getenv("WS_MAX_CONNECTIONS_PER_USER", 10))
+
+# chat messages are inserted in batches of up to MESSAGE_BATCH_SIZE rows,
+# waiting at most MESSAGE_BATCH_DELAY seconds for a batch to fill
+MESSAGE_BATCH_SIZE = int(os.getenv("MESSAGE_BATCH_SIZE", 200))
+MESSAGE_BATCH_DELAY = float(os.getenv("MESSAGE_BATCH_DELAY", 0.005))
+# read receipts of one user in one chat are merged over this many seconds
+# and pushed as a single frame carrying the highest message id
+READ_RECEIPT_DELAY = float(os.getenv("READ_RECEIPT_DELAY", 0.5))
+# group member ids are cached this long; add_member invalidates its group
+GROUP_MEMBERSHIP_CACHE_TTL = int(os.getenv("GROUP_MEMBERSHIP_CACHE_TTL", 300))
+# chat and group messages older than MESSAGE_ARCHIVE_AFTER_DAYS are moved to
+# the *_archive tables every MESSAGE_ARCHIVE_INTERVAL seconds (0 disables),
+# MESSAGE_ARCHIVE_BATCH_SIZE rows per transaction
+MESSAGE_ARCHIVE_AFTER_DAYS = int(os.getenv("MESSAGE_ARCHIVE_AFTER_DAYS", 180))
+MESSAGE_ARCHIVE_INTERVAL = int(os.getenv("MESSAGE_ARCHIVE_INTERVAL", 3600))
+MESSAGE_ARCHIVE_BATCH_SIZE = int(os.getenv("MESSAGE_ARCHIVE_BATCH_SIZE", 1000))
+
+# teacher catalog totals are reused for this many seconds per filter combination
+TEACHER_COUNT_CACHE_TTL = int(os.getenv("TEACHER_COUNT_CACHE_TTL", 30))
+
+# seconds between full rebuilds of teacher rating aggregates, 0 disables
+RATING_RECONCILE_INTERVAL = int(os.getenv("RATING_RECONCILE_INTERVAL", 3600))
+
+# recurring availability rules are expanded into slots this many weeks
+# ahead; the rolling job tops the window up every AVAILABILITY_EXPAND_INTERVAL
+AVAILABILITY_HORIZON_WEEKS = int(os.getenv("AVAILABILITY_HORIZON_WEEKS", 4))
+AVAILABILITY_EXPAND_INTERVAL = int(os.getenv("AVAILABILITY_EXPAND_INTERVAL", 3600))
+
+# read-through cache for subjects/lessons/quiz responses; set CONTENT_CACHE_URL
+# to a redis url to share it between workers. Without it each worker keeps its
+# own copy and bumps reach the others over PUBSUB_BACKEND (memory only covers
+# a single worker), with CONTENT_CACHE_TTL as the bound if one is missed
+CONTENT_CACHE_SIZE = int(os.getenv("CONTENT_CACHE_SIZE", 2048))
+CONTENT_CACHE_TTL = int(os.getenv("CONTENT_CACHE_TTL", 600))
+CONTENT_CACHE_URL = os.getenv("CONTENT_CACHE_URL")
+
+# opt-in per-request SQL profiling: Server-Timing headers and /debug/slow-requests
+PROFILE_SQL = os.getenv("PROFILE_SQL", "false").lower() in ("1", "true", "yes")
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", 200))
+# the same statement this many times in one request is reported as N+1
+PROFILE_REPEAT_THRESHOLD = int(os.getenv("PROFILE_REPEAT_THRESHOLD", 5))
+PROFILE_BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", 200))
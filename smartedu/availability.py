@@ -0,0 +1,61 @@
+from datetime import datetime, timezone
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from .models import ScheduleSlot, TeacherSubject
+
+
+def free_slots(db: Session, start: datetime, end: datetime, teacher_id: int = None, subject_id: int = None, limit: int = 100):
+    """Available slots starting inside [start, end), earliest first.
+
+    With a teacher this is a range scan on (teacher_id, start_time); by
+    subject the teachers come from (subject_id, teacher_id) first.
+    """
+    start = max(start, datetime.now(timezone.utc))
+    query = db.query(ScheduleSlot).filter(
+        ScheduleSlot.status == "available",
+        ScheduleSlot.start_time >= start,
+        ScheduleSlot.start_time < end,
+    )
+    if teacher_id is not None:
+        query = query.filter(ScheduleSlot.teacher_id == teacher_id)
+    if subject_id is not None:
+        teachers = db.query(TeacherSubject.teacher_id).filter(TeacherSubject.subject_id == subject_id)
+        query = query.filter(ScheduleSlot.teacher_id.in_(teachers))
+    return query.order_by(ScheduleSlot.start_time, ScheduleSlot.id).limit(limit).all()
+
+
+def overlaps(db: Session, teacher_id: int, start: datetime, end: datetime):
+    return db.query(ScheduleSlot.id).filter(
+        ScheduleSlot.teacher_id == teacher_id,
+        ScheduleSlot.start_time < end,
+        ScheduleSlot.end_time > start,
+    ).first() is not None
+
+
+def reserve_slot(db: Session, slot_id: int):
+    """Flip a future slot from available to booked.
+
+    A single conditional UPDATE: under concurrent requests exactly one
+    caller sees rowcount 1, everyone else gets False without a read-check
+    race. Runs in the caller's transaction.
+    """
+    result = db.execute(
+        update(ScheduleSlot)
+        .where(
+            ScheduleSlot.id == slot_id,
+            ScheduleSlot.status == "available",
+            ScheduleSlot.start_time > datetime.now(timezone.utc),
+        )
+        .values(status="booked")
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def release_slot(db: Session, slot_id: int):
+    db.execute(
+        update(ScheduleSlot)
+        .where(ScheduleSlot.id == slot_id, ScheduleSlot.status == "booked")
+        .values(status="available")
+        .execution_options(synchronize_session=False)
+    )
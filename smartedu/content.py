@@ -0,0 +1,101 @@
+import hashlib
+from typing import List
+from fastapi import Response
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session, selectinload
+from server.cache import VersionedCache
+from server.invalidation import invalidator
+from server.settings import CONTENT_CACHE_SIZE, CONTENT_CACHE_TTL, CONTENT_CACHE_URL
+from .models import Answer, Lesson, Question, Subject
+from .schemas import (
+    AnswerPublicSchema, LessonFullSchema, LessonResponseSchema, QuestionResponseSchema, SubjectResponseSchema,
+)
+
+
+# namespaces: "subjects", "lessons" and "quiz" (questions, answers and the
+# full lesson view); each create endpoint bumps the one it changes
+content_cache = VersionedCache(maxsize=CONTENT_CACHE_SIZE, ttl=CONTENT_CACHE_TTL, url=CONTENT_CACHE_URL)
+
+invalidator.register("content", content_cache.bump)
+
+
+def bump_content(namespace: str):
+    # redis holds the one shared version; otherwise every worker bumps its own
+    if content_cache.shared:
+        content_cache.bump(namespace)
+    else:
+        invalidator.publish("content", namespace)
+
+# built once at import; validating from attributes and dumping straight to
+# JSON bytes skips the per-request response_model round trip
+lesson_full_adapter = TypeAdapter(LessonFullSchema)
+subject_list_adapter = TypeAdapter(List[SubjectResponseSchema])
+lesson_adapter = TypeAdapter(LessonResponseSchema)
+lesson_list_adapter = TypeAdapter(List[LessonResponseSchema])
+question_list_adapter = TypeAdapter(List[QuestionResponseSchema])
+answer_list_adapter = TypeAdapter(List[AnswerPublicSchema])
+
+
+def dump(adapter: TypeAdapter, value):
+    return adapter.dump_json(adapter.validate_python(value, from_attributes=True))
+
+
+def load_lesson_full(db: Session, lesson_id: int):
+    """Lesson with questions and answers in three queries, however many questions it has."""
+    return (
+        db.query(Lesson)
+        .options(selectinload(Lesson.questions).selectinload(Question.answers))
+        .filter(Lesson.id == lesson_id)
+        .first()
+    )
+
+
+def render_lesson_full(lesson: Lesson):
+    return dump(lesson_full_adapter, lesson)
+
+
+def cached_json(namespace: str, key, loader):
+    """Serve `loader()`'s JSON bytes through content_cache; None means not found."""
+    body = content_cache.get_or_load(namespace, key, loader)
+    if body is None:
+        return None
+    return Response(content=body, media_type="application/json")
+
+
+def subjects_json(db: Session):
+    return dump(subject_list_adapter, db.query(Subject).order_by(Subject.id).all())
+
+
+def lesson_json(db: Session, lesson_id: int):
+    lesson = db.query(Lesson).filter_by(id=lesson_id).first()
+    return dump(lesson_adapter, lesson) if lesson else None
+
+
+def subject_lessons_json(db: Session, subject_id: int):
+    return dump(lesson_list_adapter, db.query(Lesson).filter_by(subject_id=subject_id).order_by(Lesson.id).all())
+
+
+def lesson_questions_json(db: Session, lesson_id: int):
+    return dump(question_list_adapter, db.query(Question).filter_by(lesson_id=lesson_id).order_by(Question.id).all())
+
+
+def question_answers_json(db: Session, question_id: int):
+    return dump(answer_list_adapter, db.query(Answer).filter_by(question_id=question_id).order_by(Answer.id).all())
+
+
+def lesson_full_json(db: Session, lesson_id: int):
+    lesson = load_lesson_full(db, lesson_id)
+    return render_lesson_full(lesson) if lesson else None
+
+
+def make_etag(body: bytes):
+    return '"{}"'.format(hashlib.blake2b(body, digest_size=16).hexdigest())
+
+
+def etag_matches(if_none_match: str, etag: str):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # weak comparison, as If-None-Match requires
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
@@ -0,0 +1,86 @@
+from typing import NamedTuple
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from server.cache import TTLCache
+from .content import content_cache
+from .models import Answer, Lesson, Question, QuizAttempt
+
+
+class KeyEntry(NamedTuple):
+    multiple: bool
+    correct: frozenset
+    options: frozenset
+
+
+# (lesson_id, quiz cache version) -> {question_id: KeyEntry}; a new question
+# or answer bumps the "quiz" version, so stale keys are simply never read again
+answer_keys = TTLCache(maxsize=1024, ttl=3600)
+
+
+def answer_key(db: Session, lesson_id: int):
+    """The lesson's answer key, built from one query and reused across submissions."""
+    cache_key = (lesson_id, content_cache.version("quiz"))
+    key = answer_keys.get(cache_key)
+    if key is not None:
+        return key
+    rows = (
+        db.query(Question.id, Question.type, Answer.id, Answer.is_correct)
+        .outerjoin(Answer, Answer.question_id == Question.id)
+        .filter(Question.lesson_id == lesson_id)
+        .all()
+    )
+    correct, options, types = {}, {}, {}
+    for question_id, question_type, answer_id, is_correct in rows:
+        types[question_id] = question_type
+        correct.setdefault(question_id, set())
+        options.setdefault(question_id, set())
+        if answer_id is not None:
+            options[question_id].add(answer_id)
+            if is_correct:
+                correct[question_id].add(answer_id)
+    key = {
+        question_id: KeyEntry(types[question_id] == "multiple", frozenset(correct[question_id]), frozenset(options[question_id]))
+        for question_id in types
+    }
+    answer_keys.set(cache_key, key)
+    return key
+
+
+def grade(key: dict, selections: dict):
+    """Score {question_id: set(answer_ids)} against a key, one point per question.
+
+    Single-choice questions need exactly the correct answer, multi-choice
+    ones exactly the correct set; unanswered questions score zero.
+    """
+    results = {}
+    for question_id, entry in key.items():
+        chosen = selections.get(question_id, frozenset())
+        if not entry.multiple and len(chosen) != 1:
+            results[question_id] = False
+        else:
+            results[question_id] = bool(entry.correct) and chosen == entry.correct
+    return sum(results.values()), results
+
+
+def record_attempt(db: Session, lesson_id: int, student_id: int, selections: dict, score: int, max_score: int):
+    """Store the attempt and fold it into the lesson aggregates in the caller's transaction."""
+    attempt = QuizAttempt(
+        lesson_id=lesson_id,
+        student_id=student_id,
+        score=score,
+        max_score=max_score,
+        answers={str(question_id): sorted(chosen) for question_id, chosen in selections.items()},
+    )
+    db.add(attempt)
+    db.execute(
+        update(Lesson)
+        .where(Lesson.id == lesson_id)
+        .values(
+            attempt_count=Lesson.attempt_count + 1,
+            score_sum=Lesson.score_sum + score,
+            max_score_sum=Lesson.max_score_sum + max_score,
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.flush()
+    return attempt
@@ -0,0 +1,70 @@
+import base64
+import json
+from fastapi import HTTPException
+from sqlalchemy import and_, func, or_
+from server.cache import TTLCache
+from server.settings import TEACHER_COUNT_CACHE_TTL
+from .models import TeacherProfile
+
+
+# filter tuple -> number of matching teachers
+teacher_count_cache = TTLCache(maxsize=1024, ttl=TEACHER_COUNT_CACHE_TTL)
+
+# catalog order: best rated first, then cheapest; id breaks ties
+CATALOG_ORDER = (TeacherProfile.rating.desc(), TeacherProfile.price_per_lesson, TeacherProfile.id)
+
+
+def encode_cursor(profile: TeacherProfile):
+    raw = json.dumps([profile.rating, profile.price_per_lesson, profile.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str):
+    try:
+        rating, price, teacher_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return rating, price, teacher_id
+
+
+def after_cursor(cursor: str):
+    """Rows that come after `cursor` in CATALOG_ORDER.
+
+    The leading `rating <= cursor rating` bound is redundant for the result
+    but lets the catalog index seek to the cursor instead of walking from
+    its start.
+    """
+    rating, price, teacher_id = decode_cursor(cursor)
+    return and_(
+        TeacherProfile.rating <= rating,
+        or_(
+            TeacherProfile.rating < rating,
+            and_(TeacherProfile.rating == rating, or_(
+                TeacherProfile.price_per_lesson > price,
+                and_(TeacherProfile.price_per_lesson == price, TeacherProfile.id > teacher_id),
+            )),
+        ),
+    )
+
+
+def page_with_total(query, key: tuple, offset: int, limit: int):
+    """Fetch one page and the total match count with a single query.
+
+    The total rides along as COUNT(*) OVER (). It is only missing when the
+    page is empty, then it comes from the short-lived cache or one COUNT.
+    Only for queries that sort every match anyway (search by relevance).
+    """
+    rows = query.add_columns(func.count().over()).offset(offset).limit(limit).all()
+    if rows:
+        total = rows[0][1]
+        teacher_count_cache.set(key, total)
+        return [row[0] for row in rows], total
+    return [], cached_count(query, key)
+
+
+def cached_count(query, key: tuple):
+    total = teacher_count_cache.get(key)
+    if total is None:
+        total = query.order_by(None).count()
+        teacher_count_cache.set(key, total)
+    return total
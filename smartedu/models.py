@@ -1,29 +1,39 @@
-from sqlalchemy import String, Integer, ForeignKey, Text, Integer, String, ForeignKey, false, Boolean
+from datetime import date, datetime, time, timezone
+from typing import Optional
+from sqlalchemy import String, Integer, ForeignKey, Text, Integer, String, ForeignKey, false, Boolean, Index, Float, Date, Time, JSON
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from server.models import BaseModel
+from server.models import BaseModel, UTCDateTime
 from accounts.models import User
 
 class TeacherProfile(BaseModel):
     __tablename__ = "teacher_profiles"
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False, index=True)
 
     description: Mapped[str] = mapped_column(Text)
     price_per_lesson: Mapped[int] = mapped_column(Integer, nullable=False)
 
     is_verified: Mapped[bool] = mapped_column(server_default=false(), nullable=False)
 
-    rating: Mapped[int] = mapped_column(Integer, server_default="0")
+    # average review rating, kept in step with rating_sum / rating_count
+    # by smartedu.ratings on every review insert/delete
+    rating: Mapped[float] = mapped_column(Float, server_default="0", nullable=False)
+    rating_sum: Mapped[int] = mapped_column(Integer, server_default="0", nullable=False)
+    rating_count: Mapped[int] = mapped_column(Integer, server_default="0", nullable=False)
 
     user: Mapped["User"] = relationship()
 
 
+# catalog order of search_teachers: rating desc, price, id
+Index("ix_teacher_profiles_catalog", TeacherProfile.rating.desc(), TeacherProfile.price_per_lesson, TeacherProfile.id)
+
+
 class StudentProfile(BaseModel):
     __tablename__ = "student_profiles"
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False, index=True)
 
     full_name: Mapped[str] = mapped_column(String, nullable=False)
 
@@ -39,6 +49,10 @@ class Subject(BaseModel):
 
 class TeacherSubject(BaseModel):
     __tablename__ = "teacher_subjects"
+    __table_args__ = (
+        Index("ix_teacher_subjects_teacher_id_subject_id", "teacher_id", "subject_id", unique=True),
+        Index("ix_teacher_subjects_subject_id_teacher_id", "subject_id", "teacher_id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     teacher_id: Mapped[int] = mapped_column(ForeignKey("teacher_profiles.id"))
@@ -47,14 +61,49 @@ class TeacherSubject(BaseModel):
 
 class ScheduleSlot(BaseModel):
     __tablename__ = "schedule_slots"
+    __table_args__ = (
+        # one slot per teacher and start, whoever creates it
+        Index("ix_schedule_slots_teacher_id_start_time", "teacher_id", "start_time", unique=True),
+        Index("ix_schedule_slots_status_start_time", "status", "start_time"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     teacher_id: Mapped[int] = mapped_column(ForeignKey("teacher_profiles.id"))
+    rule_id: Mapped[Optional[int]] = mapped_column(ForeignKey("availability_rules.id"), index=True)
+
+    start_time: Mapped[datetime] = mapped_column(UTCDateTime, nullable=False)
+    end_time: Mapped[datetime] = mapped_column(UTCDateTime, nullable=False)
+
+    # available -> booked only through smartedu.availability.reserve_slot
+    status: Mapped[str] = mapped_column(String, default="available", nullable=False)
+
+
+class AvailabilityRule(BaseModel):
+    """Weekly availability, e.g. Mon/Wed 10:00-14:00 in 60-minute slots.
+
+    Times are wall-clock in `timezone`; slots are materialized lazily up to
+    `materialized_until` by smartedu.recurrence.
+    """
+    __tablename__ = "availability_rules"
 
-    start_time: Mapped[str] = mapped_column(String, nullable=False)
-    end_time: Mapped[str] = mapped_column(String, nullable=False)
+    id: Mapped[int] = mapped_column(primary_key=True)
+    teacher_id: Mapped[int] = mapped_column(ForeignKey("teacher_profiles.id"), index=True)
+
+    # bit 0 = Monday ... bit 6 = Sunday
+    weekday_mask: Mapped[int] = mapped_column(Integer, nullable=False)
+    start_time: Mapped[time] = mapped_column(Time, nullable=False)
+    end_time: Mapped[time] = mapped_column(Time, nullable=False)
+    slot_minutes: Mapped[int] = mapped_column(Integer, nullable=False)
+    timezone: Mapped[str] = mapped_column(String(64), default="UTC", nullable=False)
+
+    valid_from: Mapped[date] = mapped_column(Date, nullable=False)
+    valid_until: Mapped[Optional[date]] = mapped_column(Date)
+    # last day that already has slots; None until the first expansion
+    materialized_until: Mapped[Optional[date]] = mapped_column(Date)
 
-    status: Mapped[str] = mapped_column(String, default="available") 
+    @property
+    def weekdays(self):
+        return [day for day in range(7) if self.weekday_mask & (1 << day)]
 
 
 class Booking(BaseModel):
@@ -62,9 +111,9 @@ class Booking(BaseModel):
 
     id: Mapped[int] = mapped_column(primary_key=True)
 
-    slot_id: Mapped[int] = mapped_column(ForeignKey("schedule_slots.id"))
-    student_id: Mapped[int] = mapped_column(ForeignKey("student_profiles.id"))
-    teacher_id: Mapped[int] = mapped_column(ForeignKey("teacher_profiles.id"))
+    slot_id: Mapped[int] = mapped_column(ForeignKey("schedule_slots.id"), index=True)
+    student_id: Mapped[int] = mapped_column(ForeignKey("student_profiles.id"), index=True)
+    teacher_id: Mapped[int] = mapped_column(ForeignKey("teacher_profiles.id"), index=True)
 
     status: Mapped[str] = mapped_column(String, default="booked")  
 
@@ -74,7 +123,7 @@ class Payment(BaseModel):
 
     id: Mapped[int] = mapped_column(primary_key=True)
     booking_id: Mapped[int] = mapped_column(
-        ForeignKey("bookings.id")
+        ForeignKey("bookings.id"), index=True
     )
 
     amount: Mapped[int] = mapped_column(Integer, nullable=False)
@@ -89,18 +138,19 @@ class Review(BaseModel):
 
     id: Mapped[int] = mapped_column(primary_key=True)
 
+    # one review per booking
     booking_id: Mapped[int] = mapped_column(
-        ForeignKey("bookings.id")
+        ForeignKey("bookings.id"), index=True, unique=True
     )
     teacher_id: Mapped[int] = mapped_column(
-        ForeignKey("teacher_profiles.id")
+        ForeignKey("teacher_profiles.id"), index=True
     )
     student_id: Mapped[int] = mapped_column(
-        ForeignKey("student_profiles.id")
+        ForeignKey("student_profiles.id"), index=True
     )
 
     rating: Mapped[int] = mapped_column(Integer, nullable=False)
-    comment: Mapped[str] = mapped_column(Text)
+    comment: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
 
 
 
@@ -108,34 +158,55 @@ class Lesson(BaseModel):
     __tablename__ = "lessons"
 
     id = mapped_column(Integer, primary_key=True)
-    subject_id = mapped_column(ForeignKey("subjects.id"))
+    subject_id = mapped_column(ForeignKey("subjects.id"), index=True)
     title = mapped_column(String(255))
     description = mapped_column(String, nullable=True)
 
+    # quiz aggregates, bumped by smartedu.grading on every attempt
+    attempt_count = mapped_column(Integer, server_default="0", nullable=False)
+    score_sum = mapped_column(Integer, server_default="0", nullable=False)
+    max_score_sum = mapped_column(Integer, server_default="0", nullable=False)
+
     subject = relationship("Subject", back_populates="lessons")
-    questions = relationship("Question", back_populates="lesson")
+    questions = relationship("Question", back_populates="lesson", order_by="Question.id")
 
 
 class Question(BaseModel):
     __tablename__ = "questions"
 
     id = mapped_column(Integer, primary_key=True)
-    lesson_id = mapped_column(ForeignKey("lessons.id"))
+    lesson_id = mapped_column(ForeignKey("lessons.id"), index=True)
     text = mapped_column(String)
     type = mapped_column(String, default="single")
 
     lesson = relationship("Lesson", back_populates="questions")
-    answers = relationship("Answer", back_populates="question")
+    answers = relationship("Answer", back_populates="question", order_by="Answer.id")
 
 
 class Answer(BaseModel):
     __tablename__ = "answers"
 
     id = mapped_column(Integer, primary_key=True)
-    question_id = mapped_column(ForeignKey("questions.id"))
+    question_id = mapped_column(ForeignKey("questions.id"), index=True)
     text = mapped_column(String)
     is_correct = mapped_column(Boolean, default=False)
 
     question = relationship("Question", back_populates="answers")
 
 
+class QuizAttempt(BaseModel):
+    """One graded submission; the selections live in a single JSON column
+    ({question_id: [answer_id, ...]}) rather than a row per answer."""
+    __tablename__ = "quiz_attempts"
+    __table_args__ = (
+        Index("ix_quiz_attempts_lesson_id_student_id", "lesson_id", "student_id"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    lesson_id: Mapped[int] = mapped_column(ForeignKey("lessons.id"))
+    student_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
+
+    score: Mapped[int] = mapped_column(Integer, nullable=False)
+    max_score: Mapped[int] = mapped_column(Integer, nullable=False)
+    answers: Mapped[dict] = mapped_column(JSON, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(UTCDateTime, default=lambda: datetime.now(timezone.utc))
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+from sqlalchemy import Float, case, cast, func, select, update
+from sqlalchemy.orm import Session
+from server.settings import SessionLocal, RATING_RECONCILE_INTERVAL
+from .models import TeacherProfile, Review
+
+
+logger = logging.getLogger(__name__)
+
+
+def _apply(db: Session, teacher_id: int, delta_sum: int, delta_count: int):
+    # a single UPDATE in the caller's transaction; SET expressions read the
+    # old row, so concurrent reviews can't lose each other's increments
+    new_sum = TeacherProfile.rating_sum + delta_sum
+    new_count = TeacherProfile.rating_count + delta_count
+    db.execute(
+        update(TeacherProfile)
+        .where(TeacherProfile.id == teacher_id)
+        .values(
+            rating_sum=new_sum,
+            rating_count=new_count,
+            rating=case((new_count > 0, cast(new_sum, Float) / new_count), else_=0),
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def add_rating(db: Session, teacher_id: int, rating: int):
+    _apply(db, teacher_id, rating, 1)
+
+
+def remove_rating(db: Session, teacher_id: int, rating: int):
+    _apply(db, teacher_id, -rating, -1)
+
+
+def reconcile_ratings(db: Session):
+    """Recompute every teacher's aggregates from reviews in one statement.
+
+    The profiles are locked first: the UPDATE then reads reviews after every
+    concurrent add/remove_rating has committed, and later ones wait for it,
+    so no increment is overwritten by a stale recount.
+    """
+    db.execute(select(TeacherProfile.id).order_by(TeacherProfile.id).with_for_update())
+    reviews = select(Review.rating).where(Review.teacher_id == TeacherProfile.id)
+    rating_sum = func.coalesce(reviews.with_only_columns(func.sum(Review.rating)).scalar_subquery(), 0)
+    rating_count = reviews.with_only_columns(func.count()).scalar_subquery()
+    rating = func.coalesce(reviews.with_only_columns(func.avg(Review.rating)).scalar_subquery(), 0)
+    result = db.execute(
+        update(TeacherProfile)
+        .values(rating_sum=rating_sum, rating_count=rating_count, rating=rating)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount
+
+
+class RatingReconciler:
+    """Background job that rebuilds the aggregates every RATING_RECONCILE_INTERVAL seconds."""
+
+    def __init__(self, interval: int = RATING_RECONCILE_INTERVAL):
+        self.interval = interval
+        self._task = None
+
+    def _run_once(self):
+        db = SessionLocal()
+        try:
+            return reconcile_ratings(db)
+        finally:
+            db.close()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                rows = await asyncio.to_thread(self._run_once)
+                logger.info("reconciled ratings of %s teachers", rows)
+            except Exception:
+                logger.exception("rating reconciliation failed")
+
+    def start(self):
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+rating_reconciler = RatingReconciler()
@@ -0,0 +1,188 @@
+import asyncio
+import bisect
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from server.settings import SessionLocal, AVAILABILITY_HORIZON_WEEKS, AVAILABILITY_EXPAND_INTERVAL
+from .models import AvailabilityRule, ScheduleSlot
+
+
+logger = logging.getLogger(__name__)
+
+
+def horizon(today: date = None):
+    return (today or date.today()) + timedelta(weeks=AVAILABILITY_HORIZON_WEEKS)
+
+
+def _to_utc(day: date, wall: time, tz: ZoneInfo):
+    """UTC instant of a wall-clock time, or None if the clock skips it (DST gap).
+
+    A repeated wall-clock time (DST fold) resolves to its first occurrence.
+    """
+    local = datetime.combine(day, wall, tzinfo=tz)
+    instant = local.astimezone(timezone.utc)
+    if instant.astimezone(tz).replace(tzinfo=None) != local.replace(tzinfo=None):
+        return None
+    return instant
+
+
+def occurrences(rule: AvailabilityRule, first: date, last: date):
+    """Yield (start, end) UTC datetimes of the rule's slots between two days inclusive.
+
+    Starts step through the window in wall-clock time; each slot is then
+    `slot_minutes` of real time from its own start. Starts that don't exist
+    on the local clock are skipped, as are slots that would overlap the
+    previous one or run past the window's end.
+    """
+    tz = ZoneInfo(rule.timezone)
+    length = timedelta(minutes=rule.slot_minutes)
+    day = first
+    while day <= last:
+        if rule.weekday_mask & (1 << day.weekday()):
+            wall = datetime.combine(day, rule.start_time)
+            window_end = datetime.combine(day, rule.end_time)
+            last_instant = window_end.replace(tzinfo=tz).astimezone(timezone.utc)
+            previous_end = None
+            while wall + length <= window_end:
+                start = _to_utc(day, wall.time(), tz)
+                if start is not None and start + length <= last_instant and (previous_end is None or start >= previous_end):
+                    previous_end = start + length
+                    yield start, previous_end
+                wall += length
+        day += timedelta(days=1)
+
+
+def insert_slots(db: Session, rows: list):
+    """Insert slot rows, skipping any whose (teacher_id, start_time) already exists.
+
+    The unique index makes a concurrent expansion (another worker, or a
+    manual slot) lose quietly instead of doubling the slot. Returns how
+    many rows went in.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    statement = (
+        dialect_insert(ScheduleSlot)
+        .on_conflict_do_nothing(index_elements=["teacher_id", "start_time"])
+        .returning(ScheduleSlot.id)
+    )
+    return len(db.execute(statement, rows).all())
+
+
+def materialize_rule(db: Session, rule: AvailabilityRule, until: date = None):
+    """Create the rule's slots up to `until` (default: the rolling horizon).
+
+    Only days after `materialized_until` are expanded, candidates that
+    overlap an existing slot of the teacher are skipped, and the rest go in
+    through insert_slots. Runs in the caller's transaction.
+    """
+    today = date.today()
+    until = min(until or horizon(today), rule.valid_until or date.max)
+    first = max(rule.valid_from, today)
+    if rule.materialized_until is not None:
+        first = max(first, rule.materialized_until + timedelta(days=1))
+    if first > until:
+        return 0
+
+    candidates = list(occurrences(rule, first, until))
+    now = datetime.now(timezone.utc)
+    candidates = [(start, end) for start, end in candidates if start > now]
+    created = 0
+    if candidates:
+        existing = (
+            db.query(ScheduleSlot.start_time, ScheduleSlot.end_time)
+            .filter(
+                ScheduleSlot.teacher_id == rule.teacher_id,
+                ScheduleSlot.start_time < candidates[-1][1],
+                ScheduleSlot.end_time > candidates[0][0],
+            )
+            .order_by(ScheduleSlot.start_time)
+            .all()
+        )
+        starts = [slot.start_time for slot in existing]
+        rows = []
+        for start, end in candidates:
+            # only the slot starting just before `end` can overlap, existing
+            # slots of one teacher never overlap each other (a race that gets
+            # past this check still can't repeat a start: see insert_slots)
+            i = bisect.bisect_left(starts, end)
+            if i and existing[i - 1].end_time > start:
+                continue
+            rows.append({"teacher_id": rule.teacher_id, "rule_id": rule.id, "start_time": start, "end_time": end, "status": "available"})
+        if rows:
+            created = insert_slots(db, rows)
+    rule.materialized_until = until
+    return created
+
+
+def delete_future_slots(db: Session, rule: AvailabilityRule):
+    return (
+        db.query(ScheduleSlot)
+        .filter(
+            ScheduleSlot.rule_id == rule.id,
+            ScheduleSlot.status == "available",
+            ScheduleSlot.start_time > datetime.now(timezone.utc),
+        )
+        .delete(synchronize_session=False)
+    )
+
+
+def extend_all(db: Session):
+    """Top up every active rule to the rolling horizon."""
+    today = date.today()
+    until = horizon(today)
+    rules = (
+        db.query(AvailabilityRule)
+        .filter(
+            or_(AvailabilityRule.materialized_until.is_(None), AvailabilityRule.materialized_until < until),
+            or_(AvailabilityRule.valid_until.is_(None), AvailabilityRule.valid_until >= today),
+        )
+        # every worker runs this job; on postgres each rule is expanded by
+        # whichever worker locks it first, the others skip it
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    created = sum(materialize_rule(db, rule, until) for rule in rules)
+    db.commit()
+    return created
+
+
+class SlotMaterializer:
+    """Background job that keeps rule-generated slots AVAILABILITY_HORIZON_WEEKS ahead."""
+
+    def __init__(self, interval: int = AVAILABILITY_EXPAND_INTERVAL):
+        self.interval = interval
+        self._task = None
+
+    def _run_once(self):
+        db = SessionLocal()
+        try:
+            return extend_all(db)
+        finally:
+            db.close()
+
+    async def _run(self):
+        while True:
+            try:
+                created = await asyncio.to_thread(self._run_once)
+                if created:
+                    logger.info("materialized %s slots from availability rules", created)
+            except Exception:
+                logger.exception("slot materialization failed")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+slot_materializer = SlotMaterializer()
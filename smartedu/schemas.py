@@ -1,5 +1,7 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import BaseModel, Field, AwareDatetime, field_validator, model_validator
+from datetime import date, datetime, time
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from typing import Literal, Optional
 from typing import List
 
 class TeacherProfileCreateSchema(BaseModel):
@@ -14,7 +16,8 @@ class TeacherProfileResponseSchema(BaseModel):
     id: int
     description: Optional[str]
     price_per_lesson: int
-    rating: int
+    rating: float
+    rating_count: int
     is_verified: bool
 
     class Config:
@@ -23,6 +26,7 @@ class TeacherProfileResponseSchema(BaseModel):
 class TeacherProfileListSchema(BaseModel):
     total: int
     items: List[TeacherProfileResponseSchema]
+    next_cursor: Optional[str] = None
 
 class StudentProfileCreateSchema(BaseModel):
     full_name: str = Field(..., min_length=2, max_length=100)
@@ -48,18 +52,77 @@ class TeacherSubjectCreateSchema(BaseModel):
     subject_id: int = Field(..., gt=0)
 
 class ScheduleSlotCreateSchema(BaseModel):
-    start_time: str = Field(..., example="2026-01-20 10:00")
-    end_time: str = Field(..., example="2026-01-20 11:00")
+    start_time: AwareDatetime = Field(..., example="2026-01-20T10:00:00+05:00")
+    end_time: AwareDatetime = Field(..., example="2026-01-20T11:00:00+05:00")
+
+    @model_validator(mode="after")
+    def check_range(self):
+        if self.end_time <= self.start_time:
+            raise ValueError("end_time must be after start_time")
+        return self
 
 class ScheduleSlotResponseSchema(BaseModel):
     id: int
-    start_time: str
-    end_time: str
+    teacher_id: int
+    start_time: datetime
+    end_time: datetime
     status: str
 
     class Config:
         from_attributes = True
 
+class AvailabilityRuleCreateSchema(BaseModel):
+    weekdays: List[int] = Field(..., min_length=1, max_length=7, example=[0, 2])
+    start_time: time = Field(..., example="10:00")
+    end_time: time = Field(..., example="14:00")
+    slot_minutes: int = Field(60, ge=15, le=480)
+    timezone: str = Field("UTC", example="Asia/Dushanbe")
+    valid_from: Optional[date] = None
+    valid_until: Optional[date] = Field(None, example="2027-06-30")
+
+    @field_validator("weekdays")
+    def check_weekdays(cls, value):
+        if any(day < 0 or day > 6 for day in value):
+            raise ValueError("weekdays are 0 (Monday) to 6 (Sunday)")
+        return sorted(set(value))
+
+    @field_validator("timezone")
+    def check_timezone(cls, value):
+        try:
+            ZoneInfo(value)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise ValueError("unknown timezone")
+        return value
+
+    @model_validator(mode="after")
+    def check_window(self):
+        start = datetime.combine(date.min, self.start_time)
+        end = datetime.combine(date.min, self.end_time)
+        if (end - start).total_seconds() < self.slot_minutes * 60:
+            raise ValueError("window must fit at least one slot")
+        if self.valid_from and self.valid_until and self.valid_until < self.valid_from:
+            raise ValueError("valid_until must not be before valid_from")
+        return self
+
+class AvailabilityRuleResponseSchema(BaseModel):
+    id: int
+    teacher_id: int
+    weekdays: List[int]
+    start_time: time
+    end_time: time
+    slot_minutes: int
+    timezone: str
+    valid_from: date
+    valid_until: Optional[date]
+    materialized_until: Optional[date]
+
+    class Config:
+        from_attributes = True
+
+class AvailabilityRuleCreatedSchema(BaseModel):
+    rule: AvailabilityRuleResponseSchema
+    slots_created: int
+
 class BookingCreateSchema(BaseModel):
     slot_id: int = Field(..., gt=0)
 
@@ -120,7 +183,7 @@ class LessonResponseSchema(BaseModel):
 class QuestionCreateSchema(BaseModel):
     lesson_id: int
     text: str
-    type: str = "single"
+    type: Literal["single", "multiple"] = "single"
 
 class QuestionResponseSchema(BaseModel):
     id: int
@@ -145,3 +208,51 @@ class AnswerResponseSchema(BaseModel):
     class Config:
         from_attributes = True
 
+
+# what students see: no is_correct
+class AnswerPublicSchema(BaseModel):
+    id: int
+    text: str
+
+    class Config:
+        from_attributes = True
+
+class QuestionFullSchema(QuestionResponseSchema):
+    answers: List[AnswerPublicSchema]
+
+class LessonFullSchema(LessonResponseSchema):
+    subject_id: int | None
+    questions: List[QuestionFullSchema]
+
+
+class QuestionSubmissionSchema(BaseModel):
+    question_id: int
+    answer_ids: List[int] = Field(default_factory=list, max_length=50)
+
+class QuizSubmissionSchema(BaseModel):
+    answers: List[QuestionSubmissionSchema] = Field(..., max_length=500)
+
+class QuestionResultSchema(BaseModel):
+    question_id: int
+    correct: bool
+
+class QuizResultSchema(BaseModel):
+    attempt_id: int
+    score: int
+    max_score: int
+    results: List[QuestionResultSchema]
+
+class QuizAttemptResponseSchema(BaseModel):
+    id: int
+    lesson_id: int
+    score: int
+    max_score: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class LessonStatsSchema(BaseModel):
+    lesson_id: int
+    attempts: int
+    average_score: float | None
@@ -0,0 +1,78 @@
+import re
+from sqlalchemy import Float, select, text
+from sqlalchemy.orm import Session
+from accounts.models import User
+from .models import TeacherProfile, TeacherSubject, Subject
+
+# Full-text index over teacher description, username and subject names.
+# SQLite: FTS5 table `teacher_search` whose rowid is the teacher id.
+# PostgreSQL: `teacher_search(teacher_id, document tsvector)` with a GIN index.
+# Both are created by the alembic migration and kept in sync by index_teacher().
+
+# bm25 weights for description, username, subjects
+SQLITE_RANK = "bm25(teacher_search, 1.0, 3.0, 2.0)"
+
+
+def _is_postgres(db: Session):
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def _terms(search: str):
+    return re.findall(r"\w+", search.lower())
+
+
+def index_teacher(db: Session, teacher_id: int):
+    """Rebuild the search document of one teacher, in the caller's transaction."""
+    row = db.execute(
+        select(TeacherProfile.description, User.username)
+        .join(User, User.id == TeacherProfile.user_id)
+        .where(TeacherProfile.id == teacher_id)
+    ).first()
+    if row is None:
+        return
+    subjects = db.scalars(
+        select(Subject.name)
+        .join(TeacherSubject, TeacherSubject.subject_id == Subject.id)
+        .where(TeacherSubject.teacher_id == teacher_id)
+    ).all()
+    params = {
+        "id": teacher_id,
+        "description": row.description or "",
+        "username": row.username,
+        "subjects": " ".join(subjects),
+    }
+    if _is_postgres(db):
+        db.execute(text(
+            "INSERT INTO teacher_search (teacher_id, document) VALUES (:id, "
+            "setweight(to_tsvector('simple', :username), 'A') || "
+            "setweight(to_tsvector('simple', :subjects), 'B') || "
+            "setweight(to_tsvector('simple', :description), 'C')) "
+            "ON CONFLICT (teacher_id) DO UPDATE SET document = EXCLUDED.document"
+        ), params)
+    else:
+        db.execute(text("DELETE FROM teacher_search WHERE rowid = :id"), params)
+        db.execute(text(
+            "INSERT INTO teacher_search (rowid, description, username, subjects) "
+            "VALUES (:id, :description, :username, :subjects)"
+        ), params)
+
+
+def teacher_search_subquery(db: Session, search: str):
+    """(teacher_id, rank) of teachers matching every word of `search` as a prefix.
+
+    Lower rank is more relevant. Returns None when `search` has no words.
+    """
+    terms = _terms(search)
+    if not terms:
+        return None
+    if _is_postgres(db):
+        stmt = text(
+            "SELECT teacher_id, -ts_rank(document, to_tsquery('simple', :query)) AS rank "
+            "FROM teacher_search WHERE document @@ to_tsquery('simple', :query)"
+        ).bindparams(query=" & ".join(f"{term}:*" for term in terms))
+    else:
+        stmt = text(
+            f"SELECT rowid AS teacher_id, {SQLITE_RANK} AS rank "
+            "FROM teacher_search WHERE teacher_search MATCH :query"
+        ).bindparams(query=" ".join(f'"{term}"*' for term in terms))
+    return stmt.columns(teacher_id=TeacherProfile.id.type, rank=Float).subquery("teacher_search_match")
@@ -1,11 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from datetime import date
 from typing import List, Optional
+from pydantic import AwareDatetime
 from server.settings import get_db
 from .models import *
 from accounts.models import User
 from .schemas import *
-from accounts.permissions import get_current_user
+from .search import index_teacher, teacher_search_subquery
+from .ratings import add_rating, remove_rating
+from .availability import free_slots, overlaps, release_slot, reserve_slot
+from .recurrence import delete_future_slots, materialize_rule
+from .content import (
+    bump_content, cached_json, content_cache, etag_matches, lesson_full_json, lesson_json, lesson_questions_json, make_etag,
+    question_answers_json, subject_lessons_json, subjects_json,
+)
+from .grading import answer_key, grade, record_attempt
+from .helpers import CATALOG_ORDER, after_cursor, cached_count, encode_cursor, page_with_total
+from accounts.permissions import get_current_user, is_admin_user
 
 
 teacher_router = APIRouter(prefix="/teachers", tags=["Teachers"])
@@ -18,6 +31,8 @@ def create_teacher_profile(
 ):
     profile = TeacherProfile(user_id=user.id, description=data.description, price_per_lesson=data.price_per_lesson)
     db.add(profile)
+    db.flush()
+    index_teacher(db, profile.id)
     db.commit()
     db.refresh(profile)
     return profile
@@ -41,6 +56,8 @@ def update_teacher_profile(
         raise HTTPException(status_code=404, detail="Profile not found")
     for field, value in data.dict(exclude_unset=True).items():
         setattr(profile, field, value)
+    db.flush()
+    index_teacher(db, profile.id)
     db.commit()
     db.refresh(profile)
     return profile
@@ -62,8 +79,13 @@ def assign_subject_to_teacher(
     teacher_profile = db.query(TeacherProfile).filter_by(user_id=user.id).first()
     if not teacher_profile:
         raise HTTPException(status_code=404, detail="Teacher profile not found")
+    exists = db.query(TeacherSubject.id).filter_by(teacher_id=teacher_profile.id, subject_id=data.subject_id).first()
+    if exists:
+        return {"status": "subject assigned"}
     teacher_subject = TeacherSubject(teacher_id=teacher_profile.id, subject_id=data.subject_id)
     db.add(teacher_subject)
+    db.flush()
+    index_teacher(db, teacher_profile.id)
     db.commit()
     return {"status": "subject assigned"}
 
@@ -73,12 +95,14 @@ def search_teachers(
     subject: Optional[int] = Query(None),
     min_price: Optional[int] = Query(None),
     max_price: Optional[int] = Query(None),
-    rating: Optional[int] = Query(None),
+    rating: Optional[float] = Query(None, ge=0, le=5),
     limit: int = Query(10, ge=1, le=100),
     offset: int = Query(0, ge=0),
     search: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page, replaces offset"),
     db: Session = Depends(get_db),
 ):
+    key = (subject, min_price, max_price, rating, search)
     query = db.query(TeacherProfile)
     if min_price is not None:
         query = query.filter(TeacherProfile.price_per_lesson >= min_price)
@@ -87,15 +111,33 @@ def search_teachers(
     if rating is not None:
         query = query.filter(TeacherProfile.rating >= rating)
     if subject is not None:
-        query = query.join(TeacherSubject).filter(TeacherSubject.subject_id == subject)
-    if search:
+        # a correlated EXISTS rather than a join: the planner then walks the
+        # catalog index in order and probes (teacher_id, subject_id) per
+        # teacher, instead of collecting the subject's teachers and sorting
         query = query.filter(
-            TeacherProfile.description.ilike(f"%{search}%") |
-            TeacherProfile.user.has(User.username.ilike(f"%{search}%"))
+            db.query(TeacherSubject.id)
+            .filter(TeacherSubject.teacher_id == TeacherProfile.id, TeacherSubject.subject_id == subject)
+            .exists()
         )
-    total = query.count()
-    items = query.offset(offset).limit(limit).all()
-    return {"total": total, "items": items}
+    match = teacher_search_subquery(db, search) if search else None
+    if match is not None:
+        if cursor is not None:
+            raise HTTPException(status_code=400, detail="cursor can't be combined with search")
+        query = query.join(match, match.c.teacher_id == TeacherProfile.id).order_by(match.c.rank, TeacherProfile.id)
+        items, total = page_with_total(query, key, offset, limit)
+        return {"total": total, "items": items}
+
+    # the page walks the catalog index and stops at `limit`; COUNT(*) OVER ()
+    # would read and sort every match, so the total comes from the count cache
+    query = query.order_by(*CATALOG_ORDER)
+    total = cached_count(query, key)
+    if cursor is not None:
+        query = query.filter(after_cursor(cursor))
+    else:
+        query = query.offset(offset)
+    items = query.limit(limit).all()
+    next_cursor = encode_cursor(items[-1]) if len(items) == limit else None
+    return {"total": total, "items": items, "next_cursor": next_cursor}
 
 
 @teacher_router.get("/slots/{teacher_id}", response_model=List[ScheduleSlotResponseSchema])
@@ -135,32 +177,120 @@ def create_subject(data: SubjectCreateSchema, db: Session = Depends(get_db)):
     db.add(subject)
     db.commit()
     db.refresh(subject)
+    bump_content("subjects")
     return subject
 
 @subject_router.get("", response_model=List[SubjectResponseSchema])
 def list_subjects(db: Session = Depends(get_db)):
-    return db.query(Subject).all()
+    return cached_json("subjects", "all", lambda: subjects_json(db))
 
 
 schedule_router = APIRouter(prefix="/schedule", tags=["Schedule"])
 
 @schedule_router.post("/slots", response_model=ScheduleSlotResponseSchema)
 def create_slot(data: ScheduleSlotCreateSchema, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    slot = ScheduleSlot(teacher_id=user.id, start_time=data.start_time, end_time=data.end_time)
+    teacher_profile = db.query(TeacherProfile).filter_by(user_id=user.id).first()
+    if not teacher_profile:
+        raise HTTPException(status_code=404, detail="Teacher profile not found")
+    if overlaps(db, teacher_profile.id, data.start_time, data.end_time):
+        raise HTTPException(status_code=409, detail="Slot overlaps an existing slot")
+    slot = ScheduleSlot(teacher_id=teacher_profile.id, start_time=data.start_time, end_time=data.end_time)
     db.add(slot)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # a rule expansion created the same start in the meantime
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Slot overlaps an existing slot")
     db.refresh(slot)
     return slot
 
 @schedule_router.get("/slots/me", response_model=List[ScheduleSlotResponseSchema])
 def my_slots(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    return db.query(ScheduleSlot).filter_by(teacher_id=user.id).all()
+    teacher_profile = db.query(TeacherProfile).filter_by(user_id=user.id).first()
+    if not teacher_profile:
+        return []
+    # one teacher_id, so (teacher_id, start_time) already returns them in order
+    return (
+        db.query(ScheduleSlot)
+        .filter(ScheduleSlot.teacher_id == teacher_profile.id)
+        .order_by(ScheduleSlot.start_time)
+        .all()
+    )
+
+@schedule_router.get("/available", response_model=List[ScheduleSlotResponseSchema])
+def available_slots(
+    start: AwareDatetime = Query(...),
+    end: AwareDatetime = Query(...),
+    teacher_id: Optional[int] = Query(None),
+    subject_id: Optional[int] = Query(None),
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_db),
+):
+    if end <= start:
+        raise HTTPException(status_code=400, detail="end must be after start")
+    return free_slots(db, start, end, teacher_id=teacher_id, subject_id=subject_id, limit=limit)
+
+@schedule_router.post("/rules", response_model=AvailabilityRuleCreatedSchema)
+def create_availability_rule(data: AvailabilityRuleCreateSchema, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    teacher_profile = db.query(TeacherProfile).filter_by(user_id=user.id).first()
+    if not teacher_profile:
+        raise HTTPException(status_code=404, detail="Teacher profile not found")
+    rule = AvailabilityRule(
+        teacher_id=teacher_profile.id,
+        weekday_mask=sum(1 << day for day in data.weekdays),
+        start_time=data.start_time,
+        end_time=data.end_time,
+        slot_minutes=data.slot_minutes,
+        timezone=data.timezone,
+        valid_from=data.valid_from or date.today(),
+        valid_until=data.valid_until,
+    )
+    db.add(rule)
+    db.flush()
+    created = materialize_rule(db, rule)
+    db.commit()
+    db.refresh(rule)
+    return {"rule": rule, "slots_created": created}
+
+@schedule_router.get("/rules/me", response_model=List[AvailabilityRuleResponseSchema])
+def my_availability_rules(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    return (
+        db.query(AvailabilityRule)
+        .join(TeacherProfile, TeacherProfile.id == AvailabilityRule.teacher_id)
+        .filter(TeacherProfile.user_id == user.id)
+        .all()
+    )
+
+@schedule_router.delete("/rules/{rule_id}")
+def delete_availability_rule(rule_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    rule = (
+        db.query(AvailabilityRule)
+        .join(TeacherProfile, TeacherProfile.id == AvailabilityRule.teacher_id)
+        .filter(AvailabilityRule.id == rule_id, TeacherProfile.user_id == user.id)
+        .first()
+    )
+    if not rule:
+        raise HTTPException(status_code=404, detail="Rule not found")
+    # booked slots stay; they just stop pointing at the rule
+    removed = delete_future_slots(db, rule)
+    db.query(ScheduleSlot).filter_by(rule_id=rule.id).update({"rule_id": None}, synchronize_session=False)
+    db.delete(rule)
+    db.commit()
+    return {"status": "deleted", "slots_removed": removed}
 
 @schedule_router.delete("/slots/{slot_id}")
 def delete_slot(slot_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    slot = db.query(ScheduleSlot).filter_by(id=slot_id, teacher_id=user.id).first()
+    slot = (
+        db.query(ScheduleSlot)
+        .join(TeacherProfile, TeacherProfile.id == ScheduleSlot.teacher_id)
+        .filter(ScheduleSlot.id == slot_id, TeacherProfile.user_id == user.id)
+        .first()
+    )
     if not slot:
         raise HTTPException(status_code=404, detail="Slot not found")
+    if slot.status == "booked":
+        raise HTTPException(status_code=409, detail="Slot is booked")
     db.delete(slot)
     db.commit()
     return {"status": "deleted"}
@@ -173,6 +303,9 @@ def create_booking(data: BookingCreateSchema, db: Session = Depends(get_db), use
     slot = db.query(ScheduleSlot).filter_by(id=data.slot_id).first()
     if not slot:
         raise HTTPException(status_code=404, detail="Slot not found")
+    if not reserve_slot(db, slot.id):
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Slot is not available")
     booking = Booking(student_id=user.id, teacher_id=slot.teacher_id, slot_id=slot.id, status="booked")
     db.add(booking)
     db.commit()
@@ -181,7 +314,9 @@ def create_booking(data: BookingCreateSchema, db: Session = Depends(get_db), use
 
 @booking_router.get("/me", response_model=List[BookingResponseSchema])
 def my_bookings(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    return db.query(Booking).filter((Booking.student_id==user.id)|(Booking.teacher_id==user.id)).all()
+    # the student side holds user ids, the teacher side teacher profile ids
+    teacher_ids = db.query(TeacherProfile.id).filter(TeacherProfile.user_id == user.id)
+    return db.query(Booking).filter((Booking.student_id==user.id)|(Booking.teacher_id.in_(teacher_ids))).all()
 
 @booking_router.get("/{booking_id}", response_model=BookingResponseSchema)
 def get_booking(booking_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
@@ -195,6 +330,8 @@ def cancel_booking(booking_id: int, db: Session = Depends(get_db), user: User =
     booking = db.query(Booking).filter_by(id=booking_id).first()
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
+    if booking.status == "booked":
+        release_slot(db, booking.slot_id)
     booking.status = "cancelled"
     db.commit()
     return {"status": "cancelled"}
@@ -253,12 +390,37 @@ review_router = APIRouter(prefix="/reviews", tags=["Reviews"])
 
 @review_router.post("", response_model=ReviewResponseSchema)
 def create_review(data: ReviewCreateSchema, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
-    review = Review(teacher_id=data.teacher_id, student_id=user.id, rating=data.rating, comment=data.comment)
+    booking = db.query(Booking).filter_by(id=data.booking_id).first()
+    if not booking:
+        raise HTTPException(status_code=404, detail="Booking not found")
+    # bookings record the student's user id (see create_booking)
+    if booking.student_id != user.id:
+        raise HTTPException(status_code=403, detail="Not your booking")
+    if booking.status == "cancelled":
+        raise HTTPException(status_code=400, detail="Booking was cancelled")
+    review = Review(booking_id=booking.id, teacher_id=booking.teacher_id, student_id=user.id, rating=data.rating, comment=data.comment)
     db.add(review)
+    try:
+        db.flush()
+    except IntegrityError:
+        # unique booking_id: also catches two concurrent first reviews
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Booking already reviewed")
+    add_rating(db, review.teacher_id, review.rating)
     db.commit()
     db.refresh(review)
     return review
 
+@review_router.delete("/{review_id}")
+def delete_review(review_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    review = db.query(Review).filter_by(id=review_id, student_id=user.id).first()
+    if not review:
+        raise HTTPException(status_code=404, detail="Review not found")
+    remove_rating(db, review.teacher_id, review.rating)
+    db.delete(review)
+    db.commit()
+    return {"status": "deleted"}
+
 @review_router.get("/teacher/{teacher_id}", response_model=List[ReviewResponseSchema])
 def teacher_reviews(teacher_id: int, db: Session = Depends(get_db)):
     return db.query(Review).filter_by(teacher_id=teacher_id).all()
@@ -283,6 +445,10 @@ utils_router = APIRouter(tags=["Utils"])
 def health_check():
     return {"status": "ok"}
 
+@utils_router.get("/cache/stats", dependencies=[Depends(is_admin_user)])
+def content_cache_stats():
+    return content_cache.stats()
+
 
 lesson_router = APIRouter(prefix="/lessons", tags=["Lessons"])
 question_router = APIRouter(prefix="/questions", tags=["Questions"])
@@ -295,18 +461,65 @@ def create_lesson(data: LessonCreateSchema, db: Session = Depends(get_db), user:
     db.add(lesson)
     db.commit()
     db.refresh(lesson)
+    bump_content("lessons")
     return lesson
 
 @lesson_router.get("/{lesson_id}", response_model=LessonResponseSchema)
 def get_lesson(lesson_id: int, db: Session = Depends(get_db)):
+    response = cached_json("lessons", lesson_id, lambda: lesson_json(db, lesson_id))
+    if response is None:
+        raise HTTPException(status_code=404, detail="Lesson not found")
+    return response
+
+@lesson_router.get("/{lesson_id}/full", response_model=LessonFullSchema, responses={304: {"description": "Not modified"}})
+def get_lesson_full(lesson_id: int, if_none_match: Optional[str] = Header(None), db: Session = Depends(get_db)):
+    body = content_cache.get_or_load("quiz", f"full:{lesson_id}", lambda: lesson_full_json(db, lesson_id))
+    if body is None:
+        raise HTTPException(status_code=404, detail="Lesson not found")
+    etag = make_etag(body)
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+@lesson_router.post("/{lesson_id}/submit", response_model=QuizResultSchema)
+def submit_quiz(lesson_id: int, data: QuizSubmissionSchema, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    key = answer_key(db, lesson_id)
+    if not key:
+        raise HTTPException(status_code=404, detail="Lesson has no questions")
+    selections = {}
+    for item in data.answers:
+        entry = key.get(item.question_id)
+        if entry is None:
+            raise HTTPException(status_code=400, detail=f"Question {item.question_id} is not part of this lesson")
+        chosen = frozenset(item.answer_ids)
+        if not chosen <= entry.options:
+            raise HTTPException(status_code=400, detail=f"Unknown answer for question {item.question_id}")
+        selections[item.question_id] = chosen
+    score, results = grade(key, selections)
+    attempt_id = record_attempt(db, lesson_id, user.id, selections, score, len(key)).id
+    db.commit()
+    return {
+        "attempt_id": attempt_id,
+        "score": score,
+        "max_score": len(key),
+        "results": [{"question_id": question_id, "correct": correct} for question_id, correct in results.items()],
+    }
+
+@lesson_router.get("/{lesson_id}/attempts/me", response_model=List[QuizAttemptResponseSchema])
+def my_quiz_attempts(lesson_id: int, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+    return db.query(QuizAttempt).filter_by(lesson_id=lesson_id, student_id=user.id).order_by(QuizAttempt.id.desc()).all()
+
+@lesson_router.get("/{lesson_id}/stats", response_model=LessonStatsSchema)
+def lesson_stats(lesson_id: int, db: Session = Depends(get_db)):
     lesson = db.query(Lesson).filter_by(id=lesson_id).first()
     if not lesson:
         raise HTTPException(status_code=404, detail="Lesson not found")
-    return lesson
+    average = lesson.score_sum / lesson.max_score_sum if lesson.max_score_sum else None
+    return {"lesson_id": lesson.id, "attempts": lesson.attempt_count, "average_score": average}
 
 @lesson_router.get("/subject/{subject_id}", response_model=List[LessonResponseSchema])
 def subject_lessons(subject_id: int, db: Session = Depends(get_db)):
-    return db.query(Lesson).filter_by(subject_id=subject_id).all()
+    return cached_json("lessons", f"subject:{subject_id}", lambda: subject_lessons_json(db, subject_id))
 
 @question_router.post("", response_model=QuestionResponseSchema)
 def create_question(data: QuestionCreateSchema, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
@@ -314,11 +527,12 @@ def create_question(data: QuestionCreateSchema, db: Session = Depends(get_db), u
     db.add(question)
     db.commit()
     db.refresh(question)
+    bump_content("quiz")
     return question
 
 @question_router.get("/lesson/{lesson_id}", response_model=List[QuestionResponseSchema])
 def lesson_questions(lesson_id: int, db: Session = Depends(get_db)):
-    return db.query(Question).filter_by(lesson_id=lesson_id).all()
+    return cached_json("quiz", f"questions:{lesson_id}", lambda: lesson_questions_json(db, lesson_id))
 
 
 @answer_router.post("", response_model=AnswerResponseSchema)
@@ -327,10 +541,11 @@ def create_answer(data: AnswerCreateSchema, db: Session = Depends(get_db), user:
     db.add(answer)
     db.commit()
     db.refresh(answer)
+    bump_content("quiz")
     return answer
 
 
-@answer_router.get("/question/{question_id}", response_model=List[AnswerResponseSchema])
+@answer_router.get("/question/{question_id}", response_model=List[AnswerPublicSchema])
 def question_answers(question_id: int, db: Session = Depends(get_db)):
-    return db.query(Answer).filter_by(question_id=question_id).all()
+    return cached_json("quiz", f"answers:{question_id}", lambda: question_answers_json(db, question_id))
 
@@ -0,0 +1,120 @@
+import os
+import tempfile
+import uuid
+from typing import NamedTuple
+
+# settings are read at import time: point the app at a scratch database and
+# keep the periodic jobs quiet before anything imports it
+_workdir = tempfile.mkdtemp(prefix="lms-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_workdir}/test.db"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret-key-of-at-least-32-bytes")
+os.environ.setdefault("JWT_ALGORITHM", "HS256")
+os.environ["PUBSUB_BACKEND"] = "memory"
+os.environ.pop("CONTENT_CACHE_URL", None)
+os.environ["PROFILE_SQL"] = "false"
+for name in ("RATING_RECONCILE_INTERVAL", "AVAILABILITY_EXPAND_INTERVAL", "MESSAGE_ARCHIVE_INTERVAL"):
+    os.environ[name] = "0"
+# cheap argon2, the cost itself is not under test
+os.environ["ARGON2_TIME_COST"] = "1"
+os.environ["ARGON2_MEMORY_COST"] = "1024"
+os.environ["ARGON2_PARALLELISM"] = "1"
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from fastapi.testclient import TestClient
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Account(NamedTuple):
+    id: int
+    username: str
+    headers: dict
+
+    @property
+    def token(self):
+        return self.headers["Authorization"][7:]
+
+
+@pytest.fixture(scope="session")
+def app():
+    # the schema comes from the migrations, FTS tables and triggers included
+    command.upgrade(Config(os.path.join(ROOT, "alembic.ini")), "head")
+    from server.routers import app
+    return app
+
+
+@pytest.fixture(scope="session")
+def client(app):
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture
+def db(app):
+    from server.settings import SessionLocal
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def register(client):
+    """Create a user with a unique name and log in; the database is shared by all tests."""
+    def register(prefix="user", password="secret"):
+        username = f"{prefix}-{uuid.uuid4().hex[:10]}"
+        response = client.post("/auth/register", json={"username": username, "password": password})
+        assert response.status_code == 200, response.text
+        response = client.post("/auth/login", json={"username": username, "password": password})
+        headers = {"Authorization": "Bearer " + response.json()["access_tocken"]}
+        user_id = client.get("/auth/me", headers=headers).json()["id"]
+        return Account(user_id, username, headers)
+    return register
+
+
+@pytest.fixture
+def make_admin(db):
+    from accounts.models import User
+    from accounts.permissions import invalidate_user_access
+
+    def make_admin(account):
+        db.query(User).filter_by(id=account.id).update({"is_staff": True})
+        db.commit()
+        invalidate_user_access(account.id)
+        return account
+    return make_admin
+
+
+@pytest.fixture
+def make_teacher(client, register):
+    """Register a user with a teacher profile; returns (account, profile json)."""
+    def make_teacher(description="", price=100, prefix="teacher"):
+        account = register(prefix)
+        response = client.post(
+            "/teachers/profile", json={"description": description, "price_per_lesson": price}, headers=account.headers
+        )
+        assert response.status_code == 200, response.text
+        return account, response.json()
+    return make_teacher
+
+
+@pytest.fixture
+def make_slot(client):
+    """Create a one-hour slot `days` ahead for a teacher account."""
+    from datetime import datetime, timedelta, timezone
+
+    def make_slot(teacher, days=1, hour=10):
+        start = datetime.now(timezone.utc).replace(hour=hour, minute=0, second=0, microsecond=0) + timedelta(days=days)
+        response = client.post(
+            "/schedule/slots",
+            json={"start_time": start.isoformat(), "end_time": (start + timedelta(hours=1)).isoformat()},
+            headers=teacher.headers,
+        )
+        assert response.status_code == 200, response.text
+        return response.json()
+    return make_slot
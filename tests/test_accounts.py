@@ -0,0 +1,78 @@
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.ext.asyncio import AsyncSession
+from server.settings import AsyncSessionLocal, async_engine, to_async_url
+
+
+def test_async_url_mapping():
+    assert to_async_url("sqlite:///./lms.db") == "sqlite+aiosqlite:///./lms.db"
+    assert to_async_url("postgresql://u:p@db/lms") == "postgresql+asyncpg://u:p@db/lms"
+    assert to_async_url("postgresql+psycopg2://u:p@db/lms") == "postgresql+asyncpg://u:p@db/lms"
+    assert async_engine.url.drivername == "sqlite+aiosqlite"
+    assert isinstance(AsyncSessionLocal(), AsyncSession)
+
+
+def test_register_login_me(client, register):
+    account = register("alice")
+    response = client.get("/auth/me", headers=account.headers)
+    assert response.status_code == 200
+    assert response.json()["username"] == account.username
+
+
+def test_duplicate_register_rejected(client, register):
+    account = register()
+    response = client.post("/auth/register", json={"username": account.username, "password": "x"})
+    assert response.status_code == 400
+
+
+def test_concurrent_requests_on_async_session(client, register):
+    # async handlers share the async engine's pool, not one sync session
+    account = register()
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        responses = list(pool.map(lambda _: client.get("/auth/me", headers=account.headers), range(64)))
+    assert {response.status_code for response in responses} == {200}
+
+
+def test_missing_token_is_unauthorized(client):
+    assert client.get("/auth/me").status_code == 401
+
+
+def captured_sql(engine):
+    from contextlib import contextmanager
+    from sqlalchemy import event
+
+    @contextmanager
+    def capture():
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", record)
+    return capture()
+
+
+ACCESS_TABLES = ("user_permissions", "user_roles", "role_permissions")
+
+
+def test_current_user_is_one_plain_lookup(client, register):
+    account = register()
+    with captured_sql(async_engine.sync_engine) as statements:
+        assert client.get("/bookings/me", headers=account.headers).status_code == 200
+    assert len([sql for sql in statements if "FROM users" in sql]) == 1
+    assert not any(table in sql for sql in statements for table in ACCESS_TABLES)
+
+
+def test_warm_permission_check_does_not_rebuild(client, register, make_admin):
+    from accounts.permissions import permission_cache
+    account = make_admin(register("staff"))
+    client.get("/cache/stats", headers=account.headers)
+    access = permission_cache.get(account.id)
+    with captured_sql(async_engine.sync_engine) as statements:
+        assert client.get("/cache/stats", headers=account.headers).status_code == 200
+        assert client.get("/bookings/me", headers=account.headers).status_code == 200
+    assert permission_cache.get(account.id) is access
+    assert not any(table in sql for sql in statements for table in ACCESS_TABLES)
@@ -0,0 +1,20 @@
+from collections import Counter
+from fastapi.routing import APIRoute
+
+
+def test_manage_serves_the_configured_app(app):
+    import manage
+    assert manage.app is app
+
+
+def test_every_route_registered_once(app):
+    routes = Counter(
+        (route.path, method) for route in app.routes if isinstance(route, APIRoute) for method in route.methods
+    )
+    assert [route for route, count in routes.items() if count > 1] == []
+
+
+def test_health_and_cors(client):
+    response = client.get("/health", headers={"Origin": "http://localhost:3000"})
+    assert response.json() == {"status": "ok"}
+    assert response.headers["access-control-allow-origin"] == "http://localhost:3000"
@@ -0,0 +1,69 @@
+import json
+from datetime import datetime, timedelta
+from chats.archive import archive_messages
+from chats.models import ChatReadCursor, Message, MessageArchive
+from chats.views import message_writer
+
+
+def write(client, chat_id, sender_id, count):
+    async def write_all():
+        return [
+            (await message_writer.write(chat_id=chat_id, sender_id=sender_id, text=f"m{i}"))[0] for i in range(count)
+        ]
+    return client.portal.call(write_all)
+
+
+def test_history_pages_across_the_archive(client, register, db):
+    student, teacher = register("student"), register("teacher")
+    quiet = client.post("/chats", json={"teacher_id": register("teacher").id}, headers=student.headers).json()["id"]
+    chat_id = client.post("/chats", json={"teacher_id": teacher.id}, headers=student.headers).json()["id"]
+    quiet_ids = write(client, quiet, student.id, 3)
+    ids = write(client, chat_id, student.id, 10)
+
+    # everything before the chat's seventh message is old enough to archive
+    db.query(Message).filter(Message.id < ids[6]).update({"created_at": datetime.utcnow() - timedelta(days=2)})
+    db.commit()
+    archive_messages(db, days=1)
+
+    archived = {row.id for row in db.query(MessageArchive.id).filter(MessageArchive.chat_id.in_((chat_id, quiet)))}
+    assert archived == set(ids[:6]) | set(quiet_ids[:2])
+    # each chat's last message stays hot for the inbox
+    assert db.query(Message.id).filter_by(chat_id=quiet).scalar() == quiet_ids[-1]
+
+    def page(**params):
+        response = client.get(f"/chats/{chat_id}/messages", params=params, headers=student.headers)
+        return [message["id"] for message in response.json()]
+
+    assert page(limit=5) == ids[5:]
+    assert page(before=ids[5], limit=3) == ids[2:5]
+    assert page(before=ids[2], limit=5) == ids[:2]
+    assert page(after=ids[3], limit=4) == ids[4:8]
+    assert page(after=ids[7], limit=5) == ids[8:]
+
+    export = client.get(f"/chats/{chat_id}/messages/export", headers=student.headers)
+    assert [json.loads(line)["id"] for line in export.text.splitlines()] == ids
+
+    items = {item["chat_id"]: item for item in client.get("/chats/inbox", headers=student.headers).json()["items"]}
+    assert items[quiet]["last_message"]["id"] == quiet_ids[-1]
+
+
+def test_archived_message_can_be_marked_read(client, register, db):
+    student, teacher = register("student"), register("teacher")
+    chat_id = client.post("/chats", json={"teacher_id": teacher.id}, headers=student.headers).json()["id"]
+    ids = write(client, chat_id, student.id, 4)
+    db.query(Message).filter(Message.id < ids[-1]).update({"created_at": datetime.utcnow() - timedelta(days=2)})
+    db.commit()
+    archive_messages(db, days=1)
+    assert db.get(MessageArchive, ids[1]) is not None
+
+    response = client.post(f"/chats/{chat_id}/read", json={"message_id": ids[1]}, headers=teacher.headers)
+    assert response.status_code == 200
+    cursor = db.query(ChatReadCursor).filter_by(chat_id=chat_id, user_id=teacher.id).one()
+    assert cursor.last_read_message_id == ids[1]
+    # unread counts cover the hot table only
+    [item] = client.get("/chats/inbox", headers=teacher.headers).json()["items"]
+    assert item["unread_count"] == 1
+
+    other = client.post("/chats", json={"teacher_id": register("teacher").id}, headers=student.headers).json()["id"]
+    response = client.post(f"/chats/{other}/read", json={"message_id": ids[1]}, headers=student.headers)
+    assert response.status_code == 404
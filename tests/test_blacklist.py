@@ -0,0 +1,61 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func, select
+from accounts.blacklist import TokenBlacklist
+from accounts.models import BlackListTokens
+from server.settings import AsyncSessionLocal
+
+
+def utc_in(**delta):
+    return (datetime.now(timezone.utc) + timedelta(**delta)).replace(tzinfo=None)
+
+
+def run(client, scenario):
+    async def with_session():
+        async with AsyncSessionLocal() as db:
+            return await scenario(db)
+    return client.portal.call(with_session)
+
+
+async def add(db, expires_at, row_id=None):
+    key = uuid.uuid4().hex
+    db.add(BlackListTokens(id=row_id, jti=key, expires_at=expires_at))
+    await db.commit()
+    return key
+
+
+def test_sync_picks_up_other_workers_and_late_commits(client):
+    blacklist = TokenBlacklist()
+
+    async def scenario(db):
+        await blacklist.sync(db)
+        assert blacklist.loaded
+        newest = (await db.execute(select(func.max(BlackListTokens.id)))).scalar() or 0
+        # another worker revoked a token
+        other = await add(db, utc_in(hours=1), row_id=newest + 20)
+        await blacklist.sync(db)
+        assert other in blacklist.bloom and blacklist.last_id == newest + 20
+        # a row with a lower id that committed after it (postgres sequences)
+        late = await add(db, utc_in(hours=1), row_id=newest + 10)
+        await blacklist.sync(db)
+        assert late in blacklist.bloom and blacklist.last_id == newest + 20
+        return await blacklist.is_revoked("unused", {"jti": late}, db)
+
+    assert run(client, scenario) is True
+
+
+def test_purge_drops_expired_rows_and_rebuilds_the_filter(client):
+    blacklist = TokenBlacklist()
+
+    async def scenario(db):
+        expired = await add(db, utc_in(minutes=-1))
+        live = await add(db, utc_in(hours=1))
+        await blacklist.sync(db)
+        assert expired in blacklist.bloom
+        await blacklist.purge(db)
+        rows = set((await db.execute(select(BlackListTokens.jti).where(BlackListTokens.jti.in_([expired, live])))).scalars())
+        return rows, expired in blacklist.bloom, live in blacklist.bloom
+
+    rows, expired_in_bloom, live_in_bloom = run(client, scenario)
+    assert len(rows) == 1 and not expired_in_bloom and live_in_bloom
+
@@ -0,0 +1,77 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from smartedu.availability import reserve_slot
+from smartedu.models import Booking, ScheduleSlot
+from server.settings import SessionLocal
+
+
+def test_concurrent_bookings_of_one_slot(client, register, make_teacher, make_slot, db):
+    teacher, _ = make_teacher()
+    slot = make_slot(teacher, days=2)
+    students = [register("student") for _ in range(10)]
+
+    def book(i):
+        student = students[i % len(students)]
+        return client.post("/bookings", json={"slot_id": slot["id"]}, headers=student.headers).status_code
+
+    with ThreadPoolExecutor(max_workers=50) as pool:
+        statuses = Counter(pool.map(book, range(1000)))
+    assert statuses == {200: 1, 409: 999}
+    assert db.query(Booking).filter_by(slot_id=slot["id"]).count() == 1
+    assert db.get(ScheduleSlot, slot["id"]).status == "booked"
+
+
+def test_reserve_slot_is_a_single_winner_update(make_teacher, make_slot):
+    teacher, _ = make_teacher()
+    slot = make_slot(teacher, days=3)
+
+    def reserve(_):
+        session = SessionLocal()
+        try:
+            won = reserve_slot(session, slot["id"])
+            session.commit()
+            return won
+        finally:
+            session.close()
+
+    with ThreadPoolExecutor(max_workers=32) as pool:
+        results = Counter(pool.map(reserve, range(200)))
+    assert results == {True: 1, False: 199}
+
+
+def test_cancel_releases_the_slot(client, register, make_teacher, make_slot):
+    teacher, _ = make_teacher()
+    slot = make_slot(teacher, days=4)
+    first, second = register("student"), register("student")
+    booking = client.post("/bookings", json={"slot_id": slot["id"]}, headers=first.headers).json()
+    assert client.post("/bookings", json={"slot_id": slot["id"]}, headers=second.headers).status_code == 409
+    client.patch(f"/bookings/{booking['id']}/cancel", headers=first.headers)
+    assert client.post("/bookings", json={"slot_id": slot["id"]}, headers=second.headers).status_code == 200
+
+
+def test_slots_and_bookings_belong_to_the_teacher_profile(client, register, make_teacher, make_slot):
+    teacher, profile = make_teacher()
+    other, _ = make_teacher()
+    slot = make_slot(teacher, days=5)
+    assert slot["teacher_id"] == profile["id"]
+    assert [item["id"] for item in client.get("/schedule/slots/me", headers=teacher.headers).json()] == [slot["id"]]
+    assert client.get("/schedule/slots/me", headers=other.headers).json() == []
+    student = register("student")
+    booking = client.post("/bookings", json={"slot_id": slot["id"]}, headers=student.headers).json()
+    assert [item["id"] for item in client.get("/bookings/me", headers=teacher.headers).json()] == [booking["id"]]
+    assert [item["id"] for item in client.get("/bookings/me", headers=student.headers).json()] == [booking["id"]]
+
+
+def test_past_and_overlapping_slots(client, register, make_teacher, make_slot):
+    teacher, _ = make_teacher()
+    slot = make_slot(teacher, days=6)
+    start = datetime.fromisoformat(slot["start_time"]).replace(tzinfo=timezone.utc) + timedelta(minutes=30)
+    response = client.post(
+        "/schedule/slots",
+        json={"start_time": start.isoformat(), "end_time": (start + timedelta(hours=1)).isoformat()},
+        headers=teacher.headers,
+    )
+    assert response.status_code == 409
+    past = make_slot(teacher, days=-2)
+    assert client.post("/bookings", json={"slot_id": past["id"]}, headers=register("student").headers).status_code == 409
@@ -0,0 +1,111 @@
+import asyncio
+import time
+from chats.views import message_writer
+
+
+def test_inbox_pages_both_sides_by_activity(client, register):
+    user = register("inbox")
+    peers = [register("peer") for _ in range(5)]
+    chats = []
+    # alternate sides: the user is the student of some chats, the teacher of others
+    for i, peer in enumerate(peers):
+        student, teacher = (user, peer) if i % 2 == 0 else (peer, user)
+        chats.append(client.post("/chats", json={"teacher_id": teacher.id}, headers=student.headers).json()["id"])
+
+    async def talk():
+        # chats[3] and chats[4] stay empty; chats[0] is the most recent
+        for chat_id in (chats[2], chats[1], chats[0]):
+            await message_writer.write(chat_id=chat_id, sender_id=user.id, text="hi")
+
+    client.portal.call(talk)
+    expected = [chats[0], chats[1], chats[2], chats[4], chats[3]]
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2} | ({"cursor": cursor} if cursor else {})
+        page = client.get("/chats/inbox", params=params, headers=user.headers).json()
+        seen += [item["chat_id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == expected
+
+    first = client.get("/chats/inbox", headers=user.headers).json()["items"][0]
+    assert first["last_message"]["text"] == "hi"
+    assert first["peer_username"] == peers[0].username
+
+
+def test_inbox_unread_count(client, register):
+    student, teacher = register("student"), register("teacher")
+    chat_id = client.post("/chats", json={"teacher_id": teacher.id}, headers=student.headers).json()["id"]
+
+    async def talk():
+        for text in ("a", "b", "c"):
+            await message_writer.write(chat_id=chat_id, sender_id=student.id, text=text)
+
+    client.portal.call(talk)
+    [item] = client.get("/chats/inbox", headers=teacher.headers).json()["items"]
+    assert item["unread_count"] == 3
+    [item] = client.get("/chats/inbox", headers=student.headers).json()["items"]
+    assert item["unread_count"] == 0
+
+
+class Broadcasts:
+    def __init__(self):
+        self.frames = []
+
+    async def broadcast(self, chat_id, data):
+        self.frames.append(data)
+
+
+def test_read_receipts_are_coalesced(client):
+    from chats.receipts import ReceiptCoalescer
+    sent = Broadcasts()
+    coalescer = ReceiptCoalescer(sent, delay=0.05)
+
+    async def scroll():
+        for message_id in (3, 5, 4, 9):
+            coalescer.note(1, 10, message_id)
+        coalescer.note(1, 11, 2)
+        coalescer.note(2, 10, 7)
+        await asyncio.sleep(0.1)
+        # a later receipt starts a new window
+        coalescer.note(1, 10, 12)
+        await coalescer.close()
+
+    client.portal.call(scroll)
+    assert sent.frames == [
+        {"type": "read", "chat_id": 1, "user_id": 10, "message_id": 9},
+        {"type": "read", "chat_id": 1, "user_id": 11, "message_id": 2},
+        {"type": "read", "chat_id": 2, "user_id": 10, "message_id": 7},
+        {"type": "read", "chat_id": 1, "user_id": 10, "message_id": 12},
+    ]
+    assert (coalescer.received, coalescer.sent) == (7, 4)
+
+
+def test_marking_read_pushes_one_receipt(client, register, monkeypatch):
+    from chats.receipts import receipts
+    monkeypatch.setattr(receipts, "delay", 0.05)
+    student, teacher = register("student"), register("teacher")
+    chat_id = client.post("/chats", json={"teacher_id": teacher.id}, headers=student.headers).json()["id"]
+
+    async def talk():
+        return [(await message_writer.write(chat_id=chat_id, sender_id=student.id, text=t))[0] for t in "abc"]
+
+    ids = client.portal.call(talk)
+    with client.websocket_connect(f"/chats/ws/{chat_id}?token={student.token}") as ws:
+        for message_id in (ids[0], ids[2], ids[1]):
+            response = client.post(f"/chats/{chat_id}/read", json={"message_id": message_id}, headers=teacher.headers)
+            assert response.status_code == 200
+        # the frame after the window closes marks where to stop reading
+        time.sleep(0.15)
+        ws.send_json({"text": "after"})
+        frames = []
+        while not frames or frames[-1].get("text") != "after":
+            frame = ws.receive_json()
+            if frame.get("type") != "ping":
+                frames.append(frame)
+    assert frames[:-1] == [{"type": "read", "chat_id": chat_id, "user_id": teacher.id, "message_id": ids[2]}]
+    # everything up to ids[2] is read, "after" is not
+    [item] = client.get("/chats/inbox", headers=teacher.headers).json()["items"]
+    assert item["unread_count"] == 1
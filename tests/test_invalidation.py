@@ -0,0 +1,118 @@
+import asyncio
+from chats.pubsub import SQLitePubSub
+from server.invalidation import Invalidator
+
+
+def test_publish_reaches_other_workers(tmp_path):
+    path = str(tmp_path / "pubsub.db")
+
+    async def scenario():
+        # two workers sharing one broker file
+        first = Invalidator(SQLitePubSub(path, poll_interval=0.01))
+        second = Invalidator(SQLitePubSub(path, poll_interval=0.01))
+        seen = {"first": [], "second": []}
+        first.register("user_access", seen["first"].append)
+        second.register("user_access", seen["second"].append)
+        await first.start()
+        await second.start()
+        try:
+            first.publish("user_access", 7)
+            first.publish("user_access", None)
+            for _ in range(100):
+                if len(seen["second"]) == 2:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await first.close()
+            await second.close()
+        return seen
+
+    seen = asyncio.run(scenario())
+    # applied once locally, once remotely; the publisher skips its own echo
+    assert seen == {"first": [7, None], "second": [7, None]}
+
+
+def test_revoked_role_drops_cached_access(client, register, make_admin):
+    from accounts.permissions import permission_cache
+    account = make_admin(register("staff"))
+    assert client.get("/cache/stats", headers=account.headers).status_code == 200
+    assert permission_cache.get(account.id).is_staff
+    role = client.post("/auth/add-role", json={"name": f"role-{account.id}"}).json()
+    client.post("/auth/add-role-to-user", json={"user_id": account.id, "roles": [role["id"]]})
+    assert permission_cache.get(account.id) is None
+
+
+def test_content_bump_reaches_other_workers(tmp_path):
+    from server.cache import VersionedCache
+    path = str(tmp_path / "pubsub.db")
+
+    async def scenario():
+        first = Invalidator(SQLitePubSub(path, poll_interval=0.01))
+        second = Invalidator(SQLitePubSub(path, poll_interval=0.01))
+        caches = VersionedCache(), VersionedCache()
+        first.register("content", caches[0].bump)
+        second.register("content", caches[1].bump)
+        await first.start()
+        await second.start()
+        try:
+            first.publish("content", "quiz")
+            for _ in range(100):
+                if caches[1].version("quiz"):
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await first.close()
+            await second.close()
+        return [cache.version("quiz") for cache in caches]
+
+    assert asyncio.run(scenario()) == [1, 1]
+
+
+def test_new_subject_is_listed(client):
+    from smartedu.content import content_cache
+    names = [subject["name"] for subject in client.get("/subjects").json()]
+    version = content_cache.version("subjects")
+    client.post("/subjects", json={"name": f"subject-{len(names)}-{version}"})
+    assert content_cache.version("subjects") == version + 1
+    assert f"subject-{len(names)}-{version}" in [subject["name"] for subject in client.get("/subjects").json()]
+
+
+def test_full_lesson_etag(client, make_teacher):
+    teacher, _ = make_teacher()
+    subject = client.post("/subjects", json={"name": f"etag-{teacher.id}"}).json()
+    lesson = client.post("/lessons", json={"subject_id": subject["id"], "title": "etag"}, headers=teacher.headers).json()
+    url = f"/lessons/{lesson['id']}/full"
+    first = client.get(url)
+    etag = first.headers["ETag"]
+    assert first.status_code == 200 and first.json()["questions"] == []
+
+    for header in (etag, "W/" + etag, f'"other", {etag}', "*"):
+        response = client.get(url, headers={"If-None-Match": header})
+        assert response.status_code == 304 and response.headers["ETag"] == etag and response.content == b""
+    assert client.get(url, headers={"If-None-Match": '"other"'}).status_code == 200
+    assert client.get("/lessons/999999999/full", headers={"If-None-Match": "*"}).status_code == 404
+
+
+def test_new_question_and_answer_refresh_the_full_lesson(client, make_teacher):
+    from smartedu.content import content_cache
+    teacher, _ = make_teacher()
+    subject = client.post("/subjects", json={"name": f"quiz-{teacher.id}"}).json()
+    lesson = client.post("/lessons", json={"subject_id": subject["id"], "title": "quiz"}, headers=teacher.headers).json()
+    url = f"/lessons/{lesson['id']}/full"
+    etag = client.get(url).headers["ETag"]
+
+    version = content_cache.version("quiz")
+    question = client.post("/questions", json={"lesson_id": lesson["id"], "text": "q"}, headers=teacher.headers).json()
+    assert content_cache.version("quiz") == version + 1
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["ETag"] != etag
+    assert [item["id"] for item in response.json()["questions"]] == [question["id"]]
+    etag = response.headers["ETag"]
+
+    answer = client.post("/answers", json={"question_id": question["id"], "text": "a", "is_correct": True}, headers=teacher.headers).json()
+    assert content_cache.version("quiz") == version + 2
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 200 and response.headers["ETag"] != etag
+    # students see the answers, not which one is right
+    assert response.json()["questions"][0]["answers"] == [{"id": answer["id"], "text": "a"}]
+    assert client.get(f"/answers/question/{question['id']}").json() == [{"id": answer["id"], "text": "a"}]
@@ -0,0 +1,94 @@
+import asyncio
+import pytest
+from chats.models import Chat, Message
+from chats.views import message_writer
+from chats.writer import BatchWriter
+
+
+@pytest.fixture
+def chat(client, register):
+    student, teacher = register("student"), register("teacher")
+    chat = client.post("/chats", json={"teacher_id": teacher.id}, headers=student.headers).json()
+    return chat["id"], student, teacher
+
+
+def test_concurrent_writes_are_batched(client, db, chat):
+    chat_id, student, _ = chat
+    batches_before = message_writer.batches
+
+    async def write_all():
+        return await asyncio.gather(*(
+            message_writer.write(chat_id=chat_id, sender_id=student.id, text=f"m{i}") for i in range(300)
+        ))
+
+    rows = client.portal.call(write_all)
+    ids = [message_id for message_id, _ in rows]
+    assert len(set(ids)) == 300
+    # each caller gets the id of its own row
+    stored = dict(db.query(Message.id, Message.text).filter(Message.chat_id == chat_id))
+    assert [stored[message_id] for message_id in ids] == [f"m{i}" for i in range(300)]
+    assert message_writer.batches - batches_before < 300
+    assert db.get(Chat, chat_id).last_message_id == max(ids)
+
+
+def test_failed_batch_reaches_every_writer(client, chat):
+    chat_id, student, _ = chat
+    writer = BatchWriter(Message, max_delay=0.05)
+
+    async def write_bad():
+        try:
+            return await asyncio.gather(
+                writer.write(chat_id=chat_id, sender_id=student.id, text=None),
+                writer.write(chat_id=chat_id, sender_id=student.id, text="fine"),
+                return_exceptions=True,
+            )
+        finally:
+            await writer.close()
+
+    results = client.portal.call(write_bad)
+    assert all(isinstance(result, Exception) for result in results)
+
+
+def test_websocket_message_is_persisted(client, chat):
+    chat_id, student, _ = chat
+    with client.websocket_connect(f"/chats/ws/{chat_id}?token={student.token}") as ws:
+        ws.send_json({"text": "hello", "client_id": "c1"})
+        frame = ws.receive_json()
+    assert frame["text"] == "hello" and frame["client_id"] == "c1"
+    history = client.get(f"/chats/{chat_id}/messages", headers=student.headers).json()
+    assert history[-1]["id"] == frame["id"]
+
+
+def test_close_finishes_the_batch_being_written(client, chat):
+    chat_id, student, _ = chat
+    flushing = asyncio.Event()
+
+    async def slow_flush(db, values, rows):
+        flushing.set()
+        await asyncio.sleep(0.1)
+
+    writer = BatchWriter(Message, max_delay=0.01, on_flush=slow_flush)
+
+    async def close_mid_flush():
+        writes = [asyncio.ensure_future(writer.write(chat_id=chat_id, sender_id=student.id, text=f"w{i}")) for i in range(3)]
+        await flushing.wait()
+        await writer.close()
+        return await asyncio.wait_for(asyncio.gather(*writes), 1)
+
+    rows = client.portal.call(close_mid_flush)
+    assert len({message_id for message_id, _ in rows}) == 3
+
+
+def test_close_writes_a_batch_still_being_collected(client, chat):
+    chat_id, student, _ = chat
+    writer = BatchWriter(Message, max_delay=60)
+
+    async def close_mid_collect():
+        write = asyncio.ensure_future(writer.write(chat_id=chat_id, sender_id=student.id, text="late"))
+        while writer._batch is None or not writer._batch:
+            await asyncio.sleep(0.01)
+        await writer.close()
+        return await asyncio.wait_for(write, 1)
+
+    message_id, _ = client.portal.call(close_mid_collect)
+    assert message_id
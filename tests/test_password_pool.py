@@ -0,0 +1,59 @@
+import asyncio
+import threading
+import pytest
+from fastapi import HTTPException
+from accounts.security import PasswordHashPool
+
+
+def test_cancelled_waiters_do_not_leak_queue_slots():
+    pool = PasswordHashPool(workers=1, max_queue=2)
+    release = threading.Event()
+
+    async def scenario():
+        blocker = asyncio.create_task(pool.run(release.wait))
+        await asyncio.sleep(0.05)
+        # queued behind the blocker, then abandoned by their clients
+        for _ in range(10):
+            waiter = asyncio.create_task(pool.run(lambda: "late"))
+            await asyncio.sleep(0)
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+        assert pool.waiting == 0
+        release.set()
+        await blocker
+        return await pool.run(lambda: "ok")
+
+    assert asyncio.run(scenario()) == "ok"
+    assert pool.stats()["running"] == 0
+    assert pool.stats()["waiting"] == 0
+
+
+def test_full_queue_is_rejected_and_workers_are_bounded():
+    pool = PasswordHashPool(workers=2, max_queue=3)
+    release = threading.Event()
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def work():
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        release.wait()
+        with lock:
+            active[0] -= 1
+
+    async def scenario():
+        tasks = [asyncio.create_task(pool.run(work)) for _ in range(5)]
+        await asyncio.sleep(0.05)
+        assert pool.running == 2 and pool.waiting == 3
+        with pytest.raises(HTTPException) as error:
+            await pool.run(work)
+        assert error.value.status_code == 503
+        release.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert peak[0] == 2
+    assert pool.stats()["completed"] == 5
+    assert pool.stats()["rejected"] == 1
@@ -0,0 +1,74 @@
+import copy
+import re
+import pytest
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from server import profiling
+from server.settings import async_engine, engine, get_db
+
+
+@pytest.fixture
+def profiled(app, monkeypatch):
+    """A small app with the profiler installed; the engine hooks are removed afterwards."""
+    monkeypatch.setattr(profiling, "slow_requests", profiling.SlowRequestLog())
+    probe = FastAPI()
+    seen = {}
+
+    @probe.get("/probe")
+    def run_probe(repeat: int = 1, fail: bool = False, db: Session = Depends(get_db)):
+        connection = db.connection()
+        seen["info"] = copy.deepcopy(connection.info)
+        if fail:
+            with pytest.raises(OperationalError):
+                db.execute(text("SELECT * FROM no_such_table"))
+            db.rollback()
+            connection = db.connection()
+        for _ in range(repeat):
+            db.execute(text("SELECT 1")).scalar()
+        seen["info_after"] = copy.deepcopy(connection.info)
+        return {"ok": True}
+
+    profiling.install_profiler(probe)
+    try:
+        yield TestClient(probe), seen
+    finally:
+        for target in (engine, async_engine.sync_engine):
+            event.remove(target, "before_cursor_execute", profiling._before_execute)
+            event.remove(target, "after_cursor_execute", profiling._after_execute)
+
+
+def test_server_timing_header_counts_queries(profiled):
+    probe, _ = profiled
+    response = probe.get("/probe", params={"repeat": 3})
+    timing = response.headers["Server-Timing"]
+    assert re.match(r'db;dur=[\d.]+;desc="3 queries", total;dur=[\d.]+$', timing), timing
+
+
+def test_failing_statement_leaves_the_connection_clean(profiled):
+    probe, seen = profiled
+    response = probe.get("/probe", params={"fail": True})
+    assert response.status_code == 200
+    assert seen["info_after"] == seen["info"]
+    assert 'desc="1 queries"' in response.headers["Server-Timing"]
+
+
+def test_slow_requests_report(profiled, register, make_admin, monkeypatch):
+    probe, _ = profiled
+    monkeypatch.setattr(profiling, "PROFILE_REPEAT_THRESHOLD", 5)
+    monkeypatch.setattr(profiling, "PROFILE_SLOW_MS", 10_000)
+    probe.get("/probe", params={"repeat": 1})
+    probe.get("/probe", params={"repeat": 6})
+
+    user = register("profiler")
+    assert probe.get("/debug/slow-requests", headers=user.headers).status_code == 403
+    report = probe.get("/debug/slow-requests", headers=make_admin(user).headers).json()
+
+    route = next(item for item in report["top_routes"] if item["route"] == "/probe")
+    assert route["requests"] == 2 and route["max_statements"] == 6 and route["n_plus_one"] == 1
+    # only the N+1 request is kept as an entry
+    [entry] = [item for item in report["slowest"] if item["route"] == "/probe"]
+    assert entry["statements"] == 6
+    assert entry["repeated"] == [{"sql": "SELECT 1", "count": 6}]
@@ -0,0 +1,178 @@
+"""EXPLAIN QUERY PLAN guards for the queries the endpoints actually run.
+
+Each case calls an endpoint through the client while a `before_cursor_execute`
+hook records every SELECT it sends, on the sync and the async engine. Each
+recorded statement is then explained with its own parameters: no step may
+read a table without an index (`SCAN <table>`) or sort in a temp b-tree.
+"""
+import re
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+import pytest
+from sqlalchemy import event
+from server.settings import async_engine, engine
+
+
+class World(NamedTuple):
+    student: dict
+    teacher: dict
+    profile: dict
+    subject: dict
+    slot: dict
+    booking: dict
+    chat: int
+    message: int
+    group: int
+    lesson: dict
+    question: dict
+    answer: dict
+    cursor: str
+
+
+@contextmanager
+def endpoint_sql():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, tuple(parameters)))
+
+    targets = (engine, async_engine.sync_engine)
+    for target in targets:
+        event.listen(target, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        for target in targets:
+            event.remove(target, "before_cursor_execute", record)
+
+
+def query_plan(db, statement, parameters=()):
+    rows = db.connection().exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+    return [row[-1] for row in rows]
+
+
+FULL_SCAN = re.compile(r"^SCAN \w+$")
+
+
+def plan_problems(plan):
+    return [step for step in plan if FULL_SCAN.match(step) or "TEMP B-TREE" in step]
+
+
+def login(client, prefix):
+    username = f"{prefix}-{uuid.uuid4().hex[:10]}"
+    client.post("/auth/register", json={"username": username, "password": "secret"})
+    token = client.post("/auth/login", json={"username": username, "password": "secret"}).json()["access_tocken"]
+    headers = {"Authorization": "Bearer " + token}
+    return headers, client.get("/auth/me", headers=headers).json()["id"]
+
+
+@pytest.fixture(scope="module")
+def world(client):
+    from chats.views import group_message_writer, message_writer
+    student, student_id = login(client, "student")
+    teacher, teacher_id = login(client, "teacher")
+    profile = client.post("/teachers/profile", json={"description": "plans", "price_per_lesson": 50}, headers=teacher).json()
+    other, _ = login(client, "teacher")
+    client.post("/teachers/profile", json={"description": "plans", "price_per_lesson": 60}, headers=other)
+    subject = client.post("/subjects", json={"name": f"plans-{uuid.uuid4().hex[:6]}"}).json()
+    for headers in (teacher, other):
+        client.post("/teachers/subjects", json={"subject_id": subject["id"]}, headers=headers)
+    start = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0) + timedelta(days=20)
+    slot = client.post(
+        "/schedule/slots",
+        json={"start_time": start.isoformat(), "end_time": (start + timedelta(hours=1)).isoformat()},
+        headers=teacher,
+    ).json()
+    booking = client.post("/bookings", json={"slot_id": slot["id"]}, headers=student).json()
+    chat = client.post("/chats", json={"teacher_id": teacher_id}, headers=student).json()["id"]
+    group = client.post("/groups", json={"name": "plans"}, headers=student).json()["id"]
+
+    async def talk():
+        ids = [(await message_writer.write(chat_id=chat, sender_id=student_id, text=f"m{i}"))[0] for i in range(3)]
+        await group_message_writer.write(group_id=group, sender_id=student_id, text="g")
+        return ids[-1]
+
+    message = client.portal.call(talk)
+    lesson = client.post("/lessons", json={"subject_id": subject["id"], "title": "plans"}, headers=teacher).json()
+    question = client.post("/questions", json={"lesson_id": lesson["id"], "text": "q"}, headers=teacher).json()
+    answer = client.post("/answers", json={"question_id": question["id"], "text": "a", "is_correct": True}, headers=teacher).json()
+    cursor = client.get("/teachers", params={"subject": subject["id"], "limit": 1}).json()["next_cursor"]
+    return World(student, teacher, profile, subject, slot, booking, chat, message, group, lesson, question, answer, cursor)
+
+
+FAR = {"start": "2020-01-01T00:00:00Z", "end": "2100-01-01T00:00:00Z"}
+
+ENDPOINTS = {
+    "auth me": lambda c, w: c.get("/auth/me", headers=w.student),
+    "catalog": lambda c, w: c.get("/teachers"),
+    "catalog by rating": lambda c, w: c.get("/teachers", params={"rating": 0}),
+    "catalog by subject": lambda c, w: c.get("/teachers", params={"subject": w.subject["id"], "limit": 1}),
+    "catalog cursor": lambda c, w: c.get("/teachers", params={"cursor": w.cursor, "limit": 1}),
+    "catalog by subject, cursor": lambda c, w: c.get("/teachers", params={"subject": w.subject["id"], "cursor": w.cursor, "limit": 1}),
+    "catalog by price, cursor": lambda c, w: c.get("/teachers", params={"min_price": 10, "cursor": w.cursor, "limit": 1}),
+    "teacher": lambda c, w: c.get(f"/teachers/{w.profile['id']}"),
+    "teacher profile": lambda c, w: c.get("/teachers/profile/me", headers=w.teacher),
+    "teacher slots": lambda c, w: c.get(f"/teachers/slots/{w.profile['id']}"),
+    "my slots": lambda c, w: c.get("/schedule/slots/me", headers=w.teacher),
+    "free slots of a teacher": lambda c, w: c.get("/schedule/available", params={**FAR, "teacher_id": w.profile["id"]}),
+    "free slots by subject": lambda c, w: c.get("/schedule/available", params={**FAR, "subject_id": w.subject["id"]}),
+    "my rules": lambda c, w: c.get("/schedule/rules/me", headers=w.teacher),
+    "my bookings (student)": lambda c, w: c.get("/bookings/me", headers=w.student),
+    "my bookings (teacher)": lambda c, w: c.get("/bookings/me", headers=w.teacher),
+    "booking": lambda c, w: c.get(f"/bookings/{w.booking['id']}", headers=w.student),
+    "teacher reviews": lambda c, w: c.get(f"/reviews/teacher/{w.profile['id']}"),
+    "child bookings": lambda c, w: c.get(f"/parents/children/{w.booking['student_id']}/bookings", headers=w.student),
+    "lesson": lambda c, w: c.get(f"/lessons/{w.lesson['id']}"),
+    "lesson full": lambda c, w: c.get(f"/lessons/{w.lesson['id']}/full"),
+    "subject lessons": lambda c, w: c.get(f"/lessons/subject/{w.subject['id']}"),
+    "lesson questions": lambda c, w: c.get(f"/questions/lesson/{w.lesson['id']}"),
+    "question answers": lambda c, w: c.get(f"/answers/question/{w.question['id']}"),
+    "submit quiz (answer key)": lambda c, w: c.post(
+        f"/lessons/{w.lesson['id']}/submit",
+        json={"answers": [{"question_id": w.question["id"], "answer_ids": [w.answer["id"]]}]},
+        headers=w.student,
+    ),
+    "my attempts": lambda c, w: c.get(f"/lessons/{w.lesson['id']}/attempts/me", headers=w.student),
+    "lesson stats": lambda c, w: c.get(f"/lessons/{w.lesson['id']}/stats"),
+    "chats (unread counts)": lambda c, w: c.get("/chats", headers=w.student),
+    "inbox": lambda c, w: c.get("/chats/inbox", headers=w.student),
+    "inbox cursor": lambda c, w: c.get("/chats/inbox", params={"cursor": f"{w.message}:{w.chat + 1}"}, headers=w.teacher),
+    "chat history": lambda c, w: c.get(f"/chats/{w.chat}/messages", headers=w.student),
+    "chat history before": lambda c, w: c.get(f"/chats/{w.chat}/messages", params={"before": w.message}, headers=w.student),
+    "chat history after": lambda c, w: c.get(f"/chats/{w.chat}/messages", params={"after": 0}, headers=w.student),
+    "chat export": lambda c, w: c.get(f"/chats/{w.chat}/messages/export", headers=w.student),
+    "mark read": lambda c, w: c.post(f"/chats/{w.chat}/read", json={"message_id": w.message}, headers=w.teacher),
+    "my groups": lambda c, w: c.get("/groups", headers=w.student),
+    "group history": lambda c, w: c.get(f"/groups/{w.group}/messages", headers=w.student),
+    "group export": lambda c, w: c.get(f"/groups/{w.group}/messages/export", headers=w.student),
+}
+
+
+@pytest.mark.parametrize("name", list(ENDPOINTS))
+def test_endpoint_queries_use_indexes(client, db, world, name):
+    from smartedu.content import content_cache
+    # cached endpoints only reach the database on a miss
+    content_cache.local.clear()
+    with endpoint_sql() as statements:
+        response = ENDPOINTS[name](client, world)
+    assert response.status_code == 200, response.text
+    assert statements
+    for statement, parameters in statements:
+        plan = query_plan(db, statement, parameters)
+        assert not plan_problems(plan), (statement, plan)
+
+
+def test_guard_catches_a_sort_and_a_scan(db):
+    # the old subject-filtered catalog: a join, sorted in a temp b-tree
+    plan = query_plan(
+        db,
+        "SELECT teacher_profiles.id FROM teacher_profiles JOIN teacher_subjects "
+        "ON teacher_subjects.teacher_id = teacher_profiles.id WHERE teacher_subjects.subject_id = ? "
+        "ORDER BY teacher_profiles.rating DESC, teacher_profiles.price_per_lesson, teacher_profiles.id LIMIT 10",
+        (1,),
+    )
+    assert any("TEMP B-TREE" in step for step in plan_problems(plan))
+    assert plan_problems(query_plan(db, "SELECT id FROM reviews WHERE comment = ?", ("x",))) == ["SCAN reviews"]
@@ -0,0 +1,112 @@
+import uuid
+from typing import NamedTuple
+import pytest
+from smartedu.grading import KeyEntry, answer_key, grade
+
+
+class Quiz(NamedTuple):
+    lesson: int
+    single: int
+    multiple: int
+    answers: dict
+
+
+@pytest.fixture
+def quiz(client, make_teacher):
+    """A lesson with a single-choice question (s1 right, s2 wrong) and a multi-choice one (m1, m2 right, m3 wrong)."""
+    teacher, _ = make_teacher()
+    subject = client.post("/subjects", json={"name": f"quiz-{uuid.uuid4().hex[:6]}"}).json()
+    lesson = client.post("/lessons", json={"subject_id": subject["id"], "title": "quiz"}, headers=teacher.headers).json()["id"]
+    answers = {}
+
+    def question(kind, options):
+        question_id = client.post("/questions", json={"lesson_id": lesson, "text": kind, "type": kind}, headers=teacher.headers).json()["id"]
+        for name, is_correct in options.items():
+            answers[name] = client.post(
+                "/answers", json={"question_id": question_id, "text": name, "is_correct": is_correct}, headers=teacher.headers
+            ).json()["id"]
+        return question_id
+
+    single = question("single", {"s1": True, "s2": False})
+    multiple = question("multiple", {"m1": True, "m2": True, "m3": False})
+    return Quiz(lesson, single, multiple, answers)
+
+
+def submit(client, headers, quiz, picks):
+    return client.post(
+        f"/lessons/{quiz.lesson}/submit",
+        json={"answers": [{"question_id": question_id, "answer_ids": answer_ids} for question_id, answer_ids in picks.items()]},
+        headers=headers,
+    )
+
+
+def test_grade():
+    key = {
+        1: KeyEntry(False, frozenset({10}), frozenset({10, 11})),
+        2: KeyEntry(True, frozenset({20, 21}), frozenset({20, 21, 22})),
+        3: KeyEntry(False, frozenset(), frozenset()),
+    }
+    assert grade(key, {1: {10}, 2: {20, 21}}) == (2, {1: True, 2: True, 3: False})
+    # several picks on a single-choice question, even including the right one
+    assert grade(key, {1: {10, 11}})[1][1] is False
+    # a multi-choice answer must be the exact set
+    assert grade(key, {2: {20}})[1][2] is False
+    assert grade(key, {2: {20, 21, 22}})[1][2] is False
+    # a question without a correct answer can't be scored
+    assert grade(key, {3: set()})[1][3] is False
+
+
+def test_submit_scores_each_question(client, register, quiz):
+    student = register("student")
+    a = quiz.answers
+    full = submit(client, student.headers, quiz, {quiz.single: [a["s1"]], quiz.multiple: [a["m1"], a["m2"]]}).json()
+    assert (full["score"], full["max_score"]) == (2, 2)
+
+    partial = submit(client, student.headers, quiz, {quiz.single: [a["s1"], a["s2"]], quiz.multiple: [a["m1"]]}).json()
+    assert partial["score"] == 0
+    assert {item["question_id"]: item["correct"] for item in partial["results"]} == {quiz.single: False, quiz.multiple: False}
+
+    unanswered = submit(client, student.headers, quiz, {quiz.single: [a["s1"]]}).json()
+    assert unanswered["score"] == 1
+
+    attempts = client.get(f"/lessons/{quiz.lesson}/attempts/me", headers=student.headers).json()
+    assert [attempt["id"] for attempt in attempts] == [unanswered["attempt_id"], partial["attempt_id"], full["attempt_id"]]
+
+
+def test_submit_rejects_foreign_ids(client, register, quiz):
+    student = register("student")
+    a = quiz.answers
+    assert submit(client, student.headers, quiz, {quiz.single + quiz.multiple + 1000: [a["s1"]]}).status_code == 400
+    # an answer that exists, but belongs to the other question
+    assert submit(client, student.headers, quiz, {quiz.single: [a["m1"]]}).status_code == 400
+    assert submit(client, student.headers, quiz, {quiz.multiple: [a["m1"], 10**9]}).status_code == 400
+    assert client.get(f"/lessons/{quiz.lesson}/attempts/me", headers=student.headers).json() == []
+
+
+def test_new_answer_bumps_the_key(client, db, make_teacher, quiz):
+    from smartedu.content import content_cache
+    teacher, _ = make_teacher()
+    before = answer_key(db, quiz.lesson)
+    version = content_cache.version("quiz")
+    extra = client.post(
+        "/answers", json={"question_id": quiz.single, "text": "s3", "is_correct": False}, headers=teacher.headers
+    ).json()["id"]
+    assert content_cache.version("quiz") == version + 1
+    after = answer_key(db, quiz.lesson)
+    assert extra not in before[quiz.single].options and extra in after[quiz.single].options
+
+
+def test_stats_average_the_attempts(client, register, quiz):
+    a = quiz.answers
+    assert client.get(f"/lessons/{quiz.lesson}/stats").json() == {"lesson_id": quiz.lesson, "attempts": 0, "average_score": None}
+    scores = []
+    for picks in (
+        {quiz.single: [a["s1"]], quiz.multiple: [a["m1"], a["m2"]]},
+        {quiz.single: [a["s1"]]},
+        {quiz.single: [a["s2"]]},
+    ):
+        scores.append(submit(client, register("student").headers, quiz, picks).json()["score"])
+    stats = client.get(f"/lessons/{quiz.lesson}/stats").json()
+    assert scores == [2, 1, 0]
+    assert stats["attempts"] == 3
+    assert stats["average_score"] == pytest.approx(sum(scores) / (2 * 3))
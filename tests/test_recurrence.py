@@ -0,0 +1,147 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta, timezone
+import pytest
+from server.settings import SessionLocal
+from smartedu import recurrence
+from smartedu.models import AvailabilityRule, ScheduleSlot
+from smartedu.recurrence import extend_all, materialize_rule, occurrences
+
+
+def utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def new_york(day):
+    return AvailabilityRule(
+        weekday_mask=1 << day.weekday(), start_time=time(0, 0), end_time=time(4, 0), slot_minutes=60,
+        timezone="America/New_York",
+    )
+
+
+def test_spring_forward_skips_the_missing_hour():
+    day = date(2027, 3, 14)
+    assert list(occurrences(new_york(day), day, day)) == [
+        (utc(2027, 3, 14, 5), utc(2027, 3, 14, 6)),
+        (utc(2027, 3, 14, 6), utc(2027, 3, 14, 7)),
+        # 02:00 does not exist; 03:00 EDT is 07:00Z
+        (utc(2027, 3, 14, 7), utc(2027, 3, 14, 8)),
+    ]
+
+
+def test_fall_back_takes_the_first_repeated_hour():
+    day = date(2026, 11, 1)
+    assert list(occurrences(new_york(day), day, day)) == [
+        (utc(2026, 11, 1, 4), utc(2026, 11, 1, 5)),
+        # 01:00 EDT; the repeated 01:00 EST hour gets no slot
+        (utc(2026, 11, 1, 5), utc(2026, 11, 1, 6)),
+        (utc(2026, 11, 1, 7), utc(2026, 11, 1, 8)),
+        (utc(2026, 11, 1, 8), utc(2026, 11, 1, 9)),
+    ]
+
+
+def test_slots_never_overlap_across_a_gap():
+    day = date(2027, 3, 14)
+    rule = new_york(day)
+    rule.slot_minutes = 90
+    slots = list(occurrences(rule, day, day))
+    assert all(end - start == timedelta(minutes=90) for start, end in slots)
+    assert all(slots[i][1] <= slots[i + 1][0] for i in range(len(slots) - 1))
+
+
+@pytest.fixture
+def rule(client, make_teacher, monkeypatch):
+    monkeypatch.setattr(recurrence, "AVAILABILITY_HORIZON_WEEKS", 1)
+    teacher, profile = make_teacher()
+    response = client.post(
+        "/schedule/rules",
+        json={
+            "weekdays": list(range(7)), "start_time": "10:00", "end_time": "12:00", "slot_minutes": 60,
+            "valid_from": (date.today() + timedelta(days=1)).isoformat(),
+        },
+        headers=teacher.headers,
+    )
+    assert response.status_code == 200, response.text
+    return teacher, response.json()
+
+
+def rule_slots(db, rule_id):
+    db.expire_all()
+    return db.query(ScheduleSlot).filter_by(rule_id=rule_id).order_by(ScheduleSlot.start_time).all()
+
+
+def test_rule_expands_to_the_horizon(client, db, rule):
+    teacher, created = rule
+    assert created["slots_created"] == 14
+    assert created["rule"]["materialized_until"] == (date.today() + timedelta(weeks=1)).isoformat()
+    slots = rule_slots(db, created["rule"]["id"])
+    assert len(slots) == 14
+    assert {slot.start_time.hour for slot in slots} == {10, 11}
+
+
+def test_reexpansion_is_a_no_op(db, rule):
+    _, created = rule
+    stored = db.get(AvailabilityRule, created["rule"]["id"])
+    assert materialize_rule(db, stored) == 0
+    # even with the watermark cleared the existing slots are not repeated
+    stored.materialized_until = None
+    assert materialize_rule(db, stored) == 0
+    db.commit()
+    assert len(rule_slots(db, stored.id)) == 14
+
+
+def test_concurrent_expansions_do_not_double_slots(db, rule):
+    _, created = rule
+    rule_id = created["rule"]["id"]
+    db.query(ScheduleSlot).filter_by(rule_id=rule_id).delete()
+    db.query(AvailabilityRule).filter_by(id=rule_id).update({"materialized_until": None})
+    db.commit()
+
+    def expand(_):
+        session = SessionLocal()
+        try:
+            created = materialize_rule(session, session.get(AvailabilityRule, rule_id))
+            session.commit()
+            return created
+        finally:
+            session.close()
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        counts = list(pool.map(expand, range(4)))
+    assert sum(counts) == 14
+    assert len(rule_slots(db, rule_id)) == 14
+
+
+def test_manual_slot_at_a_rule_start_is_refused(client, db, rule):
+    teacher, created = rule
+    slot = rule_slots(db, created["rule"]["id"])[0]
+    response = client.post(
+        "/schedule/slots",
+        json={"start_time": slot.start_time.isoformat(), "end_time": slot.end_time.isoformat()},
+        headers=teacher.headers,
+    )
+    assert response.status_code == 409
+
+
+def test_horizon_top_up(db, rule, monkeypatch):
+    _, created = rule
+    monkeypatch.setattr(recurrence, "AVAILABILITY_HORIZON_WEEKS", 2)
+    extend_all(db)
+    slots = rule_slots(db, created["rule"]["id"])
+    assert len(slots) == 28
+    assert len({slot.start_time for slot in slots}) == 28
+    assert db.get(AvailabilityRule, created["rule"]["id"]).materialized_until == date.today() + timedelta(weeks=2)
+
+
+def test_deleting_a_rule_keeps_booked_slots(client, db, register, rule):
+    teacher, created = rule
+    rule_id = created["rule"]["id"]
+    booked = rule_slots(db, rule_id)[0]
+    student = register("student")
+    assert client.post("/bookings", json={"slot_id": booked.id}, headers=student.headers).status_code == 200
+
+    response = client.delete(f"/schedule/rules/{rule_id}", headers=teacher.headers)
+    assert response.json() == {"status": "deleted", "slots_removed": 13}
+    db.expire_all()
+    assert db.query(ScheduleSlot).filter_by(rule_id=rule_id).count() == 0
+    assert db.get(ScheduleSlot, booked.id).status == "booked"
+    assert client.delete(f"/schedule/rules/{rule_id}", headers=teacher.headers).status_code == 404
@@ -0,0 +1,85 @@
+import pytest
+
+
+@pytest.fixture
+def booking(client, register, make_teacher, make_slot):
+    teacher, profile = make_teacher()
+    student = register("student")
+    slot = make_slot(teacher)
+    booking = client.post("/bookings", json={"slot_id": slot["id"]}, headers=student.headers).json()
+    return booking, student, profile
+
+
+def review(client, account, booking_id, rating=5, **extra):
+    return client.post("/reviews", json={"booking_id": booking_id, "rating": rating, **extra}, headers=account.headers)
+
+
+def test_review_updates_teacher_rating(client, booking):
+    booking, student, profile = booking
+    response = review(client, student, booking["id"], rating=4, comment="good")
+    assert response.status_code == 200, response.text
+    teacher = client.get(f"/teachers/{profile['id']}").json()
+    assert (teacher["rating_count"], teacher["rating"]) == (1, 4.0)
+
+
+def test_review_without_comment(client, booking):
+    booking, student, _ = booking
+    response = review(client, student, booking["id"])
+    assert response.status_code == 200, response.text
+    assert response.json()["comment"] is None
+
+
+def test_only_the_booking_student_can_review(client, register, booking):
+    booking, _, profile = booking
+    response = review(client, register("stranger"), booking["id"], rating=1)
+    assert response.status_code == 403
+    assert client.get(f"/teachers/{profile['id']}").json()["rating_count"] == 0
+
+
+def test_second_review_of_a_booking_conflicts(client, booking):
+    booking, student, profile = booking
+    assert review(client, student, booking["id"], rating=5).status_code == 200
+    assert review(client, student, booking["id"], rating=1).status_code == 409
+    teacher = client.get(f"/teachers/{profile['id']}").json()
+    assert (teacher["rating_count"], teacher["rating"]) == (1, 5.0)
+
+
+def test_cancelled_booking_cannot_be_reviewed(client, booking):
+    booking, student, _ = booking
+    client.patch(f"/bookings/{booking['id']}/cancel", headers=student.headers)
+    assert review(client, student, booking["id"]).status_code == 400
+
+
+def test_deleting_a_review_restores_the_aggregates(client, booking):
+    booking, student, profile = booking
+    created = review(client, student, booking["id"], rating=2).json()
+    assert client.delete(f"/reviews/{created['id']}", headers=student.headers).status_code == 200
+    teacher = client.get(f"/teachers/{profile['id']}").json()
+    assert (teacher["rating_count"], teacher["rating"]) == (0, 0.0)
+    # the booking can be reviewed again once its review is gone
+    assert review(client, student, booking["id"]).status_code == 200
+
+
+def test_reconcile_rebuilds_drifted_aggregates(client, db, booking, monkeypatch):
+    from smartedu.models import TeacherProfile
+    from smartedu.ratings import reconcile_ratings
+    booking, student, profile = booking
+    review(client, student, booking["id"], rating=3)
+    db.query(TeacherProfile).filter_by(id=profile["id"]).update({"rating_sum": 40, "rating_count": 9, "rating": 1.5})
+    db.commit()
+
+    statements = []
+    execute = db.execute
+
+    def record(statement, *args, **kwargs):
+        statements.append(statement)
+        return execute(statement, *args, **kwargs)
+
+    monkeypatch.setattr(db, "execute", record)
+    reconcile_ratings(db)
+    # the rows are locked before they are recounted
+    assert [type(statement).__name__ for statement in statements] == ["Select", "Update"]
+    assert statements[0]._for_update_arg is not None
+
+    teacher = client.get(f"/teachers/{profile['id']}").json()
+    assert (teacher["rating_count"], teacher["rating"]) == (1, 3.0)
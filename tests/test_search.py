@@ -0,0 +1,94 @@
+import uuid
+
+
+def search(client, text, **params):
+    response = client.get("/teachers", params={"search": text, **params})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_prefix_words_all_must_match(client, make_teacher):
+    tag = uuid.uuid4().hex[:8]
+    _, both = make_teacher(f"algebra{tag} and geometry{tag} tutor")
+    _, one = make_teacher(f"algebra{tag} only")
+    found = search(client, f"algebra{tag}")
+    assert {item["id"] for item in found["items"]} == {both["id"], one["id"]}
+    assert found["total"] == 2
+    # prefixes of every word, matched as AND
+    found = search(client, f"alg geometry{tag[:4]}")
+    assert both["id"] in {item["id"] for item in found["items"]}
+    assert one["id"] not in {item["id"] for item in found["items"]}
+
+
+def test_more_relevant_teacher_ranks_first(client, make_teacher):
+    tag = uuid.uuid4().hex[:8]
+    _, weak = make_teacher(f"general tutor, music, history, art, some chess{tag} on weekends")
+    _, strong = make_teacher(f"chess{tag} coach: chess{tag} openings and chess{tag} endgames")
+    ids = [item["id"] for item in search(client, f"chess{tag}")["items"]]
+    assert ids == [strong["id"], weak["id"]]
+
+
+def test_username_and_subjects_are_indexed(client, make_teacher):
+    tag = uuid.uuid4().hex[:8]
+    account, profile = make_teacher("plain", prefix=f"maestro{tag}")
+    assert [item["id"] for item in search(client, f"maestro{tag}")["items"]] == [profile["id"]]
+    subject = client.post("/subjects", json={"name": f"astronomy{tag}"}).json()
+    client.post("/teachers/subjects", json={"subject_id": subject["id"]}, headers=account.headers)
+    assert [item["id"] for item in search(client, f"astronomy{tag}")["items"]] == [profile["id"]]
+
+
+def test_profile_update_reindexes(client, make_teacher):
+    tag = uuid.uuid4().hex[:8]
+    account, profile = make_teacher(f"violin{tag}")
+    client.put("/teachers/profile/me", json={"description": f"cello{tag}", "price_per_lesson": 100}, headers=account.headers)
+    assert search(client, f"violin{tag}")["total"] == 0
+    assert [item["id"] for item in search(client, f"cello{tag}")["items"]] == [profile["id"]]
+
+
+def test_search_without_words_lists_everyone(client):
+    assert "items" in search(client, "!!!")
+
+
+def walk(client, **params):
+    """Every id of a filtered catalog, one cursor page at a time."""
+    ids, cursor = [], None
+    while True:
+        page = client.get("/teachers", params={**params, **({"cursor": cursor} if cursor else {})}).json()
+        ids += [item["id"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return ids, page["total"]
+
+
+def test_cursor_pages_follow_the_catalog_order(client, make_teacher):
+    tag = uuid.uuid4().hex[:8]
+    subject = client.post("/subjects", json={"name": f"piano{tag}"}).json()
+    teachers = []
+    for price in (300, 100, 200, 100, 250):
+        account, profile = make_teacher(price=price)
+        client.post("/teachers/subjects", json={"subject_id": subject["id"]}, headers=account.headers)
+        teachers.append(profile)
+    make_teacher(price=100)  # not teaching the subject
+
+    ids, total = walk(client, subject=subject["id"], limit=2)
+    expected = [profile["id"] for profile in sorted(teachers, key=lambda profile: (profile["price_per_lesson"], profile["id"]))]
+    assert ids == expected and total == 5
+    offset_ids = [item["id"] for item in client.get("/teachers", params={"subject": subject["id"], "limit": 10}).json()["items"]]
+    assert offset_ids == expected
+
+    ids, total = walk(client, subject=subject["id"], min_price=150, max_price=260, limit=1)
+    assert ids == [teachers[2]["id"], teachers[4]["id"]] and total == 2
+
+
+def walk_first(client):
+    page = client.get("/teachers", params={"limit": 1}).json()
+    return page["items"], page["next_cursor"]
+
+
+def test_cursor_errors(client, make_teacher):
+    make_teacher()
+    make_teacher()
+    assert client.get("/teachers", params={"cursor": "not-a-cursor"}).status_code == 400
+    _, cursor = walk_first(client)
+    response = client.get("/teachers", params={"cursor": cursor, "search": "x"})
+    assert response.status_code == 400 and "search" in response.json()["detail"]
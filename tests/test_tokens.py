@@ -0,0 +1,45 @@
+import time
+from datetime import timedelta
+import pytest
+from fastapi import HTTPException
+from accounts import security
+from accounts.security import create_access_token, decode_jwt, generate_token, verified_tokens
+
+
+def test_verified_claims_are_reused(monkeypatch):
+    token = create_access_token("cache", 1)
+    first = decode_jwt(token)
+    calls = []
+    monkeypatch.setattr(security.jwt, "decode", lambda *args, **kwargs: calls.append(args))
+    assert decode_jwt(token) is first
+    assert calls == []
+
+
+def test_cache_entry_expires_with_the_token():
+    token = generate_token({"sub": "1", "type": "access"}, timedelta(seconds=2))
+    decode_jwt(token)
+    assert verified_tokens.get(token) is not None
+    time.sleep(2.1)
+    assert verified_tokens.get(token) is None
+    with pytest.raises(HTTPException):
+        decode_jwt(token)
+
+
+def test_tampered_token_is_not_served_from_cache():
+    token = create_access_token("cache", 1)
+    decode_jwt(token)
+    head, payload, signature = token.split(".")
+    forged = ".".join((head, payload, signature[::-1]))
+    with pytest.raises(HTTPException):
+        decode_jwt(forged)
+
+
+def test_revoked_token_is_rejected_after_caching(client, register):
+    account = register()
+    response = client.post("/auth/login", json={"username": account.username, "password": "secret"})
+    refresh = response.json()["refresh"]
+    assert client.post("/auth/refresh", params={"token": refresh}, headers=account.headers).status_code == 200
+    assert client.post("/auth/logout", params={"token": refresh}, headers=account.headers).json()["status"] == 200
+    assert verified_tokens.get(refresh) is None
+    response = client.post("/auth/refresh", params={"token": refresh}, headers=account.headers)
+    assert response.status_code == 400
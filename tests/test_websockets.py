@@ -0,0 +1,225 @@
+import asyncio
+import json
+import pytest
+from fastapi import WebSocketDisconnect
+from chats import chat_ws
+from chats.chat_ws import ConnectionManager, manager, user_sockets
+from chats.pubsub import MemoryPubSub
+
+
+@pytest.fixture
+def chat(client, register):
+    student, teacher = register("student"), register("teacher")
+    chat = client.post("/chats", json={"teacher_id": teacher.id}, headers=student.headers).json()
+    return chat["id"], student
+
+
+@pytest.fixture
+def fresh_heartbeat(client):
+    # a heartbeat left by an earlier test may still be asleep on the old interval
+    def restart():
+        if manager._heartbeat is not None:
+            manager._heartbeat.cancel()
+            manager._heartbeat = None
+    client.portal.call(restart)
+
+
+def receive(ws):
+    while True:
+        frame = ws.receive_json()
+        if frame.get("type") != "ping":
+            return frame
+
+
+def close_code(ws):
+    with pytest.raises(WebSocketDisconnect) as closed:
+        while True:
+            ws.receive_json()
+    return closed.value.code
+
+
+def test_silent_socket_is_pinged_then_reaped(client, chat, fresh_heartbeat, monkeypatch):
+    chat_id, student = chat
+    monkeypatch.setattr(chat_ws, "WS_PING_INTERVAL", 0.05)
+    monkeypatch.setattr(chat_ws, "WS_IDLE_TIMEOUT", 0.3)
+    reaped = manager.reaped
+    with client.websocket_connect(f"/chats/ws/{chat_id}?token={student.token}") as ws:
+        assert ws.receive_json() == {"type": "ping"}
+        ws.send_json({"type": "pong"})
+        assert close_code(ws) == 1001
+    assert manager.reaped == reaped + 1
+    assert manager.stats()["sockets_on_worker"] == 0
+
+
+def test_frames_over_the_rate_are_refused(client, chat, monkeypatch):
+    chat_id, student = chat
+    monkeypatch.setattr(chat_ws, "WS_RATE_LIMIT", 0)
+    monkeypatch.setattr(chat_ws, "WS_RATE_BURST", 2)
+    limited = manager.rate_limited
+    with client.websocket_connect(f"/chats/ws/{chat_id}?token={student.token}") as ws:
+        for text in ("one", "two", "three"):
+            ws.send_json({"text": text})
+        # pongs don't spend tokens
+        ws.send_json({"type": "pong"})
+        frames = [receive(ws) for _ in range(3)]
+    assert [frame.get("text") for frame in frames if "text" in frame] == ["one", "two"]
+    assert {"error": "rate limit exceeded"} in frames
+    assert manager.rate_limited == limited + 1
+
+
+def test_oversized_frame_closes_the_socket(client, chat, monkeypatch):
+    chat_id, student = chat
+    monkeypatch.setattr(chat_ws, "WS_MAX_FRAME_BYTES", 100)
+    oversized = manager.oversized
+    with client.websocket_connect(f"/chats/ws/{chat_id}?token={student.token}") as ws:
+        ws.send_json({"text": "x" * 200})
+        assert close_code(ws) == 1009
+    assert manager.oversized == oversized + 1
+
+
+def test_connections_per_user_are_capped(client, chat, monkeypatch):
+    chat_id, student = chat
+    monkeypatch.setattr(chat_ws, "WS_MAX_CONNECTIONS_PER_USER", 1)
+    refused = manager.refused
+    url = f"/chats/ws/{chat_id}?token={student.token}"
+    with client.websocket_connect(url) as ws:
+        with pytest.raises(WebSocketDisconnect) as closed:
+            with client.websocket_connect(url):
+                pass
+        assert closed.value.code == 1008
+        ws.send_json({"text": "still open"})
+        assert receive(ws)["text"] == "still open"
+    assert manager.refused == refused + 1
+    # the slot is released on disconnect
+    with client.websocket_connect(url) as ws:
+        ws.send_json({"text": "again"})
+        assert receive(ws)["text"] == "again"
+
+
+class SlowHandshake:
+    """Stand-in socket whose accept yields to the loop, like a real handshake."""
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.closed = None
+
+    async def accept(self):
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise RuntimeError("handshake failed")
+
+    async def close(self, code):
+        self.closed = code
+
+    async def send_text(self, payload):
+        pass
+
+
+def test_concurrent_handshakes_respect_the_cap(client, monkeypatch):
+    monkeypatch.setattr(chat_ws, "WS_MAX_CONNECTIONS_PER_USER", 2)
+    rooms = ConnectionManager(backend=MemoryPubSub())
+    user_id = -1
+
+    async def handshakes():
+        sockets = [SlowHandshake() for _ in range(5)]
+        accepted = await asyncio.gather(*(rooms.connect(1, ws, user_id) for ws in sockets))
+        in_use = user_sockets[user_id]
+        for ws in sockets:
+            await rooms.disconnect(1, ws)
+        await rooms.close()
+        return accepted, in_use, [ws.closed for ws in sockets]
+
+    accepted, in_use, closed = client.portal.call(handshakes)
+    assert accepted.count(True) == 2 and in_use == 2
+    assert closed.count(1008) == 3
+    assert user_id not in user_sockets
+
+
+def test_failed_accept_gives_the_slot_back(client, monkeypatch):
+    monkeypatch.setattr(chat_ws, "WS_MAX_CONNECTIONS_PER_USER", 1)
+    rooms = ConnectionManager(backend=MemoryPubSub())
+    user_id = -2
+
+    async def handshakes():
+        with pytest.raises(RuntimeError):
+            await rooms.connect(1, SlowHandshake(fail=True), user_id)
+        ws = SlowHandshake()
+        accepted = await rooms.connect(1, ws, user_id)
+        await rooms.disconnect(1, ws)
+        await rooms.close()
+        return accepted
+
+    assert client.portal.call(handshakes) is True
+    assert user_id not in user_sockets
+
+
+class Recorder:
+    """Stand-in socket that keeps what it was sent; a stuck one never finishes a send."""
+
+    def __init__(self, stuck=False):
+        self.sent = []
+        self.closed = None
+        self.released = asyncio.Event()
+        if not stuck:
+            self.released.set()
+
+    async def accept(self):
+        pass
+
+    async def close(self, code):
+        self.closed = code
+
+    async def send_text(self, payload):
+        await self.released.wait()
+        self.sent.append(payload)
+
+
+def test_slow_consumer_is_evicted_without_holding_up_the_room(client):
+    rooms = ConnectionManager(backend=MemoryPubSub(), queue_size=2)
+
+    async def scenario():
+        fast, stuck = Recorder(), Recorder(stuck=True)
+        await rooms.connect(1, fast)
+        await rooms.connect(1, stuck)
+        for i in range(6):
+            await rooms.broadcast(1, {"n": i})
+            await asyncio.sleep(0)
+        await asyncio.sleep(0.01)
+        members = list(rooms.connections.get(1, {}))
+        dropped = rooms.dropped
+        await rooms.disconnect(1, fast)
+        await rooms.close()
+        return fast, stuck, members, dropped
+
+    fast, stuck, members, dropped = client.portal.call(scenario)
+    assert [json.loads(payload)["n"] for payload in fast.sent] == list(range(6))
+    # one send in flight plus a full outbox, then the next broadcast overflows
+    assert stuck.closed == 1008 and stuck.sent == []
+    assert members == [fast] and dropped == 1
+    assert 1 not in rooms.connections
+
+
+def test_group_message_fans_out_to_members(client, register):
+    owner, member, outsider = register("owner"), register("member"), register("outsider")
+    group_id = client.post("/groups", json={"name": "fan-out"}, headers=owner.headers).json()["id"]
+    client.post(f"/groups/{group_id}/members", json={"user_id": member.id}, headers=owner.headers)
+
+    with pytest.raises(WebSocketDisconnect) as refused:
+        with client.websocket_connect(f"/groups/ws/{group_id}?token={outsider.token}") as ws:
+            ws.receive_json()
+    assert refused.value.code == 1008
+
+    with client.websocket_connect(f"/groups/ws/{group_id}?token={owner.token}") as first, \
+            client.websocket_connect(f"/groups/ws/{group_id}?token={member.token}") as second:
+        first.send_json({"text": "hello group", "client_id": "g1"})
+        frames = [receive(first), receive(second)]
+        # joining later works once add_member has invalidated the cached set
+        client.post(f"/groups/{group_id}/members", json={"user_id": outsider.id}, headers=owner.headers)
+        with client.websocket_connect(f"/groups/ws/{group_id}?token={outsider.token}") as third:
+            third.send_json({"text": "late"})
+            assert [receive(ws)["text"] for ws in (first, second, third)] == ["late"] * 3
+
+    assert frames[0] == frames[1]
+    assert frames[0]["sender_id"] == owner.id and frames[0]["client_id"] == "g1"
+    history = client.get(f"/groups/{group_id}/messages", headers=member.headers).json()
+    assert [message["text"] for message in history][-2:] == ["hello group", "late"]